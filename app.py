@@ -1,9 +1,12 @@
 import os
-from flask import Flask, redirect, url_for, jsonify
+import logging
+import threading
+from flask import Flask, redirect, url_for, jsonify, request
 from dotenv import load_dotenv
 from flasgger import Swagger
 from utils.logging_utils import log
 from utils.config_utils import load_config, load_logs, load_last_files
+from utils.state_store import flush_all
 from flask import Flask, send_from_directory
 import json
 from flask import Flask, jsonify, Response
@@ -18,6 +21,16 @@ from routes.scan import inbox_notes_routes
 from routes.upload import upload_note_api
 from routes.download import download_routes
 from routes.list import kb_notes_list_routes
+from routes.export import export_routes
+from routes.metrics import metrics_routes
+from routes.jobs import jobs_routes
+from routes.webhooks import webhooks_routes
+from services.job_queue import job_queue
+from services.scheduler import scheduler
+from services.catalog import close_snapshot, save_snapshot
+from services.dropbox_gate import DropboxUnavailable, BACKGROUND, priority
+from utils.deadline_utils import DeadlineExceeded
+from utils.rate_limit import RateLimited
 
 app = Flask(__name__, static_folder='static')
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-insecure-default")
@@ -61,15 +74,111 @@ app.register_blueprint(inbox_notes_routes)
 app.register_blueprint(download_routes)
 app.register_blueprint(upload_note_api)
 app.register_blueprint(kb_notes_list_routes)
+app.register_blueprint(export_routes)
+app.register_blueprint(metrics_routes)
+app.register_blueprint(jobs_routes)
+app.register_blueprint(webhooks_routes)
+
+
+@app.errorhandler(DropboxUnavailable)
+def dropbox_unavailable(e):
+    """
+    Fail fast with 503 + Retry-After while Dropbox is unhealthy or saturated.
+    """
+    response = jsonify({"status": "error", "message": str(e), "retry_after": e.retry_after})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+@app.errorhandler(RateLimited)
+def rate_limited(e):
+    """
+    A client went over one of its token's limits after the request was admitted (waiting long-polls).
+    """
+    response = jsonify({"status": "error", "message": str(e), "retry_after": e.retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(e):
+    """
+    The request ran out of its time budget before a result could be produced.
+    """
+    log(f"⏱️ {request.method} {request.path}: {str(e)}", level="warning")
+    return jsonify({"status": "error", "message": str(e)}), 504
 
 # Initial load
 load_config()
 load_logs()
 load_last_files()
 
+
+def start_background():
+    """
+    Starts the threads each serving process needs: job workers for ?async=1 note processing
+    and the scheduler for Inbox scans and KB cache warming (one process per host runs it).
+    """
+    job_queue.start()
+    if os.getenv("SCHEDULER_ENABLED", "1") == "1":
+        scheduler.start()
+
+
+def warm_up():
+    """
+    Fetches a Dropbox access token and lists the Inbox and KB, so the first requests
+    a new worker serves do not pay for it. Failures only cost that head start.
+    """
+    from services.catalog import catalog_for
+    from utils.dropbox_utils import get_access_token
+    try:
+        with priority(BACKGROUND):
+            get_access_token()
+            config = load_config()
+            catalog_for(config["inbox_path"]).refresh()
+            catalog_for(config["kb_path"], recursive=True).refresh()
+        log(f"🔥 Worker {os.getpid()} warmed up")
+    except Exception as e:
+        log(f"⚠️ Warm-up failed in worker {os.getpid()}: {str(e)}", level="warning")
+
+
+def stop_background(timeout: float = None):
+    """
+    Stops claiming jobs and gives the running ones up to `timeout` seconds, then hands the
+    scheduler lock to another worker. Can run while requests are still being served.
+    """
+    job_queue.stop(wait=True, timeout=timeout)
+    scheduler.stop()
+
+
+def finish_shutdown():
+    """
+    Last steps before the process exits, once requests and jobs are done: saves the warm-start
+    cache snapshot, writes deferred state files and flushes log handlers (including Logtail's send queue).
+    """
+    try:
+        save_snapshot()
+    except Exception as e:
+        log(f"⚠️ Could not save cache snapshot: {str(e)}", level="warning")
+    close_snapshot()
+    log(f"👋 Worker {os.getpid()} drained")
+    flush_all()
+    logging.shutdown()
+
+
+def shutdown_background(timeout: float = None):
+    """
+    Drains background work before the process exits: stop_background() with up to `timeout`
+    seconds for running jobs, then finish_shutdown().
+    """
+    stop_background(timeout)
+    finish_shutdown()
+
+
 # Optional: Logtail test connection
 if os.getenv("LOGTAIL_TOKEN"):
-    import logging
     from logtail import LogtailHandler
 
     test_logger = logging.getLogger("LogtailTest")
@@ -119,7 +228,13 @@ def startup_log():
             print(line)
             log(line, level="info")
 
-# Start Flask app
+# Start Flask app; under gunicorn, gunicorn.conf.py starts the background work in each worker
+# after the fork instead, so importing app.py never starts threads or opens connections
 if __name__ == "__main__":
     startup_log()
-    app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
+    start_background()
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    try:
+        app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=True, use_reloader=False)
+    finally:
+        shutdown_background(timeout=float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20")))
@@ -0,0 +1,64 @@
+import os
+import signal
+import threading
+import time
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Processes and threads per process; Dropbox calls are I/O bound, so threads do most of the work
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Seconds an idle client connection is kept open, and the worker timeouts
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Import the app once in the master and fork it, so workers share its memory and start fast
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# A stopping worker gets graceful_timeout in total before the master kills it. Running jobs drain
+# while in-flight requests finish, both within graceful_timeout minus the last seconds, which are kept
+# for saving the cache snapshot and flushing the logs
+finish_seconds = 5
+drain_seconds = max(min(float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20")), graceful_timeout - finish_seconds), 0)
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    from app import start_background, stop_background, warm_up
+    start_background()
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+    # gthread waits up to its graceful_timeout for in-flight requests before worker_exit runs;
+    # this worker's copy of the setting leaves the master's deadline room for worker_exit
+    worker.cfg.set("graceful_timeout", max(graceful_timeout - finish_seconds, 0))
+
+    handle_exit = worker.handle_exit
+
+    def begin_shutdown(sig, frame):
+        handle_exit(sig, frame)
+        if getattr(worker, "drain", None) is None:
+            worker.drain_until = time.monotonic() + drain_seconds
+            worker.drain = threading.Thread(target=stop_background, args=(drain_seconds,),
+                                            name="drain", daemon=True)
+            worker.drain.start()
+
+    # SIGTERM starts draining jobs right away instead of after the requests
+    worker.handle_exit = begin_shutdown
+    signal.signal(signal.SIGTERM, begin_shutdown)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def worker_exit(server, worker):
+    from app import finish_shutdown, shutdown_background
+    drain = getattr(worker, "drain", None)
+    if drain is None:
+        # Quick shutdown (SIGINT/SIGQUIT) or max_requests: no request wait came first, so the whole drain is left
+        shutdown_background(timeout=drain_seconds)
+        return
+    drain.join(max(worker.drain_until - time.monotonic(), 0))
+    finish_shutdown()
@@ -1,35 +1,18 @@
 # routes/admin.py
 
-import os
-import json
 from datetime import datetime
 from flask import Blueprint, session, redirect, url_for, render_template, request, flash
+from services.dropbox_gate import dropbox_gate
+from services.scheduler import scheduler
+from utils.config_utils import (
+    DEFAULT_CONFIG, INBOX_MODES, load_config, update_config, load_logs, load_last_files, load_scheduler_status
+)
 
 bp = Blueprint("admin", __name__, url_prefix="/admin")
 
-# 📁 Data file paths
-DATA_DIR = "data"
-CONFIG_FILE = os.path.join(DATA_DIR, "admin_config.json")
-LOG_FILE = os.path.join(DATA_DIR, "admin_log.json")
-FILES_FILE = os.path.join(DATA_DIR, "last_files.json")
-
-def load_json_file(path, fallback):
-    """
-    Loads JSON from file or returns fallback if not found.
-    """
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return json.load(f)
-    return fallback
-
-def save_json_file(path, data):
-    """
-    Saves JSON to file, ensuring the parent folder exists.
-    """
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
-
+# Scheduler settings editable from the dashboard (seconds, or a count)
+SCHEDULER_SETTINGS = ("scan_interval", "kb_refresh_interval", "scheduler_jitter", "cache_warm_count",
+                      "frontmatter_prefetch_limit", "snapshot_interval")
 
 @bp.route("/dashboard", methods=["GET", "POST"])
 def dashboard():
@@ -41,26 +24,39 @@ def dashboard():
         return redirect(url_for("auth.login"))
 
     # Load persisted state
-    config = load_json_file(CONFIG_FILE, {
-        "kb_path": "/NotesKB",
-        "inbox_path": "/Inbox",
-        "last_scan": None
-    })
-    logs = load_json_file(LOG_FILE, [])
-    files = load_json_file(FILES_FILE, [])
+    config = load_config()
+    for key in SCHEDULER_SETTINGS + ("inbox_mode",):
+        config.setdefault(key, DEFAULT_CONFIG[key])
+    logs = load_logs()
+    files = load_last_files()
 
     if request.method == "POST":
-        # Handle config update
-        config["kb_path"] = request.form.get("kb_path", config["kb_path"]).strip()
-        config["inbox_path"] = request.form.get("inbox_path", config["inbox_path"]).strip()
+        # Handle config update; merged so the last_scan stamp written by other workers is kept
+        changes = {
+            "kb_path": request.form.get("kb_path", config["kb_path"]).strip(),
+            "inbox_path": request.form.get("inbox_path", config["inbox_path"]).strip(),
+        }
+        for key in SCHEDULER_SETTINGS:
+            value = request.form.get(key, "").strip()
+            if value.isdigit():
+                changes[key] = int(value)
+        if request.form.get("inbox_mode") in INBOX_MODES:
+            changes["inbox_mode"] = request.form["inbox_mode"]
+
+        update_config(changes)
 
         if "scan_inbox" in request.form:
-            config["last_scan"] = datetime.utcnow().isoformat()
-            flash(f"Inbox scan triggered at {config['last_scan']}", "info")
+            # Runs in the background if this worker hosts the scheduler, otherwise right here
+            queued = scheduler.trigger("inbox_scan")
+            triggered_at = datetime.utcnow().isoformat()
+            if queued:
+                flash(f"Inbox scan triggered at {triggered_at}", "info")
+            else:
+                flash(f"Inbox scan completed at {triggered_at}", "info")
         else:
             flash("Configuration updated successfully.", "success")
 
-        save_json_file(CONFIG_FILE, config)
         return redirect(url_for("admin.dashboard"))
 
-    return render_template("dashboard.html", config=config, logs=logs, files=files)
+    return render_template("dashboard.html", config=config, logs=logs, files=files,
+                           dropbox=dropbox_gate.snapshot(), scheduler=load_scheduler_status())
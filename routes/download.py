@@ -1,15 +1,64 @@
 # routes/download.py - Notes content retrieval
 
-from flask import Blueprint, jsonify
-from services.dropbox_client import download_note_from_dropbox
+import json
+from flask import Blueprint, Response, request, jsonify
+from services.dropbox_client import (
+    INBOX_PATH, NOTES_KB_PATH, DropboxFileNotFound, download_note_from_dropbox, open_download_stream
+)
+from services.catalog import NOTE_MAX_AGE, catalog_for, read_note
+from utils.config_utils import load_config
 from utils.logging_utils import log
 from utils.token_utils import require_token
+from services.dropbox_gate import DropboxUnavailable
+from utils.deadline_utils import DeadlineExceeded, with_deadline
 
 download_bp = Blueprint("download", __name__, url_prefix="/api")
 
+RAW_CHUNK_SIZE = 64 * 1024
+
+
+def _stream_raw_note(dropbox_path, filename, not_found_message):
+    """
+    Pipes a Dropbox download straight to the client as text/markdown.
+    The body is forwarded chunk by chunk and never decoded or buffered;
+    Range, Content-Length and Content-Range are passed through unchanged.
+    """
+    try:
+        upstream = open_download_stream(dropbox_path, byte_range=request.headers.get("Range"))
+    except DropboxFileNotFound:
+        log(f"📄 Raw note not found: {filename}", level="warning")
+        return jsonify({"status": "error", "message": not_found_message}), 404
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise  # answered with 503/504 by the app-level handlers
+    except Exception as e:
+        log(f"❌ Raw note retrieval error: {str(e)}", level="error")
+        return jsonify({"status": "error", "message": "Failed to retrieve note from storage"}), 500
+
+    headers = {"Accept-Ranges": "bytes"}
+    for header in ("Content-Length", "Content-Range"):
+        if header in upstream.headers:
+            headers[header] = upstream.headers[header]
+
+    result = upstream.headers.get("Dropbox-API-Result")
+    if result:
+        headers["ETag"] = f'"{json.loads(result).get("rev")}"'
+
+    response = Response(
+        upstream.iter_content(chunk_size=RAW_CHUNK_SIZE),
+        status=upstream.status_code,
+        headers=headers,
+        mimetype="text/markdown",
+        direct_passthrough=True
+    )
+    response.call_on_close(upstream.close)
+
+    log(f"📄 Streaming raw note: {filename} ({upstream.status_code})")
+    return response
+
 
 @download_bp.route("/kb/notes/<filename>", methods=["GET"])
 @require_token
+@with_deadline("kb_get", default=20)
 def get_kb_note(filename):
     """
     Get a processed note from the Knowledge Base.
@@ -83,7 +132,9 @@ def get_kb_note(filename):
                   example: "Failed to retrieve note from storage"
     """
     try:
-        content = download_note_from_dropbox(filename)
+        # Notes the KB catalog knows about are served from the content cache when unchanged
+        entry = catalog_for(load_config().get("kb_path"), recursive=True).find(filename, max_age=NOTE_MAX_AGE)
+        content = read_note(entry) if entry else download_note_from_dropbox(filename)
         if not content:
             log(f"📚 KB note not found: {filename}", level="warning")
             return jsonify({
@@ -103,6 +154,9 @@ def get_kb_note(filename):
             }
         }), 200
 
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise  # answered with 503/504 by the app-level handlers
+
     except Exception as e:
         log(f"❌ KB note retrieval error: {str(e)}", level="error")
         return jsonify({
@@ -113,6 +167,7 @@ def get_kb_note(filename):
 
 @download_bp.route("/inbox/notes/<filename>", methods=["GET"])
 @require_token
+@with_deadline("inbox_get", default=20)
 def get_inbox_note(filename):
     """
     Get a raw note from the Inbox (before GPT processing).
@@ -189,7 +244,8 @@ def get_inbox_note(filename):
                   example: "Failed to retrieve note from storage"
     """
     try:
-        content = download_note_from_dropbox(filename, folder="Inbox")
+        entry = catalog_for(load_config().get("inbox_path")).find(filename, max_age=NOTE_MAX_AGE)
+        content = read_note(entry) if entry else download_note_from_dropbox(filename, folder="Inbox")
         if not content:
             log(f"📥 Inbox note not found: {filename}", level="warning")
             return jsonify({
@@ -210,6 +266,9 @@ def get_inbox_note(filename):
             }
         }), 200
 
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise  # answered with 503/504 by the app-level handlers
+
     except Exception as e:
         log(f"❌ Inbox note retrieval error: {str(e)}", level="error")
         return jsonify({
@@ -218,5 +277,101 @@ def get_inbox_note(filename):
         }), 500
 
 
+@download_bp.route("/kb/notes/<filename>/raw", methods=["GET"])
+@require_token
+@with_deadline("raw_open", default=10)
+def get_kb_note_raw(filename):
+    """
+    Stream a KB note's raw Markdown without JSON wrapping.
+    ---
+    tags:
+      - Knowledge Base Notes
+    summary: Get raw KB note bytes
+    description: |
+      Streams the note body from Dropbox as `text/markdown`, byte for byte. Supports `Range` requests
+      (e.g. `Range: bytes=0-4095`) for reading large notes in pieces. The note's folder is derived from
+      the date prefix of the filename unless `folder` is given.
+    parameters:
+      - name: filename
+        in: path
+        required: true
+        schema:
+          type: string
+          example: "2025-07-03_meeting-notes.md"
+      - name: folder
+        in: query
+        schema:
+          type: string
+          example: "2025-07"
+        description: KB subfolder holding the note (defaults to the filename's YYYY-MM prefix)
+      - name: Range
+        in: header
+        schema:
+          type: string
+          example: "bytes=0-4095"
+    responses:
+      200:
+        description: Raw Markdown bytes of the note
+        content:
+          text/markdown:
+            schema:
+              type: string
+      206:
+        description: Requested byte range of the note (see Content-Range)
+      404:
+        description: Note not found
+      416:
+        description: Requested range not satisfiable
+      500:
+        description: Error accessing Dropbox
+    """
+    folder = request.args.get("folder") or filename[:7]
+    return _stream_raw_note(f"{NOTES_KB_PATH}/{folder}/{filename}", filename, "Note not found in Knowledge Base")
+
+
+@download_bp.route("/inbox/notes/<filename>/raw", methods=["GET"])
+@require_token
+@with_deadline("raw_open", default=10)
+def get_inbox_note_raw(filename):
+    """
+    Stream an Inbox note's raw Markdown without JSON wrapping.
+    ---
+    tags:
+      - Inbox Notes
+    summary: Get raw inbox note bytes
+    description: |
+      Streams the unprocessed note body from Dropbox as `text/markdown`, byte for byte.
+      Supports `Range` requests (e.g. `Range: bytes=0-4095`).
+    parameters:
+      - name: filename
+        in: path
+        required: true
+        schema:
+          type: string
+          example: "2025-07-03_meeting-ideas.md"
+      - name: Range
+        in: header
+        schema:
+          type: string
+          example: "bytes=0-4095"
+    responses:
+      200:
+        description: Raw Markdown bytes of the note
+        content:
+          text/markdown:
+            schema:
+              type: string
+      206:
+        description: Requested byte range of the note (see Content-Range)
+      404:
+        description: Note not found
+      416:
+        description: Requested range not satisfiable
+      500:
+        description: Error accessing Dropbox
+    """
+    return _stream_raw_note(f"{INBOX_PATH}/{filename}", filename, "Note not found in Inbox")
+
+
 # Export for app.py
 download_routes = download_bp
\ No newline at end of file
@@ -0,0 +1,89 @@
+# routes/export.py - Streaming archive export of the Knowledge Base
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from services.dropbox_gate import dropbox_gate
+from services.export_service import EXPORT_FORMATS, stream_folder_archive
+from utils.config_utils import load_config
+from utils.logging_utils import log
+from utils.token_utils import require_token
+
+export_bp = Blueprint("export", __name__, url_prefix="/api")
+
+ARCHIVE_MIMETYPES = {
+    "zip": "application/zip",
+    "tar.gz": "application/gzip",
+}
+
+
+@export_bp.route("/kb/export", methods=["GET"])
+@require_token
+def export_kb():
+    """
+    Download a KB folder (or the whole Knowledge Base) as a streamed archive.
+    ---
+    tags:
+      - Knowledge Base Notes
+    summary: Export KB as zip or tar.gz
+    description: |
+      Builds a zip or tar.gz archive on the fly from the notes and attachments in a Knowledge Base folder.
+      Files are downloaded concurrently with a bounded window and written into the archive as they arrive,
+      so the response starts flowing immediately and memory use does not depend on the folder size.
+
+      Files that cannot be downloaded are skipped and listed in `_export_errors.txt` inside the archive.
+    parameters:
+      - name: folder
+        in: query
+        schema:
+          type: string
+          example: "2025-07"
+        description: KB subfolder to export (YYYY-MM format). Omit to export the whole Knowledge Base.
+      - name: format
+        in: query
+        schema:
+          type: string
+          enum: [zip, tar.gz]
+          default: zip
+        description: Archive format
+    responses:
+      200:
+        description: Archive stream
+        content:
+          application/zip:
+            schema:
+              type: string
+              format: binary
+          application/gzip:
+            schema:
+              type: string
+              format: binary
+      400:
+        description: Unsupported archive format
+      503:
+        description: Dropbox is unavailable; retry after the Retry-After header
+    """
+    archive_format = request.args.get("format", "zip")
+    folder = request.args.get("folder", "").strip("/")
+
+    if archive_format not in EXPORT_FORMATS:
+        return jsonify({
+            "status": "error",
+            "message": f"Unsupported format '{archive_format}'. Use one of: {', '.join(EXPORT_FORMATS)}"
+        }), 400
+
+    dropbox_gate.ensure_available()
+
+    kb_path = load_config().get("kb_path")
+    root_path = f"{kb_path}/{folder}" if folder else kb_path
+    download_name = f"notes-{folder.replace('/', '-') or 'kb'}.{archive_format}"
+
+    log(f"📦 Exporting {root_path} as {archive_format}")
+
+    return Response(
+        stream_with_context(stream_folder_archive(root_path, archive_format)),
+        mimetype=ARCHIVE_MIMETYPES[archive_format],
+        headers={"Content-Disposition": f'attachment; filename="{download_name}"'}
+    )
+
+
+# Export for app.py
+export_routes = export_bp
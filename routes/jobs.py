@@ -0,0 +1,138 @@
+# routes/jobs.py - Status of background jobs (async note processing)
+
+import json
+import time
+from flask import Blueprint, Response, jsonify, stream_with_context
+from services.job_queue import job_queue, TERMINAL_STATUSES
+from utils.token_utils import require_token
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api")
+
+# Seconds between keep-alive comments on an idle event stream
+EVENTS_HEARTBEAT = 15
+
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+@require_token
+def get_job(job_id):
+    """
+    Get the status, progress and result of a background job.
+    ---
+    tags:
+      - Jobs
+    summary: Get job status
+    description: |
+      Jobs are created by `PATCH /api/inbox/notes/{filename}?async=1`.
+      `status` moves from `queued` to `running` and ends as `succeeded`, `partial` or `failed`.
+      While running, `progress` reports the current stage and attachment counts; once finished,
+      `result` holds the same body the synchronous request would have returned.
+    parameters:
+      - name: job_id
+        in: path
+        required: true
+        schema:
+          type: string
+        description: Job id returned when the job was queued
+    responses:
+      200:
+        description: Job state
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                id:
+                  type: string
+                kind:
+                  type: string
+                  example: process_note
+                status:
+                  type: string
+                  enum: [queued, running, succeeded, partial, failed]
+                progress:
+                  type: object
+                  example: {"stage": "copying", "downloaded": true, "attachments_copied": 1, "attachments_total": 3}
+                result:
+                  type: object
+                  nullable: true
+                error:
+                  type: string
+                  nullable: true
+                attempts:
+                  type: integer
+                created_at:
+                  type: string
+                  format: date-time
+                updated_at:
+                  type: string
+                  format: date-time
+      404:
+        description: Unknown job id
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Job '{job_id}' not found"}), 404
+    return jsonify(job), 200
+
+
+@jobs_bp.route("/jobs/<job_id>/events", methods=["GET"])
+@require_token
+def job_events(job_id):
+    """
+    Stream a job's progress as Server-Sent Events.
+    ---
+    tags:
+      - Jobs
+    summary: Stream job progress
+    description: |
+      Sends a `job` event with the full job state every time it changes, and closes the stream
+      once the job reaches `succeeded`, `partial` or `failed`.
+    parameters:
+      - name: job_id
+        in: path
+        required: true
+        schema:
+          type: string
+        description: Job id returned when the job was queued
+    responses:
+      200:
+        description: Event stream
+        content:
+          text/event-stream:
+            schema:
+              type: string
+      404:
+        description: Unknown job id
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Job '{job_id}' not found"}), 404
+
+    def generate(job):
+        last_sent = None
+        idle_since = time.monotonic()
+        while True:
+            if job["updated_at"] != last_sent:
+                last_sent = job["updated_at"]
+                idle_since = time.monotonic()
+                yield f"event: job\ndata: {json.dumps(job)}\n\n"
+            elif time.monotonic() - idle_since >= EVENTS_HEARTBEAT:
+                idle_since = time.monotonic()
+                yield ": keep-alive\n\n"
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            # Woken early by changes in this process; other workers' changes show up on re-read
+            job_queue.wait_for_update(1)
+            job = job_queue.get(job_id)
+            if job is None:
+                return
+
+    return Response(
+        stream_with_context(generate(job)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Export for app.py
+jobs_routes = jobs_bp
@@ -1,18 +1,54 @@
 # routes/list.py - Knowledge Base note listing (Inbox handled by scan.py)
 
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from utils.config_utils import load_config
-from services.dropbox_client import list_folder
+from services.catalog import catalog_for, load_frontmatter, read_frontmatter
+from services.dropbox_client import list_folder, iter_folder_entries
+from services.dropbox_executor import fan_out
 from utils.logging_utils import log
 from utils.token_utils import require_token
+from services.dropbox_gate import DropboxUnavailable, dropbox_gate
+from utils.deadline_utils import DeadlineExceeded, with_deadline
 
 list_bp = Blueprint("list", __name__, url_prefix="/api")
 
 # ──────────── KNOWLEDGE BASE ONLY ────────────
 # (Inbox listing is handled by routes/scan.py)
 
+def _note_from_entry(item, folder):
+    """
+    Builds the API representation of a KB note from a Dropbox file entry.
+    """
+    # Extract title from filename
+    title = item["name"].replace('.md', '')
+    if '_' in title:
+        parts = title.split('_', 1)
+        if len(parts) > 1 and parts[0].count('-') == 2:
+            title = parts[1].replace('_', ' ').replace('-', ' ')
+
+    return {
+        "filename": item["name"],
+        "title": title,
+        "folder": folder,
+        "path": f"/api/kb/notes/{item['name']}",
+        "status": "processed",
+        "modified": item.get("client_modified"),
+        "size": item.get("size")
+    }
+
+
+def _folder_of(item, kb_path):
+    """
+    Returns the KB subfolder of a recursive listing entry (e.g. "2025-07").
+    """
+    relative = item["path_display"][len(kb_path):].strip("/")
+    return relative.rsplit("/", 1)[0] if "/" in relative else ""
+
+
 @list_bp.route("/kb/notes", methods=["GET"])
 @require_token
+@with_deadline("kb_list", default=25)
 def list_kb_notes():
     """
     List processed notes in the Knowledge Base.
@@ -25,6 +61,10 @@ def list_kb_notes():
       and are organized in date-based folders.
       
       Supports filtering by folder and pagination for large knowledge bases.
+
+      With `include=frontmatter` each note on the page also carries its parsed YAML front matter. Only the
+      first few KB of each note are downloaded (a `Range` request, extended until the closing `---`), several
+      notes at a time, and the result is cached per Dropbox rev.
     parameters:
       - name: limit
         in: query
@@ -47,6 +87,12 @@ def list_kb_notes():
           type: string
           example: "2025-07"
         description: Filter by specific KB subfolder (YYYY-MM format)
+      - name: include
+        in: query
+        schema:
+          type: string
+          enum: [frontmatter]
+        description: Set to `frontmatter` to add each note's parsed YAML front matter
     responses:
       200:
         description: List of processed notes in the Knowledge Base
@@ -83,6 +129,9 @@ def list_kb_notes():
                         format: date-time
                       size:
                         type: integer
+                      frontmatter:
+                        type: object
+                        description: Parsed YAML front matter (with include=frontmatter); null if the note could not be read
                 pagination:
                   type: object
                   properties:
@@ -102,6 +151,7 @@ def list_kb_notes():
         limit = min(int(request.args.get('limit', 50)), 100)
         offset = max(int(request.args.get('offset', 0)), 0)
         folder_filter = request.args.get('folder')
+        include = set(filter(None, request.args.get("include", "").split(",")))
         
         kb_path = load_config().get("kb_path")
         
@@ -113,60 +163,35 @@ def list_kb_notes():
             
             for item in entries:
                 if item[".tag"] == "file" and item["name"].endswith(".md"):
-                    # Extract title from filename
-                    title = item["name"].replace('.md', '')
-                    if '_' in title:
-                        parts = title.split('_', 1)
-                        if len(parts) > 1 and parts[0].count('-') == 2:
-                            title = parts[1].replace('_', ' ').replace('-', ' ')
-                    
-                    notes.append({
-                        "filename": item["name"],
-                        "title": title,
-                        "folder": folder_filter,
-                        "path": f"/api/kb/notes/{item['name']}",
-                        "status": "processed",
-                        "modified": item.get("client_modified"),
-                        "size": item.get("size")
-                    })
+                    notes.append((_note_from_entry(item, folder_filter), item))
         else:
-            # List all folders and their contents
+            # List all folders, then their contents in parallel
             entries = list_folder(kb_path)
             notes = []
             
-            for folder_item in entries:
-                if folder_item[".tag"] == "folder":
-                    folder_name = folder_item["name"]
-                    try:
-                        folder_entries = list_folder(f"{kb_path}/{folder_name}")
-                        for item in folder_entries:
-                            if item[".tag"] == "file" and item["name"].endswith(".md"):
-                                # Extract title from filename
-                                title = item["name"].replace('.md', '')
-                                if '_' in title:
-                                    parts = title.split('_', 1)
-                                    if len(parts) > 1 and parts[0].count('-') == 2:
-                                        title = parts[1].replace('_', ' ').replace('-', ' ')
-                                
-                                notes.append({
-                                    "filename": item["name"],
-                                    "title": title,
-                                    "folder": folder_name,
-                                    "path": f"/api/kb/notes/{item['name']}",
-                                    "status": "processed",
-                                    "modified": item.get("client_modified"),
-                                    "size": item.get("size")
-                                })
-                    except Exception as e:
-                        log(f"⚠️ Could not access folder {folder_name}: {str(e)}", level="warning")
-                        continue
+            folder_names = [item["name"] for item in entries if item[".tag"] == "folder"]
+            listings = fan_out(lambda name: list_folder(f"{kb_path}/{name}"), folder_names, return_exceptions=True)
+            for folder_name, folder_entries in zip(folder_names, listings):
+                if isinstance(folder_entries, Exception):
+                    log(f"⚠️ Could not access folder {folder_name}: {str(folder_entries)}", level="warning")
+                    continue
+                for item in folder_entries:
+                    if item[".tag"] == "file" and item["name"].endswith(".md"):
+                        notes.append((_note_from_entry(item, folder_name), item))
         
         # Sort by modification date (newest first)
-        notes.sort(key=lambda x: x.get("modified", ""), reverse=True)
+        notes.sort(key=lambda x: x[0].get("modified", ""), reverse=True)
         
         # Apply pagination
         total = len(notes)
-        paginated_notes = notes[offset:offset + limit]
+        page = notes[offset:offset + limit]
+        paginated_notes = [note for note, _ in page]
+
+        # Front matter only for the notes being returned
+        if "frontmatter" in include:
+            frontmatter = load_frontmatter([item for _, item in page])
+            for note, item in page:
+                note["frontmatter"] = frontmatter.get(item["path_lower"])
         
         log(f"📚 Listed {len(paginated_notes)} KB notes (total: {total})")
         
@@ -181,13 +206,94 @@ def list_kb_notes():
             }
         }), 200
         
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise  # answered with 503/504 by the app-level handlers
+
     except Exception as e:
         log(f"❌ List KB notes error: {str(e)}", level="error")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@list_bp.route("/kb/notes:stream", methods=["GET"])
+@require_token
+def stream_kb_notes():
+    """
+    Stream the entire Knowledge Base catalog as NDJSON.
+    ---
+    tags:
+      - Knowledge Base Notes
+    summary: Stream KB catalog
+    description: |
+      Streams every processed note in the Knowledge Base as newline-delimited JSON, one note per line.
+      Lines are emitted as the recursive Dropbox listing pages arrive, so memory use does not grow
+      with the size of the Knowledge Base and there is no pagination limit.
+
+      If the listing fails midway, a final line with `status: error` is emitted.
+    produces:
+      - application/x-ndjson
+    parameters:
+      - name: folder
+        in: query
+        schema:
+          type: string
+          example: "2025-07"
+        description: Restrict the stream to one KB subfolder (YYYY-MM format)
+      - name: include
+        in: query
+        schema:
+          type: string
+          enum: [frontmatter]
+        description: Set to `frontmatter` to include each note's parsed YAML front matter (reads the start of every note)
+    responses:
+      200:
+        description: One JSON note object per line (same fields as `GET /api/kb/notes`)
+        content:
+          application/x-ndjson:
+            schema:
+              type: string
+              example: '{"filename": "2025-07-03_weekly-meeting.md", "title": "weekly meeting", "folder": "2025-07"}'
+      503:
+        description: Dropbox is unavailable; retry after the Retry-After header
+    """
+    dropbox_gate.ensure_available()
+
+    include = set(filter(None, request.args.get("include", "").split(",")))
+    folder_filter = request.args.get("folder")
+
+    kb_path = load_config().get("kb_path")
+    root_path = f"{kb_path}/{folder_filter}" if folder_filter else kb_path
+
+    def generate():
+        streamed = 0
+        try:
+            for item in iter_folder_entries(root_path, recursive=True):
+                if item[".tag"] != "file" or not item["name"].endswith(".md"):
+                    continue
+
+                note = _note_from_entry(item, _folder_of(item, kb_path))
+                if "frontmatter" in include:
+                    try:
+                        note["frontmatter"] = read_frontmatter(item)
+                    except Exception as e:
+                        log(f"⚠️ Could not read front matter of {item['name']}: {str(e)}", level="warning")
+                        note["frontmatter"] = None
+
+                streamed += 1
+                yield json.dumps(note, default=str) + "\n"
+
+        except Exception as e:
+            log(f"❌ Stream KB notes error: {str(e)}", level="error")
+            yield json.dumps({"status": "error", "message": str(e)}) + "\n"
+            return
+
+        log(f"📚 Streamed {streamed} KB notes")
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 @list_bp.route("/kb/folders", methods=["GET"])
 @require_token
+@with_deadline("kb_folders", default=25)
 def list_kb_folders():
     """
     List Knowledge Base folders (organized by date).
@@ -198,6 +304,12 @@ def list_kb_folders():
     description: |
       Lists all folders in the Knowledge Base. These are typically organized by date (YYYY-MM format)
       and contain processed notes for that time period.
+
+      Counts, sizes, latest note and tag histogram are aggregates kept up to date as notes are written
+      and as the KB catalog picks up changes. The catalog is brought up to date with one
+      `list_folder/continue` call when it is older than `CATALOG_MAX_AGE` seconds. Tags are counted for
+      the notes whose front matter has been indexed (`frontmatter_indexed`); the background KB refresh
+      fills in the rest.
     responses:
       200:
         description: List of KB folders with note counts
@@ -227,43 +339,32 @@ def list_kb_folders():
                         type: string
                         format: date-time
                         example: "2025-07-03T14:30:00Z"
+                      total_bytes:
+                        type: integer
+                        example: 48213
+                        description: Size of every file in the folder, attachments included
+                      tags:
+                        type: object
+                        additionalProperties:
+                          type: integer
+                        example: {"meeting": 6, "project": 3}
+                        description: Notes per tag, most frequent first
+                      frontmatter_indexed:
+                        type: integer
+                        example: 15
+                        description: Notes whose tags are included in the histogram
       500:
         description: Error accessing Knowledge Base
     """
     try:
         kb_path = load_config().get("kb_path")
-        entries = list_folder(kb_path)
-        
+
+        # Month folders only, as kept by the KB catalog (at most CATALOG_MAX_AGE seconds old)
         folders = []
-        for item in entries:
-            if item[".tag"] == "folder":
-                folder_name = item["name"]
-                try:
-                    # Get notes in this folder
-                    folder_entries = list_folder(f"{kb_path}/{folder_name}")
-                    note_files = [e for e in folder_entries if e[".tag"] == "file" and e["name"].endswith(".md")]
-                    
-                    # Find latest note
-                    latest_note = None
-                    if note_files:
-                        latest_note = max(note_files, key=lambda x: x.get("client_modified", ""))["client_modified"]
-                    
-                    folders.append({
-                        "name": folder_name,
-                        "note_count": len(note_files),
-                        "path": f"/api/kb/notes?folder={folder_name}",
-                        "latest_note": latest_note
-                    })
-                    
-                except Exception as e:
-                    log(f"⚠️ Could not access folder {folder_name}: {str(e)}", level="warning")
-                    # Add folder even if we can't read it
-                    folders.append({
-                        "name": folder_name,
-                        "note_count": 0,
-                        "path": f"/api/kb/notes?folder={folder_name}",
-                        "latest_note": None
-                    })
+        for stats in catalog_for(kb_path, recursive=True).folder_stats():
+            if not stats["name"] or "/" in stats["name"]:
+                continue
+            folders.append({**stats, "path": f"/api/kb/notes?folder={stats['name']}"})
         
         # Sort folders by name (newest first for date-based folders)
         folders.sort(key=lambda x: x["name"], reverse=True)
@@ -275,6 +376,9 @@ def list_kb_folders():
             "folders": folders
         }), 200
         
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise  # answered with 503/504 by the app-level handlers
+
     except Exception as e:
         log(f"❌ List KB folders error: {str(e)}", level="error")
         return jsonify({"status": "error", "message": str(e)}), 500
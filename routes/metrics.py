@@ -0,0 +1,187 @@
+# routes/metrics.py - Runtime metrics for monitoring
+
+from flask import Blueprint, jsonify
+from services.dropbox_gate import dropbox_gate
+from services.dropbox_http import dropbox_flights
+from services.catalog import content_cache
+from services.shared_cache import shared_cache
+from utils.token_utils import require_token, token_usage
+
+metrics_bp = Blueprint("metrics", __name__, url_prefix="/api")
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+@require_token
+def get_metrics():
+    """
+    Runtime metrics of this worker process.
+    ---
+    tags:
+      - Monitoring
+    summary: Get service metrics
+    description: |
+      Reports the state of the Dropbox gate: the adaptive concurrency limit, calls in flight and waiting,
+      average latency, circuit breaker state and call counters; `priorities` breaks calls in flight, waiting and
+      average queue wait down by priority class (interactive, background, bulk). `coalescing` counts Dropbox reads and how
+      many of them shared an identical in-flight call; `content_cache` reports note bodies served without a
+      download. `tokens` reports requests, 429 rejections and limits per API token. Values are per worker process.
+    responses:
+      200:
+        description: Metrics snapshot
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                status:
+                  type: string
+                  example: success
+                dropbox:
+                  type: object
+                  properties:
+                    concurrency_limit:
+                      type: number
+                      example: 8.0
+                    in_flight:
+                      type: integer
+                      example: 2
+                    circuit_state:
+                      type: string
+                      enum: [closed, open, half_open]
+                      example: closed
+                    failures:
+                      type: integer
+                      description: Calls that failed on Dropbox's side (5xx, connection errors, full-length timeouts)
+                      example: 0
+                    aborted:
+                      type: integer
+                      description: Calls cut short by their request's own deadline; not held against Dropbox
+                      example: 0
+                    priorities:
+                      type: object
+                      description: Per priority class (interactive, background, bulk)
+                      additionalProperties:
+                        type: object
+                        properties:
+                          in_flight:
+                            type: integer
+                            example: 1
+                          waiting:
+                            type: integer
+                            example: 0
+                          admitted:
+                            type: integer
+                            example: 42
+                          avg_wait_seconds:
+                            type: number
+                            example: 0.012
+                coalescing:
+                  type: object
+                  properties:
+                    calls:
+                      type: integer
+                      example: 120
+                    shared:
+                      type: integer
+                      example: 37
+                    retried:
+                      type: integer
+                      description: Followers that ran the call again after the leader ran out of time
+                      example: 0
+                    in_flight:
+                      type: integer
+                      example: 1
+                content_cache:
+                  type: object
+                  properties:
+                    hits:
+                      type: integer
+                      example: 54
+                    shared_hits:
+                      type: integer
+                      description: Local misses answered by the shared cache backend
+                      example: 3
+                    misses:
+                      type: integer
+                      example: 12
+                    entries:
+                      type: integer
+                      example: 20
+                    bytes:
+                      type: integer
+                      example: 81920
+                cache:
+                  type: object
+                  description: Shared cache backend (CACHE_BACKEND) used for tokens, listings and note bodies
+                  properties:
+                    backend:
+                      type: string
+                      enum: [memory, sqlite, redis]
+                    hits:
+                      type: integer
+                      example: 40
+                    misses:
+                      type: integer
+                      example: 6
+                    sets:
+                      type: integer
+                      example: 12
+                    errors:
+                      type: integer
+                      example: 0
+                tokens:
+                  type: object
+                  description: Usage and limits per API token name (GPT_TOKEN is "gpt")
+                  additionalProperties:
+                    type: object
+                    properties:
+                      requests:
+                        type: integer
+                        example: 120
+                      rate_limited:
+                        type: integer
+                        description: Requests answered 429 for going over the rate
+                        example: 3
+                      concurrency_limited:
+                        type: integer
+                        description: Requests answered 429 for too many in flight
+                        example: 0
+                      watchers_limited:
+                        type: integer
+                        description: Long-polls answered 429 for too many already waiting
+                        example: 0
+                      in_flight:
+                        type: integer
+                        example: 1
+                      waiting:
+                        type: integer
+                        description: Long-polls waiting idle
+                        example: 2
+                      tokens_available:
+                        type: number
+                        example: 27.5
+                      rate:
+                        type: number
+                        example: 5
+                      burst:
+                        type: integer
+                        example: 30
+                      concurrency:
+                        type: integer
+                        example: 8
+                      watchers:
+                        type: integer
+                        example: 4
+    """
+    return jsonify({
+        "status": "success",
+        "dropbox": dropbox_gate.snapshot(),
+        "coalescing": dropbox_flights.snapshot(),
+        "content_cache": content_cache.snapshot(),
+        "cache": shared_cache.snapshot(),
+        "tokens": token_usage()
+    }), 200
+
+
+# Export for app.py
+metrics_routes = metrics_bp
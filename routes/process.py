@@ -1,17 +1,35 @@
 # routes/process.py - Note processing with full Obsidian link support
 
-from flask import Blueprint, request, jsonify
-from services import dropbox_client
-from utils.dropbox_utils import generate_yaml_front_matter, sanitize_filename, process_note_with_links
+from flask import Blueprint, request, jsonify, url_for
+from services import process_service
+from services.dropbox_client import DropboxFileNotFound
+from services.job_queue import job_queue, QueueFull
 from utils.logging_utils import log
+from utils.config_utils import INBOX_MODES
 from utils.token_utils import require_token
+from services.dropbox_gate import DropboxUnavailable
+from utils.deadline_utils import DeadlineExceeded, with_deadline
 from datetime import datetime
 
 process_bp = Blueprint("process", __name__, url_prefix="/api/inbox/notes")
 
 
+def _run_process_job(payload, progress):
+    """
+    Job handler for ?async=1 processing requests.
+    """
+    return process_service.process_inbox_note(
+        payload["filename"], payload["metadata"], payload.get("copy_linked_files", True), progress=progress,
+        inbox_mode=payload.get("inbox_mode")
+    )
+
+
+job_queue.register("process_note", _run_process_job)
+
+
 @process_bp.route("/<filename>", methods=["PATCH"])
 @require_token
+@with_deadline("inbox_process", default=40)
 def process_inbox_note(filename):
     """
     Process a raw note by adding GPT-generated metadata and archiving to Knowledge Base.
@@ -25,7 +43,19 @@ def process_inbox_note(filename):
       2. Detecting and copying linked files (Obsidian support)
       3. Updating link paths in the note content
       4. Moving the processed note to the appropriate KB folder
+      5. Optionally archiving or deleting the source note and the attachments only it links to
       This is the core transformation step in the knowledge management pipeline.
+
+      `inbox_mode` decides what happens to the Inbox copy once the KB note is uploaded: `keep` leaves it,
+      `archive` moves it with its attachments to `Inbox/_processed/YYYY-MM/` and `delete` removes them
+      (one batch call either way). It defaults to the mode set on the admin dashboard. Attachments another
+      Inbox note still links to are never moved or deleted.
+
+      Repeating a request that already succeeded for the same revision of the note returns the recorded
+      result (`deduplicated: true`) without downloading, copying or uploading anything again.
+
+      With `?async=1` the request is validated, queued and answered immediately with `202` and a job id;
+      follow progress at `/api/jobs/{job_id}` or stream it from `/api/jobs/{job_id}/events`.
     parameters:
       - name: filename
         in: path
@@ -34,6 +64,12 @@ def process_inbox_note(filename):
           type: string
           example: "2025-07-03_meeting-ideas.md"
         description: Filename of the raw note to process
+      - name: async
+        in: query
+        schema:
+          type: boolean
+          default: false
+        description: Queue the note for background processing and return a job id instead of waiting
     requestBody:
       required: true
       content:
@@ -90,6 +126,10 @@ def process_inbox_note(filename):
                 type: boolean
                 default: true
                 description: "Whether to copy linked files from Inbox to KB"
+              inbox_mode:
+                type: string
+                enum: [keep, archive, delete]
+                description: "What to do with the Inbox note afterwards; defaults to the admin setting"
           examples:
             obsidian_note:
               summary: Obsidian note with linked files
@@ -154,15 +194,75 @@ def process_inbox_note(filename):
                       items:
                         type: object
                       example: []
+                    skipped_files:
+                      type: array
+                      items:
+                        type: object
+                      description: Linked files not copied because the request deadline was reached (status is then "partial")
+                      example: []
+                    inbox_action:
+                      type: object
+                      description: What happened to the Inbox note and its attachments
+                      properties:
+                        mode:
+                          type: string
+                          example: archive
+                        status:
+                          type: string
+                          example: done
+                        note:
+                          type: string
+                          example: "/Apps/SaveNotesGPT/Inbox/_processed/2025-07/2025-07-03_meeting-ideas.md"
+                        attachments:
+                          type: array
+                          items:
+                            type: string
+                          example: ["wireframe.png"]
+                        kept_attachments:
+                          type: array
+                          items:
+                            type: string
+                          description: Attachments left in place because another Inbox note links to them
+                          example: []
+                        error:
+                          type: string
+                          example: null
                 metadata_applied:
                   type: object
                   description: The metadata that was applied to the note
+                deduplicated:
+                  type: boolean
+                  example: false
+                  description: True when this exact request already succeeded for the same revision of the note and the recorded result was returned without reprocessing
+      202:
+        description: Note queued for background processing (with ?async=1)
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                status:
+                  type: string
+                  example: queued
+                job_id:
+                  type: string
+                  example: "3f2a9c1e8b7d4e5f9a0b1c2d3e4f5a6b"
+                status_url:
+                  type: string
+                  example: "/api/jobs/3f2a9c1e8b7d4e5f9a0b1c2d3e4f5a6b"
+                events_url:
+                  type: string
+                  example: "/api/jobs/3f2a9c1e8b7d4e5f9a0b1c2d3e4f5a6b/events"
       400:
         description: Invalid request or missing required fields
       404:
         description: Note not found in Inbox
       500:
         description: Processing error
+      503:
+        description: Dropbox is unavailable, or the job queue is full; retry after the Retry-After header
+      504:
+        description: The request deadline was exceeded before the note could be uploaded
     """
     try:
         data = request.get_json()
@@ -176,6 +276,10 @@ def process_inbox_note(filename):
         
         metadata = data.get("metadata", {})
         copy_linked_files = data.get("copy_linked_files", True)  # Default to True now
+        inbox_mode = data.get("inbox_mode")
+        if inbox_mode is not None and inbox_mode not in INBOX_MODES:
+            return jsonify({"status": "error",
+                            "message": f"Invalid inbox_mode: {inbox_mode}. Use one of {', '.join(INBOX_MODES)}"}), 400
         
         # Validate required metadata
         if not metadata.get("title"):
@@ -185,76 +289,50 @@ def process_inbox_note(filename):
             
         # Validate date format
         try:
-            parsed_date = datetime.strptime(metadata["date"], "%Y-%m-%d")
+            datetime.strptime(metadata["date"], "%Y-%m-%d")
         except ValueError:
             return jsonify({"status": "error", "message": f"Invalid date format: {metadata['date']}. Use YYYY-MM-DD"}), 400
 
-        # Load original note content
-        original_content = dropbox_client.download_note_from_dropbox(filename, folder="Inbox")
-        if not original_content:
-            return jsonify({"status": "error", "message": f"Note '{filename}' not found in Inbox"}), 404
-
-        # Set default metadata values
-        metadata.setdefault("author", "user")
-        metadata.setdefault("source", "inbox")
-        metadata.setdefault("type", "note")
-        metadata.setdefault("status", "processed")
-        metadata.setdefault("language", "en")
-        metadata.setdefault("uid", f"{sanitize_filename(metadata['title'])}-{metadata['date']}")
+        if request.args.get("async") in ("1", "true"):
+            job_id = job_queue.submit("process_note", {
+                "filename": filename,
+                "metadata": metadata,
+                "copy_linked_files": copy_linked_files,
+                "inbox_mode": inbox_mode
+            })
+            log(f"🗂️ Queued processing of {filename} as job {job_id}")
+            status_url = url_for("jobs.get_job", job_id=job_id)
+            response = jsonify({
+                "status": "queued",
+                "job_id": job_id,
+                "status_url": status_url,
+                "events_url": url_for("jobs.job_events", job_id=job_id)
+            })
+            response.headers["Location"] = status_url
+            return response, 202
 
-        # Compute target paths
-        subfolder = parsed_date.strftime("%Y-%m")
-        new_filename = f"{metadata['date']}_{sanitize_filename(metadata['title'])}.md"
-        kb_folder_path = f"/Apps/SaveNotesGPT/NotesKB/{subfolder}"
-        kb_file_path = f"{kb_folder_path}/{new_filename}"
-
-        # Process note with link handling (preserves folder structure)
-        processing_result = process_note_with_links(
-            content=original_content,
-            metadata=metadata,
-            kb_folder_path=kb_folder_path,
-            copy_links=copy_linked_files
-        )
-
-        # Extract results
-        processed_content = processing_result["processed_content"]  # Unchanged content
-        detected_links = processing_result["detected_links"]
-        copy_result = processing_result["copy_result"]
-        final_metadata = processing_result["metadata"]
-
-        # Generate final structured content with YAML frontmatter
-        yaml_block = generate_yaml_front_matter(final_metadata)
-        structured_content = f"{yaml_block}\n\n{processed_content.strip()}"
-
-        # Upload processed note to Knowledge Base
-        upload_success = dropbox_client.upload_structured_note(kb_file_path, structured_content)
-        
-        # Calculate totals
-        total_links_detected = sum(len(links) for links in detected_links.values())
-        
-        # Log comprehensive result
-        if copy_result["total_copied"] > 0:
-            log(f"📦 Processed note with links: {filename} → {kb_file_path} "
-                f"(detected {total_links_detected}, copied {copy_result['total_copied']} files)")
-        else:
-            log(f"📦 Processed note: {filename} → {kb_file_path} "
-                f"(detected {total_links_detected} links, none copied)")
+        outcome = process_service.process_inbox_note(filename, metadata, copy_linked_files, inbox_mode=inbox_mode)
 
         return jsonify({
-            "status": "success",
+            "status": outcome["status"],
             "action": "processed",
-            "result": {
-                "source_note": filename,
-                "kb_path": kb_file_path,
-                "linked_files_detected": total_links_detected,
-                "linked_files_copied": copy_result["total_copied"],
-                "upload_success": upload_success,
-                "copied_files": copy_result["copied_files"],
-                "failed_files": copy_result["failed_files"]
-            },
-            "metadata_applied": final_metadata
+            "result": outcome["result"],
+            "metadata_applied": outcome["metadata_applied"],
+            "deduplicated": outcome["deduplicated"]
         }), 200
 
+    except DropboxFileNotFound:
+        return jsonify({"status": "error", "message": f"Note '{filename}' not found in Inbox"}), 404
+
+    except QueueFull as e:
+        log(f"⚠️ Job queue full, rejecting {filename}: {str(e)}", level="warning")
+        response = jsonify({"status": "error", "message": "Too many notes waiting to be processed"})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise  # answered with 503/504 by the app-level handlers
+
     except Exception as e:
         log(f"❌ Note processing error: {str(e)}", level="error")
         return jsonify({"status": "error", "message": str(e)}), 500
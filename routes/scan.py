@@ -1,10 +1,14 @@
 # routes/scan.py - Notes-focused inbox scanning
 
 from flask import Blueprint, request, jsonify
-from utils.config_utils import load_config, save_config, save_last_files
+from utils.config_utils import load_config, update_config, save_last_files
 from utils.logging_utils import log
-from services.dropbox_client import list_folder
-from utils.token_utils import require_token
+from services.catalog import catalog_for
+from services.ledger import ledger
+from utils.token_utils import idle_wait, require_token
+from services.dropbox_client import DropboxCursorReset, list_folder_changes
+from services.dropbox_gate import DropboxUnavailable
+from utils.deadline_utils import DeadlineExceeded, bounded, with_deadline
 from datetime import datetime, timezone
 
 inbox_notes_bp = Blueprint("inbox_notes", __name__, url_prefix="/api/inbox")
@@ -12,6 +16,7 @@ inbox_notes_bp = Blueprint("inbox_notes", __name__, url_prefix="/api/inbox")
 
 @inbox_notes_bp.route("/notes", methods=["GET"])
 @require_token
+@with_deadline("inbox_list", default=25)
 def list_inbox_notes():
     """
     List raw notes in the inbox awaiting GPT processing.
@@ -25,9 +30,9 @@ def list_inbox_notes():
         in: query
         schema:
           type: string
-          enum: [all, unprocessed]
+          enum: [all, unprocessed, processed]
           default: all
-        description: Filter notes by processing status
+        description: Filter notes by processing status (a note counts as processed once its current revision has been processed)
       - name: limit
         in: query
         schema:
@@ -67,6 +72,7 @@ def list_inbox_notes():
                         example: "meeting-ideas"
                       status:
                         type: string
+                        enum: [unprocessed, processed]
                         example: "unprocessed"
                       created:
                         type: string
@@ -116,13 +122,19 @@ def list_inbox_notes():
         config = load_config()
         inbox_path = config.get("inbox_path")
         
-        # Get raw entries from Dropbox
-        entries = list_folder(inbox_path)
+        # Served from the Inbox catalog, which the scheduler keeps fresh; a stale catalog
+        # catches up with a single list_folder/continue call
+        entries = catalog_for(inbox_path).entries()
         
         # Transform to notes with meaningful metadata
+        ledger.refresh()
         notes = []
         for item in entries:
             if item[".tag"] == "file" and item["name"].endswith(".md"):
+                processed = ledger.is_processed(item.get("path_lower", ""), item.get("rev"))
+                if (status == "unprocessed" and processed) or (status == "processed" and not processed):
+                    continue
+
                 # Extract title from filename (remove date prefix and extension)
                 filename = item["name"]
                 title = filename.replace('.md', '')
@@ -135,17 +147,12 @@ def list_inbox_notes():
                 notes.append({
                     "filename": filename,
                     "title": title.replace('_', ' ').replace('-', ' '),
-                    "status": "unprocessed",  # All inbox notes are unprocessed
+                    "status": "processed" if processed else "unprocessed",
                     "created": item.get("client_modified"),
                     "size": item.get("size"),
                     "path": f"/api/inbox/notes/{filename}"
                 })
         
-        # Apply status filter (currently all inbox notes are unprocessed)
-        if status == "unprocessed":
-            # No filtering needed since all inbox notes are unprocessed
-            pass
-        
         # Sort by creation date (newest first)
         notes.sort(key=lambda x: x.get("created", ""), reverse=True)
         
@@ -153,10 +160,9 @@ def list_inbox_notes():
         total = len(notes)
         paginated_notes = notes[offset:offset + limit]
         
-        # Update scan timestamp and save file list
-        config["last_scan"] = datetime.now(timezone.utc).isoformat()
-        save_config(config)
-        save_last_files([note["filename"] for note in paginated_notes])
+        # Update scan timestamp and save file list; written in the background, not on this request
+        update_config({"last_scan": datetime.now(timezone.utc).isoformat()}, later=True)
+        save_last_files([note["filename"] for note in paginated_notes], later=True)
         
         log(f"📥 Listed {len(paginated_notes)} inbox notes (total: {total})")
         
@@ -176,10 +182,165 @@ def list_inbox_notes():
         log(f"❌ Invalid query parameters: {str(e)}", level="error")
         return jsonify({"status": "error", "message": "Invalid query parameters"}), 400
         
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise  # answered with 503/504 by the app-level handlers
+
     except Exception as e:
         log(f"❌ List inbox notes error: {str(e)}", level="error")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def _change_from_entry(change, entry):
+    """
+    Builds the API representation of one change-log record.
+    """
+    item = {"change": change, "filename": entry["name"], "path": f"/api/inbox/notes/{entry['name']}"}
+    if change != "deleted":
+        item.update({"modified": entry.get("client_modified"), "size": entry.get("size"), "rev": entry.get("rev")})
+    return item
+
+
+def _changes_from_dropbox(catalog, cursor):
+    """
+    Inbox changes after a cursor this process does not know (issued by another worker or before
+    a restart), read from Dropbox. Only notes directly in the Inbox are reported, whatever folder
+    the cursor was issued for. Raises DropboxCursorReset if Dropbox does not accept the cursor.
+    """
+    entries, _ = list_folder_changes(catalog.path, cursor=cursor)
+    folder = catalog.path.lower()
+    changes = []
+    for entry in entries:
+        path = entry.get("path_lower", "")
+        if path.rsplit("/", 1)[0] != folder or not entry["name"].endswith(".md") or entry[".tag"] == "folder":
+            continue
+        if entry[".tag"] == "deleted":
+            changes.append(_change_from_entry("deleted", entry))
+        else:
+            changes.append(_change_from_entry("modified" if catalog.find(entry["name"]) else "added", entry))
+    return changes
+
+
+def _feed_response(cursor, changes, reset=False):
+    return jsonify({"status": "success", "cursor": cursor, "reset": reset, "changes": changes}), 200
+
+
+@inbox_notes_bp.route("/changes", methods=["GET"])
+@require_token
+@with_deadline("inbox_changes", default=95)
+def inbox_changes():
+    """
+    Long-poll for notes added, modified or deleted in the Inbox.
+    ---
+    tags:
+      - Inbox Notes
+    summary: Inbox change feed
+    description: |
+      Returns the Inbox notes that changed since `cursor`, waiting up to `timeout` seconds for a change
+      if there is none yet (never past the request deadline, `DEADLINE_INBOX_CHANGES`, default 95s).
+      Call it without a cursor to get the current one, then call it again with the `cursor` from each
+      response.
+
+      Cursors are Dropbox listing cursors, so any server worker can continue from them. A worker that
+      did not issue the cursor reads the changes from Dropbox once, so after switching workers a change
+      may be reported twice. All clients waiting on a worker share a single upstream Dropbox longpoll.
+      Waiting does not count against the token's concurrency limit, but every waiting client holds one
+      request thread (`WEB_CONCURRENCY` x `GUNICORN_THREADS` per instance, shared with other requests),
+      so each token may have at most `TOKEN_WATCHERS` polls waiting per worker (default 4).
+      When the response has `reset: true`, Dropbox no longer accepts the cursor: list
+      `/api/inbox/notes` again and continue with the new cursor.
+    parameters:
+      - name: cursor
+        in: query
+        schema:
+          type: string
+        description: Cursor from the previous response; omit to start watching from now
+      - name: timeout
+        in: query
+        schema:
+          type: integer
+          default: 30
+          minimum: 0
+          maximum: 90
+        description: Seconds to wait for a change before answering with an empty list
+    responses:
+      200:
+        description: Changes since the cursor (possibly none)
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                status:
+                  type: string
+                  example: success
+                cursor:
+                  type: string
+                  example: "AAGvR5ZK7Jx2a0q9..."
+                reset:
+                  type: boolean
+                  example: false
+                changes:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      change:
+                        type: string
+                        enum: [added, modified, deleted]
+                      filename:
+                        type: string
+                        example: "2025-07-03_meeting-ideas.md"
+                      path:
+                        type: string
+                        example: "/api/inbox/notes/2025-07-03_meeting-ideas.md"
+                      modified:
+                        type: string
+                        format: date-time
+                      size:
+                        type: integer
+                      rev:
+                        type: string
+      400:
+        description: Invalid timeout
+      429:
+        description: Too many polls of this token already waiting; retry after `Retry-After` seconds
+    """
+    try:
+        timeout = min(max(float(request.args.get("timeout", 30)), 0), 90)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid timeout"}), 400
+    # Leave a second of the deadline to answer
+    timeout = max(bounded(timeout) - 1, 0)
+
+    catalog = catalog_for(load_config().get("inbox_path"))
+    if catalog.feed_cursor is None:
+        catalog.refresh()
+
+    cursor = request.args.get("cursor")
+    if not cursor:
+        return _feed_response(catalog.feed_cursor, [])
+
+    records, latest = catalog.changes_after(cursor)
+    if records is None:
+        # Taken before asking Dropbox, so continuing from it can repeat a change but never skip one
+        try:
+            changes = _changes_from_dropbox(catalog, cursor)
+        except DropboxCursorReset:
+            return _feed_response(latest, [], reset=True)
+        if changes:
+            return _feed_response(latest, changes)
+        cursor, records = latest, []
+
+    if not records:
+        with idle_wait():
+            catalog.wait_for_change(cursor, timeout)
+        records, latest = catalog.changes_after(cursor)
+        if records is None:
+            return _feed_response(latest, [], reset=True)
+
+    changes = [_change_from_entry(change, entry) for _, change, entry in records if entry["name"].endswith(".md")]
+    return _feed_response(latest, changes)
+
+
 # Export for app.py
 inbox_notes_routes = inbox_notes_bp
\ No newline at end of file
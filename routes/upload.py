@@ -1,10 +1,13 @@
 # routes/upload.py - Note creation and upload
 
 from flask import Blueprint, request, jsonify
-from services.dropbox_client import upload_note_to_dropbox
+from services.dropbox_client import NOTES_KB_PATH, upload_note_to_dropbox
+from services.catalog import mark_stale
 from utils.logging_utils import log
 from utils.token_utils import require_token
 from utils.dropbox_utils import sanitize_filename
+from services.dropbox_gate import DropboxUnavailable
+from utils.deadline_utils import DeadlineExceeded, with_deadline
 from datetime import datetime
 
 # Blueprint for note uploads
@@ -13,6 +16,7 @@ upload_note_bp = Blueprint("upload_note", __name__, url_prefix="/api")
 
 @upload_note_bp.route("/inbox/notes", methods=["POST"])
 @require_token
+@with_deadline("note_create", default=20)
 def create_inbox_note():
     """
     Create a new raw note in the Inbox for later GPT processing.
@@ -164,6 +168,8 @@ def create_inbox_note():
         upload_success = upload_note_to_dropbox(title, date_str, content)
 
         if upload_success:
+            # upload_note_to_dropbox stores the note under NotesKB/{YYYY-MM}/
+            mark_stale(f"{NOTES_KB_PATH}/{date_str[:7]}/{date_str}_{title.replace(' ', '_')}.md")
             created_timestamp = datetime.now().isoformat()
             
             log(f"📝 Raw note created in Inbox: {filename} (source: {source})")
@@ -187,6 +193,9 @@ def create_inbox_note():
                 "message": "Failed to upload note to Dropbox"
             }), 500
 
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise  # answered with 503/504 by the app-level handlers
+
     except Exception as e:
         log(f"❌ Note creation error: {str(e)}", level="error")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -194,6 +203,7 @@ def create_inbox_note():
 
 @upload_note_bp.route("/kb/notes", methods=["POST"])
 @require_token
+@with_deadline("note_create", default=20)
 def create_kb_note():
     """
     Create a note directly in the Knowledge Base (already processed with metadata).
@@ -314,6 +324,7 @@ def create_kb_note():
         upload_success = upload_structured_note(kb_path, content)
 
         if upload_success:
+            mark_stale(kb_path)
             log(f"📚 Note created directly in KB: {kb_path}")
             
             return jsonify({
@@ -332,6 +343,9 @@ def create_kb_note():
                 "message": "Failed to upload note to Knowledge Base"
             }), 500
 
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise  # answered with 503/504 by the app-level handlers
+
     except Exception as e:
         log(f"❌ KB note creation error: {str(e)}", level="error")
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -0,0 +1,87 @@
+# routes/webhooks.py - Dropbox change notifications
+
+import os
+import hmac
+import hashlib
+from flask import Blueprint, Response, request, jsonify
+from services.catalog import request_sync
+from utils.logging_utils import log
+
+webhooks_bp = Blueprint("webhooks", __name__, url_prefix="/webhooks")
+
+
+def _valid_signature(body: bytes, signature: str) -> bool:
+    """
+    Checks X-Dropbox-Signature: the hex HMAC-SHA256 of the request body keyed with the app secret.
+    """
+    secret = os.getenv("DROPBOX_APP_SECRET")
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+@webhooks_bp.route("/dropbox", methods=["GET"])
+def dropbox_challenge():
+    """
+    Dropbox webhook verification handshake.
+    ---
+    tags:
+      - Webhooks
+    summary: Answer the Dropbox webhook challenge
+    description: Dropbox calls this once when the webhook URI is registered and expects the `challenge` echoed back.
+    parameters:
+      - name: challenge
+        in: query
+        required: true
+        schema:
+          type: string
+    responses:
+      200:
+        description: The challenge, echoed as plain text
+      400:
+        description: Missing challenge
+    """
+    challenge = request.args.get("challenge")
+    if not challenge:
+        return jsonify({"status": "error", "message": "Missing challenge"}), 400
+    return Response(challenge, mimetype="text/plain", headers={"X-Content-Type-Options": "nosniff"})
+
+
+@webhooks_bp.route("/dropbox", methods=["POST"])
+def dropbox_notification():
+    """
+    Receive a Dropbox change notification.
+    ---
+    tags:
+      - Webhooks
+    summary: Dropbox change notification
+    description: |
+      Dropbox sends this when files in the app folder change. The body is signed with the app secret
+      (`X-Dropbox-Signature`). The request is acknowledged immediately; the Inbox and KB catalogs then
+      fetch the changes since their saved cursors on a background thread, and only the notes that changed
+      are dropped from the listing, content and front matter caches.
+    parameters:
+      - name: X-Dropbox-Signature
+        in: header
+        required: true
+        schema:
+          type: string
+        description: Hex HMAC-SHA256 of the request body keyed with the Dropbox app secret
+    responses:
+      200:
+        description: Notification accepted
+      403:
+        description: Missing or invalid signature
+    """
+    if not _valid_signature(request.get_data(), request.headers.get("X-Dropbox-Signature", "")):
+        log("🚫 Rejected Dropbox webhook with an invalid signature", level="warning")
+        return jsonify({"status": "error", "message": "Invalid signature"}), 403
+
+    # Dropbox expects an answer within 10 seconds; the listing runs off-thread
+    request_sync()
+    return jsonify({"status": "accepted"}), 200
+
+
+# Export for app.py
+webhooks_routes = webhooks_bp
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Memory used by a KB catalog: Dropbox's list_folder entry dicts held as they arrive, against
+the compact CatalogEntry records FolderCatalog keeps (services/catalog_entry.py).
+
+Entries are synthetic but shaped like real list_folder results (ids, 15-character revs,
+content hashes, sharing fields) and spread over monthly folders, as a KB is.
+
+Usage:
+    python scripts/benchmark_catalog_memory.py --notes 100000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from services.catalog_entry import CatalogEntry  # noqa: E402
+
+ROOT = "/Apps/SaveNotesGPT/NotesKB"
+WORDS = ["meeting", "notes", "project", "ideas", "review", "plan", "draft", "weekly", "research", "summary"]
+
+
+def list_folder_response(count: int) -> bytes:
+    """
+    A list_folder response body with `count` notes in monthly folders.
+    """
+    rng = random.Random(42)
+    entries = []
+    for i in range(count):
+        year, month, day = 2020 + i % 6, 1 + i % 12, 1 + i % 28
+        folder = f"{year}-{month:02d}"
+        name = f"{folder}-{day:02d}_{'-'.join(rng.sample(WORDS, 3))}-{i}.md"
+        stamp = f"{folder}-{day:02d}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}Z"
+        path = f"{ROOT}/{folder}/{name}"
+        entries.append({
+            ".tag": "file",
+            "name": name,
+            "path_lower": path.lower(),
+            "path_display": path,
+            "id": "id:" + "".join(rng.choice("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789")
+                                  for _ in range(22)),
+            "client_modified": stamp,
+            "server_modified": stamp,
+            "rev": "%015x" % rng.getrandbits(60),
+            "size": rng.randrange(200, 20000),
+            "is_downloadable": True,
+            "content_hash": "%064x" % rng.getrandbits(256),
+        })
+    return json.dumps({"entries": entries, "cursor": "x", "has_more": False}).encode("utf-8")
+
+
+def measure(build):
+    """
+    Bytes still allocated by what `build()` returns, and the seconds it takes (timed in a
+    separate run, as tracing allocations slows it down).
+    """
+    gc.collect()
+    started = time.perf_counter()
+    kept = build()
+    elapsed = time.perf_counter() - started
+    del kept
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=100000)
+    args = parser.parse_args()
+
+    body = list_folder_response(args.notes)
+
+    def as_dicts():
+        return {entry["path_lower"]: entry for entry in json.loads(body)["entries"]}
+
+    def as_records():
+        # Parsing is part of both builds; only the records are kept here
+        return {entry["path_lower"]: CatalogEntry(entry, ROOT) for entry in json.loads(body)["entries"]}
+
+    dict_bytes, dict_seconds = measure(as_dicts)
+    record_bytes, record_seconds = measure(as_records)
+
+    print(f"{args.notes} notes")
+    print(f"  list_folder dicts : {dict_bytes / 2**20:8.1f} MiB  {dict_bytes / args.notes:6.0f} B/note  "
+          f"built in {dict_seconds:.2f}s")
+    print(f"  CatalogEntry      : {record_bytes / 2**20:8.1f} MiB  {record_bytes / args.notes:6.0f} B/note  "
+          f"built in {record_seconds:.2f}s")
+    print(f"  saved             : {(1 - record_bytes / dict_bytes) * 100:.0f}%")
+
+    records = as_records()
+    started = time.perf_counter()
+    for entry in records.values():
+        entry["path_display"], entry.get("rev"), entry.get("client_modified")
+    print(f"  reading path_display, rev and client_modified of every entry: "
+          f"{(time.perf_counter() - started) * 1e6 / args.notes:.2f} µs/note")
+
+
+if __name__ == "__main__":
+    main()
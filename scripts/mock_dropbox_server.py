@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the subset of the Dropbox API used by SaveNotesGPT.
+
+Keeps an in-memory file tree and can inject the transient failures Dropbox
+produces under load (429 too_many_requests with Retry-After, 503, and 409
+too_many_write_operations), so retry and resilience behaviour can be exercised
+without touching a real account.
+
+With --webhook, every write is followed by a signed change notification to that URL,
+the way Dropbox notifies a registered webhook.
+
+Usage:
+    python scripts/mock_dropbox_server.py --port 8765 --fail-first 2
+    python scripts/mock_dropbox_server.py --webhook http://localhost:5000/webhooks/dropbox --app-secret x
+
+Then run the app against it:
+    DROPBOX_API_BASE=http://localhost:8765 DROPBOX_CONTENT_BASE=http://localhost:8765 \
+    DROPBOX_APP_KEY=x DROPBOX_APP_SECRET=x DROPBOX_REFRESH_TOKEN=x python app.py
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BLOCK_SIZE = 4 * 1024 * 1024
+
+SEED_FILES = {
+    "/Apps/SaveNotesGPT/Inbox/2025-07-03_test-note.md":
+        b"# Test note\n\nSee the diagram: ![[diagram.png]]\n",
+    "/Apps/SaveNotesGPT/Inbox/diagram.png": b"\x89PNG\r\n\x1a\nstand-in image bytes",
+    "/Apps/SaveNotesGPT/NotesKB/2025-07/2025-07-01_existing-note.md":
+        b"---\ntitle: Existing note\ndate: '2025-07-01'\ntags:\n- standin\n---\n\nAlready in the KB.\n",
+}
+
+WRITE_ENDPOINTS = ("/2/files/upload", "/2/files/copy_v2", "/2/files/move_batch_v2", "/2/files/delete_batch")
+UNFAULTED_ENDPOINTS = ("/2/files/list_folder/longpoll",)
+
+
+def content_hash(data: bytes) -> str:
+    blocks = b"".join(hashlib.sha256(data[i:i + BLOCK_SIZE]).digest() for i in range(0, len(data), BLOCK_SIZE))
+    return hashlib.sha256(blocks).hexdigest()
+
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}
+        self.rev = 0
+        self.jobs = {}
+        for path, data in SEED_FILES.items():
+            self.put(path, data)
+
+    def put(self, path, data):
+        with self.lock:
+            self.rev += 1
+            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            self.files[path.lower()] = {
+                ".tag": "file",
+                "name": path.rsplit("/", 1)[-1],
+                "path_lower": path.lower(),
+                "path_display": path,
+                "id": f"id:{abs(hash(path.lower())):x}",
+                "rev": f"{self.rev:09x}",
+                "size": len(data),
+                "client_modified": now,
+                "server_modified": now,
+                "content_hash": content_hash(data),
+                "_data": data,
+                "_seq": self.rev,
+            }
+            return self.public(self.files[path.lower()])
+
+    def delete(self, path):
+        """
+        Replaces a file with a tombstone, so delta listings report it as deleted.
+        """
+        with self.lock:
+            entry = self.files.get(path.lower())
+            if not entry or entry[".tag"] == "deleted":
+                return None
+            self.rev += 1
+            self.files[path.lower()] = {".tag": "deleted", "name": entry["name"], "path_lower": entry["path_lower"],
+                                        "path_display": entry["path_display"], "_seq": self.rev}
+            return entry
+
+    def move(self, from_path, to_path):
+        source = self.get(from_path)
+        if not source:
+            return {".tag": "failure", "failure": {".tag": "from_lookup", "from_lookup": {".tag": "not_found"}}}
+        if self.get(to_path):
+            return {".tag": "failure", "failure": {".tag": "to", "to": {".tag": "conflict"}}}
+        metadata = self.put(to_path, source["_data"])
+        self.delete(from_path)
+        return {".tag": "success", "success": metadata}
+
+    def start_job(self, entries):
+        """
+        Registers the result of a batch operation; it is reported once polled like a Dropbox async job.
+        """
+        with self.lock:
+            job_id = f"job-{len(self.jobs) + 1}"
+            self.jobs[job_id] = entries
+            return job_id
+
+    @staticmethod
+    def public(entry):
+        return {k: v for k, v in entry.items() if not k.startswith("_")}
+
+    def get(self, path):
+        entry = self.files.get(path.lower())
+        return entry if entry and entry[".tag"] == "file" else None
+
+    def list(self, path, recursive, since=0, until=None):
+        """
+        Lists a folder; with `since`, only files written or deleted after that store revision (a cursor delta).
+        """
+        prefix = path.lower().rstrip("/") + "/"
+        entries, folders = [], set()
+        for key, entry in sorted(self.files.items()):
+            if not key.startswith(prefix) or entry["_seq"] <= since or (until and entry["_seq"] > until):
+                continue
+            if entry[".tag"] == "deleted" and not since:
+                continue
+            relative = entry["path_display"][len(prefix):].split("/")
+            # Synthesize folder entries for every intermediate directory
+            for depth in range(1, len(relative)):
+                if depth > 1 and not recursive:
+                    break
+                folder = entry["path_display"][:len(prefix)] + "/".join(relative[:depth])
+                if folder.lower() not in folders and not since:
+                    folders.add(folder.lower())
+                    entries.append({".tag": "folder", "name": relative[depth - 1],
+                                    "path_lower": folder.lower(), "path_display": folder})
+            if recursive or len(relative) == 1:
+                entries.append(self.public(entry))
+        return entries
+
+
+class Faults:
+    """
+    Fails the first N attempts of every distinct (endpoint, argument) call.
+    """
+
+    def __init__(self, fail_first, retry_after):
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def next_fault(self, endpoint, arg):
+        with self.lock:
+            count = self.seen.get((endpoint, arg), 0)
+            self.seen[(endpoint, arg)] = count + 1
+        if count >= self.fail_first:
+            return None
+        if endpoint in WRITE_ENDPOINTS:
+            return (409, {"error_summary": "too_many_write_operations/..",
+                          "error": {".tag": "too_many_write_operations"}}, {})
+        if count % 2 == 0:
+            return (429, {"error_summary": "too_many_requests/..",
+                          "error": {"reason": {".tag": "too_many_requests"}, "retry_after": self.retry_after}},
+                    {"Retry-After": str(self.retry_after)})
+        return (503, {"error_summary": "service_unavailable"}, {})
+
+
+def notify_webhook(url, secret):
+    """
+    Posts a signed change notification, like Dropbox does after files change.
+    """
+    body = json.dumps({"list_folder": {"accounts": ["dbid:standin"]},
+                       "delta": {"users": [1]}}).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    request = urllib.request.Request(url, data=body, method="POST", headers={
+        "Content-Type": "application/json", "X-Dropbox-Signature": signature})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            print(f"[standin] 🔔 webhook → {response.status}")
+    except Exception as e:
+        print(f"[standin] 🔔 webhook failed: {e}")
+
+
+def make_handler(store, faults, page_size, latency, on_write=None):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive like the real API, so client connection pooling is exercised; without
+        # TCP_NODELAY the separate header and body writes would stall on delayed ACKs
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, fmt, *args):
+            print(f"[standin] {self.command} {self.path} → " + (fmt % args))
+
+        def send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_text(self, status, text):
+            data = text.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def not_found(self, path):
+            self.send_json(409, {"error_summary": "path/not_found/..",
+                                 "error": {".tag": "path", "path": {".tag": "not_found"}}})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            arg = self.headers.get("Dropbox-API-Arg") or body.decode("utf-8", "replace")
+            time.sleep(latency)
+
+            fault = None if self.path in UNFAULTED_ENDPOINTS else faults.next_fault(self.path, arg)
+            if fault:
+                return self.send_json(*fault)
+
+            if self.path == "/oauth2/token":
+                return self.send_json(200, {"access_token": "standin-token", "token_type": "bearer",
+                                            "expires_in": 14400})
+
+            if self.path in ("/2/files/list_folder", "/2/files/list_folder/continue"):
+                params = json.loads(body or b"{}")
+                if "cursor" in params:
+                    try:
+                        params = json.loads(base64.urlsafe_b64decode(params["cursor"]))
+                    except ValueError:
+                        return self.send_text(400, 'Error in call to API function "files/list_folder/continue": '
+                                                   'Invalid "cursor" parameter')
+                # A cursor pins the store revision its listing started from ("until"); once the
+                # listing is exhausted it becomes a delta cursor for changes after that revision
+                params.setdefault("until", store.rev)
+                entries = store.list(params["path"], params.get("recursive", False), params.get("since", 0),
+                                     params["until"])
+                offset = params.get("offset", 0)
+                page = entries[offset:offset + page_size]
+                has_more = offset + len(page) < len(entries)
+                if has_more:
+                    cursor = dict(params, offset=offset + len(page))
+                else:
+                    cursor = {"path": params["path"], "recursive": params.get("recursive", False),
+                              "since": params["until"]}
+                return self.send_json(200, {
+                    "entries": page,
+                    "cursor": base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode(),
+                    "has_more": has_more,
+                })
+
+            if self.path == "/2/files/list_folder/longpoll":
+                params = json.loads(body)
+                cursor = json.loads(base64.urlsafe_b64decode(params["cursor"]))
+                since = cursor.get("since", cursor.get("until", 0))
+                deadline = time.monotonic() + min(params.get("timeout", 30), 480)
+                while time.monotonic() < deadline:
+                    if store.list(cursor["path"], cursor.get("recursive", False), since):
+                        return self.send_json(200, {"changes": True})
+                    time.sleep(0.2)
+                return self.send_json(200, {"changes": False})
+
+            if self.path == "/2/files/download":
+                path = json.loads(arg)["path"]
+                entry = store.get(path)
+                if not entry:
+                    return self.not_found(path)
+                data, status = entry["_data"], 200
+                headers = {"Dropbox-API-Result": json.dumps(store.public(entry)),
+                           "Content-Type": "application/octet-stream"}
+                byte_range = self.headers.get("Range", "")
+                if byte_range.startswith("bytes="):
+                    start, _, end = byte_range[6:].partition("-")
+                    start, end = (int(start), min(int(end or len(data) - 1), len(data) - 1)) if start \
+                        else (max(len(data) - int(end), 0), len(data) - 1)
+                    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+                    data, status = data[start:end + 1], 206
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                return self.wfile.write(data)
+
+            if self.path == "/2/files/get_metadata":
+                path = json.loads(body)["path"]
+                entry = store.get(path)
+                return self.send_json(200, store.public(entry)) if entry else self.not_found(path)
+
+            if self.path == "/2/files/upload":
+                params = json.loads(arg)
+                if params.get("content_hash") and params["content_hash"] != content_hash(body):
+                    return self.send_json(400, {"error_summary": "content_hash_mismatch/.."})
+                self.send_json(200, store.put(params["path"], body))
+                return on_write and on_write()
+
+            if self.path == "/2/files/copy_v2":
+                params = json.loads(body)
+                source, target = store.get(params["from_path"]), store.get(params["to_path"])
+                if not source:
+                    return self.not_found(params["from_path"])
+                if target:
+                    return self.send_json(409, {"error_summary": "to/conflict/file/.."})
+                self.send_json(200, {"metadata": store.put(params["to_path"], source["_data"])})
+                return on_write and on_write()
+
+            if self.path == "/2/files/move_batch_v2":
+                params = json.loads(body)
+                results = [store.move(e["from_path"], e["to_path"]) for e in params["entries"]]
+                self.send_json(200, {".tag": "async_job_id", "async_job_id": store.start_job(results)})
+                return on_write and on_write()
+
+            if self.path == "/2/files/delete_batch":
+                params = json.loads(body)
+                results = []
+                for e in params["entries"]:
+                    entry = store.delete(e["path"])
+                    results.append({".tag": "success", "metadata": store.public(entry)} if entry else
+                                   {".tag": "failure", "failure": {".tag": "path_lookup",
+                                                                   "path_lookup": {".tag": "not_found"}}})
+                self.send_json(200, {".tag": "async_job_id", "async_job_id": store.start_job(results)})
+                return on_write and on_write()
+
+            if self.path in ("/2/files/move_batch/check_v2", "/2/files/delete_batch/check"):
+                job_id = json.loads(body)["async_job_id"]
+                if job_id not in store.jobs:
+                    return self.send_json(409, {"error_summary": "invalid_async_job_id/.."})
+                return self.send_json(200, {".tag": "complete", "entries": store.jobs[job_id]})
+
+            self.send_json(400, {"error_summary": f"unsupported endpoint {self.path}"})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-first", type=int, default=0,
+                        help="fail the first N attempts of every distinct call with a transient error")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--page-size", type=int, default=2, help="entries per list_folder page")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--webhook", help="URL to send a signed change notification to after every write")
+    parser.add_argument("--app-secret", default="standin", help="secret used to sign webhook notifications")
+    args = parser.parse_args()
+
+    on_write = None
+    if args.webhook:
+        def on_write():
+            threading.Thread(target=notify_webhook, args=(args.webhook, args.app_secret), daemon=True).start()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_handler(Store(), Faults(args.fail_first, args.retry_after), args.page_size,
+                                              args.latency, on_write))
+    print(f"🧪 Dropbox stand-in listening on http://127.0.0.1:{args.port} (fail-first={args.fail_first})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the subset of Redis used by the shared cache (CACHE_BACKEND=redis).
+
+Speaks the Redis protocol (RESP2) and keeps keys in memory with millisecond TTLs and an
+optional LRU size limit, like a redis-server with maxmemory-policy allkeys-lru.
+
+Usage:
+    python scripts/mock_redis_server.py --port 6390 --maxmemory 1048576
+
+Then run the app against it:
+    CACHE_BACKEND=redis CACHE_URL=redis://localhost:6390/0 python app.py
+"""
+import argparse
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+
+
+class Store:
+    def __init__(self, maxmemory: int):
+        self.lock = threading.Lock()
+        self.maxmemory = maxmemory
+        self.items = OrderedDict()
+        self.size = 0
+
+    def _live(self, key):
+        item = self.items.get(key)
+        if item and item[1] is not None and item[1] <= time.monotonic():
+            self._pop(key)
+            return None
+        return item
+
+    def _pop(self, key):
+        item = self.items.pop(key, None)
+        if item:
+            self.size -= len(key) + len(item[0])
+        return item
+
+    def get(self, key):
+        with self.lock:
+            item = self._live(key)
+            if item is None:
+                return None
+            self.items.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, ttl_ms=None):
+        with self.lock:
+            self._pop(key)
+            self.items[key] = (value, None if ttl_ms is None else time.monotonic() + ttl_ms / 1000)
+            self.size += len(key) + len(value)
+            while self.maxmemory and self.size > self.maxmemory and len(self.items) > 1:
+                self._pop(next(iter(self.items)))
+
+    def delete(self, keys):
+        with self.lock:
+            return sum(1 for key in keys if self._live(key) and self._pop(key))
+
+    def pttl(self, key):
+        with self.lock:
+            item = self._live(key)
+            if item is None:
+                return -2
+            return -1 if item[1] is None else int((item[1] - time.monotonic()) * 1000)
+
+    def flush(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, e.g. from telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is None:
+            data = b"$-1\r\n"
+        elif isinstance(value, int):
+            data = b":%d\r\n" % value
+        elif isinstance(value, str):
+            data = value.encode() + b"\r\n"
+        else:
+            data = b"$%d\r\n%s\r\n" % (len(value), value)
+        self.wfile.write(data)
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            command = args[0].upper()
+            if command == b"PING":
+                self.reply("+PONG")
+            elif command in (b"CLIENT", b"SELECT", b"HELLO"):
+                self.reply("+OK" if command != b"HELLO" else "-ERR unknown command 'HELLO'")
+            elif command == b"GET":
+                self.reply(store.get(args[1]))
+            elif command == b"SET":
+                options = [a.upper() for a in args[3:]]
+                ttl_ms = None
+                if b"PX" in options:
+                    ttl_ms = int(args[3 + options.index(b"PX") + 1])
+                elif b"EX" in options:
+                    ttl_ms = int(args[3 + options.index(b"EX") + 1]) * 1000
+                store.set(args[1], args[2], ttl_ms)
+                self.reply("+OK")
+            elif command == b"DEL":
+                self.reply(store.delete(args[1:]))
+            elif command == b"PTTL":
+                self.reply(store.pttl(args[1]))
+            elif command == b"DBSIZE":
+                self.reply(len(store.items))
+            elif command in (b"FLUSHDB", b"FLUSHALL"):
+                store.flush()
+                self.reply("+OK")
+            else:
+                self.reply(f"-ERR unknown command '{command.decode(errors='replace')}'")
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--maxmemory", type=int, default=0, help="Bytes kept before evicting (0 = no limit)")
+    args = parser.parse_args()
+
+    server = Server(("127.0.0.1", args.port), Handler)
+    server.store = Store(args.maxmemory)
+    print(f"🧪 Redis stand-in listening on 127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/bin/bash
+# Runs the API against the local Dropbox stand-in with injected transient failures
+# (429 + Retry-After, 503, too_many_write_operations) and checks every call still succeeds.
+cd "$(dirname "$0")/.." || exit 1
+
+STANDIN_PORT=${STANDIN_PORT:-8765}
+API_PORT=${API_PORT:-5055}
+API="http://localhost:$API_PORT"
+
+if [ -d "venv" ]; then
+  source venv/bin/activate
+fi
+
+export GPT_TOKEN=${GPT_TOKEN:-sk-GPT-STANDIN}
+# A second client with a small burst, to check per-token rate limiting
+export API_TOKENS="limited=sk-LIMITED-STANDIN" TOKEN_BURST_LIMITED=2 TOKEN_RATE_LIMITED=0.1
+export ADMIN_USERNAME=${ADMIN_USERNAME:-admin}
+export ADMIN_PASSWORD=${ADMIN_PASSWORD:-standin}
+export DROPBOX_APP_KEY=standin DROPBOX_APP_SECRET=standin DROPBOX_REFRESH_TOKEN=standin
+export DROPBOX_API_BASE="http://127.0.0.1:$STANDIN_PORT"
+export DROPBOX_CONTENT_BASE="http://127.0.0.1:$STANDIN_PORT"
+export DROPBOX_RETRY_BASE_DELAY=0.05
+# Every call fails on purpose here, and warm-up and the scheduler call Dropbox too; keep the breaker out of the way
+export DROPBOX_BREAKER_THRESHOLD=50
+unset MOCK_MODE
+
+echo "🧪 Starting Dropbox stand-in (every call fails twice first)..."
+python scripts/mock_dropbox_server.py --port "$STANDIN_PORT" --fail-first 2 > standin.log 2>&1 &
+STANDIN_PID=$!
+
+echo "⚙️ Starting Flask against the stand-in..."
+PORT="$API_PORT" python app.py > flask.log 2>&1 &
+FLASK_PID=$!
+
+trap 'kill $FLASK_PID $STANDIN_PID 2>/dev/null' EXIT
+
+for i in $(seq 1 10); do
+  curl -s "$API/" > /dev/null && break
+  sleep 1
+done
+
+FAILED=0
+function expect_status() {
+  local name="$1" expected="$2" method="$3" url="$4" data="$5"
+  local status
+  if [ -n "$data" ]; then
+    status=$(curl -s -o /dev/null -w "%{http_code}" -X "$method" "$url" \
+      -H "Authorization: Bearer $GPT_TOKEN" -H "Content-Type: application/json" -d "$data")
+  else
+    status=$(curl -s -o /dev/null -w "%{http_code}" -X "$method" "$url" -H "Authorization: Bearer $GPT_TOKEN")
+  fi
+  if [ "$status" == "$expected" ]; then
+    echo "✅ $name ($status)"
+  else
+    echo "❌ $name: expected $expected, got $status"
+    FAILED=1
+  fi
+}
+
+expect_status "List Inbox notes" 200 GET "$API/api/inbox/notes"
+expect_status "List KB notes" 200 GET "$API/api/kb/notes"
+expect_status "Raw Inbox note" 200 GET "$API/api/inbox/notes/2025-07-03_test-note.md/raw"
+expect_status "Create Inbox note" 201 POST "$API/api/inbox/notes" '{"title": "Fault Test", "content": "# Faults", "date": "2025-07-04"}'
+expect_status "Process Inbox note" 200 PATCH "$API/api/inbox/notes/2025-07-03_test-note.md" \
+  '{"action": "process", "metadata": {"title": "Test Note", "date": "2025-07-03"}}'
+# Repeating the request in archive mode moves the processed note to Inbox/_processed/2025-07
+ARCHIVE_REQUEST='{"action": "process", "metadata": {"title": "Test Note", "date": "2025-07-03"}, "inbox_mode": "archive"}'
+expect_status "Archive processed note" 200 PATCH "$API/api/inbox/notes/2025-07-03_test-note.md" "$ARCHIVE_REQUEST"
+expect_status "Archived note left the Inbox" 404 GET "$API/api/inbox/notes/2025-07-03_test-note.md/raw"
+expect_status "Repeat after archiving" 200 PATCH "$API/api/inbox/notes/2025-07-03_test-note.md" "$ARCHIVE_REQUEST"
+
+CHALLENGE=$(curl -s "$API/webhooks/dropbox?challenge=standin-challenge")
+if [ "$CHALLENGE" == "standin-challenge" ]; then
+  echo "✅ Webhook challenge echoed"
+else
+  echo "❌ Webhook challenge: got '$CHALLENGE'"
+  FAILED=1
+fi
+expect_status "Unsigned webhook rejected" 403 POST "$API/webhooks/dropbox" '{"list_folder": {"accounts": []}}'
+BODY='{"list_folder": {"accounts": ["dbid:standin"]}}'
+SIGNATURE=$(printf '%s' "$BODY" | openssl dgst -sha256 -hmac "$DROPBOX_APP_SECRET" -r | cut -d' ' -f1)
+STATUS=$(curl -s -o /dev/null -w "%{http_code}" -X POST "$API/webhooks/dropbox" \
+  -H "X-Dropbox-Signature: $SIGNATURE" -H "Content-Type: application/json" -d "$BODY")
+if [ "$STATUS" == "200" ]; then
+  echo "✅ Signed webhook accepted"
+else
+  echo "❌ Signed webhook: expected 200, got $STATUS"
+  FAILED=1
+fi
+
+LIMITED=""
+for i in 1 2 3; do
+  LIMITED="$LIMITED $(curl -s -o /dev/null -w "%{http_code}" "$API/api/metrics" -H "Authorization: Bearer sk-LIMITED-STANDIN")"
+done
+if [ "$LIMITED" == " 200 200 429" ]; then
+  echo "✅ Token over its burst rate limited (429)"
+else
+  echo "❌ Token rate limit: expected 200 200 429, got$LIMITED"
+  FAILED=1
+fi
+expect_status "Other tokens unaffected" 200 GET "$API/api/metrics"
+STATUS=$(curl -s -o /dev/null -w "%{http_code}" "$API/api/metrics" -H "Authorization: Bearer sk-WRONG")
+if [ "$STATUS" == "401" ]; then
+  echo "✅ Unknown token rejected (401)"
+else
+  echo "❌ Unknown token: expected 401, got $STATUS"
+  FAILED=1
+fi
+
+RETRIES=$(grep -c "🔁 Dropbox" flask.log)
+echo "🔁 Retries logged: $RETRIES"
+if [ "$RETRIES" -eq 0 ]; then
+  echo "❌ Expected the injected failures to be retried"
+  FAILED=1
+fi
+
+exit $FAILED
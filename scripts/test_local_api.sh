@@ -26,7 +26,7 @@ fi
 
 # Start Flask app in background
 echo "⚙️ Starting Flask..."
-FLASK_APP=app.py flask run > flask.log 2>&1 &
+python app.py > flask.log 2>&1 &
 FLASK_PID=$!
 
 # Wait for Flask to become available
@@ -69,7 +69,9 @@ function test_endpoint() {
 
 # Inbox Notes
 test_endpoint "📥 List Inbox notes" GET http://localhost:5000/api/inbox/notes
+test_endpoint "📥 Inbox change feed" GET "http://localhost:5000/api/inbox/changes?timeout=1"
 test_endpoint "📥 Get Inbox note" GET http://localhost:5000/api/inbox/notes/2025-06-30_MinhaNota.md
+test_endpoint "📥 Get raw Inbox note" GET http://localhost:5000/api/inbox/notes/2025-06-30_MinhaNota.md/raw
 test_endpoint "📥 Create Inbox note" POST http://localhost:5000/api/inbox/notes '{
   "title": "Test Note",
   "content": "# Test\n\nThis is a test note.",
@@ -85,9 +87,22 @@ test_endpoint "📥 Process Inbox note" PATCH http://localhost:5000/api/inbox/no
   }
 }'
 
+test_endpoint "📥 Queue Inbox note for processing" PATCH "http://localhost:5000/api/inbox/notes/2025-07-03_test-note.md?async=1" '{
+  "action": "process",
+  "metadata": {"title": "Test Note", "date": "2025-07-03"}
+}'
+JOB_ID=$(echo "$RESPONSE" | jq -r .job_id)
+echo -e "\n🔹 🗂️ Follow processing job $JOB_ID"
+curl -s -N "http://localhost:5000/api/jobs/$JOB_ID/events" -H "Authorization: Bearer $GPT_TOKEN"
+test_endpoint "🗂️ Get job status" GET "http://localhost:5000/api/jobs/$JOB_ID"
+
 # Knowledge Base Notes
 test_endpoint "📚 List KB notes" GET http://localhost:5000/api/kb/notes
+test_endpoint "📚 Stream KB catalog" GET "http://localhost:5000/api/kb/notes:stream?include=frontmatter"
 test_endpoint "📚 List KB folders" GET http://localhost:5000/api/kb/folders
+
+echo -e "\n🔹 📦 Export KB folder"
+curl -s "http://localhost:5000/api/kb/export?folder=2025-07&format=tar.gz" -H "Authorization: Bearer $GPT_TOKEN" | tar -tzv
 test_endpoint "📚 Get KB note" GET http://localhost:5000/api/kb/notes/2025-07-03_test-note.md
 
 # Cleanup
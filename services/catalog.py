@@ -0,0 +1,1045 @@
+import os
+import sys
+import time
+import threading
+from datetime import datetime, timezone
+from collections import Counter, OrderedDict, deque
+from services.dropbox_client import (
+    DropboxCursorReset, download_file_with_rev, list_folder_changes, longpoll_folder, on_upload,
+    open_download_stream
+)
+from services.catalog_entry import CatalogEntry, unpack_timestamp
+from services.dropbox_executor import fan_out
+from services.dropbox_gate import BACKGROUND, BULK, priority
+from services.shared_cache import shared_cache
+from services.snapshot import Snapshot, write_snapshot
+from utils.dropbox_utils import detect_obsidian_links, parse_yaml_from_markdown, referenced_files
+from utils.deadline_utils import bounded
+from utils.logging_utils import log
+from utils.lru import LRUDict
+
+# Listings older than this are brought up to date (one list_folder/continue call) before being served
+CATALOG_MAX_AGE = float(os.getenv("CATALOG_MAX_AGE", "60"))
+
+# Single-note reads check the note's rev against a listing no older than this, so a note edited
+# in Dropbox is not served from the content cache for longer
+NOTE_MAX_AGE = float(os.getenv("CATALOG_NOTE_MAX_AGE", "5"))
+
+# File changes remembered per catalog for /api/inbox/changes; older cursors get a reset
+CHANGE_LOG_SIZE = int(os.getenv("CATALOG_CHANGE_LOG_SIZE", "1000"))
+
+# Upstream longpoll: seconds per request (30-480), pause after errors, and how long it
+# keeps running after the last client stopped waiting
+LONGPOLL_TIMEOUT = int(os.getenv("CATALOG_LONGPOLL_TIMEOUT", "60"))
+LONGPOLL_ERROR_DELAY = float(os.getenv("CATALOG_LONGPOLL_ERROR_DELAY", "5"))
+WATCH_IDLE = float(os.getenv("CATALOG_WATCH_IDLE", "120"))
+
+# Upper bound on note bodies kept in memory by the content cache
+CONTENT_CACHE_MAX_BYTES = int(os.getenv("CONTENT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Seconds note bodies and listings are kept in a shared cache backend (CACHE_BACKEND sqlite or redis)
+CONTENT_CACHE_TTL = float(os.getenv("CONTENT_CACHE_TTL", str(24 * 3600)))
+CATALOG_SHARED_TTL = float(os.getenv("CATALOG_SHARED_TTL", str(24 * 3600)))
+
+# Changes shared on top of a shared listing before the whole listing is shared again
+CATALOG_SHARED_CHANGES = int(os.getenv("CATALOG_SHARED_CHANGES", "500"))
+
+# Warm-start snapshot of the catalogs, front matter and hot note bodies, read after a restart
+# ("" turns it off), and how much of the content cache is saved in it
+SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", os.path.join("data", "cache_snapshot.bin"))
+SNAPSHOT_CONTENT_MAX_BYTES = int(os.getenv("CACHE_SNAPSHOT_CONTENT_MAX_BYTES", str(CONTENT_CACHE_MAX_BYTES)))
+
+# Front matter reads: bytes fetched first (doubled until the closing "---" is seen), the most
+# ever fetched per note, and how many notes are read at once
+FRONTMATTER_CHUNK_BYTES = int(os.getenv("FRONTMATTER_CHUNK_BYTES", "4096"))
+FRONTMATTER_MAX_BYTES = int(os.getenv("FRONTMATTER_MAX_BYTES", str(64 * 1024)))
+FRONTMATTER_CONCURRENCY = int(os.getenv("FRONTMATTER_CONCURRENCY", "8"))
+
+# Notes whose front matter and links are kept indexed; the least recently used beyond this are read again
+INDEX_MAX_NOTES = int(os.getenv("CATALOG_INDEX_MAX_NOTES", "20000"))
+
+
+def _tags_of(frontmatter: dict) -> set:
+    tags = (frontmatter or {}).get("tags") or []
+    if isinstance(tags, str):
+        tags = [tags]
+    return {str(tag) for tag in tags} if isinstance(tags, list) else set()
+
+
+class _FileStats:
+    """
+    What FolderStats remembers about one file.
+    """
+
+    __slots__ = ("folder", "size", "modified", "note", "rev", "tags")
+
+    def __init__(self, folder: str, size: int, modified, note: bool, rev: str):
+        self.folder = folder
+        self.size = size
+        self.modified = modified
+        self.note = note
+        self.rev = rev
+        self.tags = None
+
+
+class FolderStats:
+    """
+    Per-folder aggregates of a catalog: note count, total bytes, latest note and a tag histogram.
+
+    Updated entry by entry as the catalog applies changes, so reading them costs no Dropbox
+    calls. Tags come from the front matter index and are only counted for notes whose current
+    rev has been indexed; "frontmatter_indexed" tells how many that is.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._files = {}
+        self._folders = {}
+
+    def _folder_key(self, path_display: str):
+        relative = path_display[len(self.root):].strip("/")
+        return sys.intern(relative.rsplit("/", 1)[0]) if "/" in relative else ""
+
+    def _aggregate(self, name: str) -> dict:
+        key = name.lower()
+        if key not in self._folders:
+            self._folders[key] = {"name": name, "listed": False, "paths": set(), "notes": 0, "bytes": 0,
+                                  "latest": None, "tags": Counter(), "indexed": 0}
+        return self._folders[key]
+
+    def reset(self):
+        with self._lock:
+            self._files.clear()
+            self._folders.clear()
+
+    def add(self, entry: CatalogEntry):
+        with self._lock:
+            if entry[".tag"] == "folder":
+                self._aggregate(entry["path_display"][len(self.root):].strip("/"))["listed"] = True
+                return
+            key = entry["path_lower"]
+            self._discard(key)
+            modified = entry.modified_at
+            record = _FileStats(self._folder_key(entry["path_display"]), entry.get("size", 0),
+                                modified if isinstance(modified, int) else None, entry["name"].endswith(".md"),
+                                entry.get("rev"))
+            cached = frontmatter_index.get(key)
+            if record.note and cached and cached[0] == record.rev:
+                record.tags = _tags_of(cached[1])
+            self._files[key] = record
+
+            aggregate = self._aggregate(record.folder)
+            aggregate["paths"].add(key)
+            aggregate["bytes"] += record.size
+            if record.note:
+                aggregate["notes"] += 1
+                if record.modified and (aggregate["latest"] is None or record.modified > aggregate["latest"]):
+                    aggregate["latest"] = record.modified
+                if record.tags is not None:
+                    aggregate["indexed"] += 1
+                    aggregate["tags"].update(record.tags)
+
+    def remove(self, key: str):
+        with self._lock:
+            if key in self._files:
+                self._discard(key)
+                return
+            # A folder entry: its aggregate goes once nothing is left in it
+            aggregate = self._folders.get(key[len(self.root):].strip("/"))
+            if aggregate:
+                aggregate["listed"] = False
+                self._drop_if_empty(aggregate)
+
+    def _drop_if_empty(self, aggregate: dict):
+        if not aggregate["listed"] and not aggregate["paths"]:
+            self._folders.pop(aggregate["name"].lower(), None)
+
+    def _discard(self, key: str):
+        record = self._files.pop(key, None)
+        if record is None:
+            return
+        aggregate = self._folders[record.folder.lower()]
+        aggregate["paths"].discard(key)
+        aggregate["bytes"] -= record.size
+        self._drop_if_empty(aggregate)
+        if not record.note:
+            return
+        aggregate["notes"] -= 1
+        if record.tags is not None:
+            aggregate["indexed"] -= 1
+            aggregate["tags"].subtract(record.tags)
+            aggregate["tags"] = +aggregate["tags"]
+        if record.modified and record.modified == aggregate["latest"]:
+            # Only the folder's own notes are scanned, and only when its latest note went away
+            aggregate["latest"] = max((self._files[p].modified for p in aggregate["paths"]
+                                       if self._files[p].note and self._files[p].modified), default=None)
+
+    def set_tags(self, key: str, rev: str, frontmatter: dict):
+        """
+        Counts a note's tags once its front matter has been read, if the rev is still current.
+        """
+        with self._lock:
+            record = self._files.get(key)
+            if record is None or not record.note or record.rev != rev:
+                return
+            aggregate = self._folders[record.folder.lower()]
+            if record.tags is not None:
+                aggregate["indexed"] -= 1
+                aggregate["tags"].subtract(record.tags)
+            record.tags = _tags_of(frontmatter)
+            aggregate["indexed"] += 1
+            aggregate["tags"].update(record.tags)
+            aggregate["tags"] = +aggregate["tags"]
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [{
+                "name": aggregate["name"],
+                "note_count": aggregate["notes"],
+                "total_bytes": aggregate["bytes"],
+                "latest_note": unpack_timestamp(aggregate["latest"]),
+                "tags": dict(aggregate["tags"].most_common()),
+                "frontmatter_indexed": aggregate["indexed"],
+            } for aggregate in self._folders.values()]
+
+
+class FolderCatalog:
+    """
+    In-memory listing of a Dropbox folder, kept current with list_folder cursors.
+
+    The first refresh lists the folder; later refreshes only fetch what changed since the
+    previous cursor, so keeping a large folder fresh costs one small call. Entries are
+    CatalogEntry records keyed by path_lower, which read like list_folder dicts; they are
+    shared with callers: treat them as read-only.
+
+    With a shared cache backend, the listing and its cursor are published after every change,
+    and a catalog that has not been listed yet starts from the published copy, so a new worker
+    catches up with one list_folder/continue call instead of listing the whole folder.
+    Failing that, it starts from the snapshot saved before the last restart (see save_snapshot).
+    """
+
+    def __init__(self, path: str, recursive: bool = False):
+        self.path = path
+        self.recursive = recursive
+        self._entries = {}
+        # File entries by lower-cased name: {name: {path_lower: entry}}
+        self._names = {}
+        self._cursor = None
+        self._refreshed = None
+        self._stale = True
+        self._lock = threading.Lock()
+        self.stats = FolderStats(path)
+        # Change log for long-polling clients, and the log position each listing cursor was current at.
+        # feed_cursor is the latest cursor and covered its position; changes this process recorded
+        # after it (its own writes) are handed out once a listing has caught up with them.
+        self.version = 0
+        self.covered = 0
+        self.feed_cursor = None
+        self._changes = deque(maxlen=CHANGE_LOG_SIZE)
+        self._cursor_versions = OrderedDict()
+        self._changed = threading.Condition()
+        self._waiters = 0
+        self._last_waiter = 0
+        self._watcher = None
+        # Cursor of the listing last shared, the changes applied since and how many of them are shared
+        self._shared_base = None
+        self._shared_changes = []
+        self._shared_count = 0
+
+    def refresh(self) -> dict:
+        """
+        Brings the catalog up to date. Returns {"added": [...], "removed": [...]},
+        where "added" holds new or changed file entries and "removed" the path_lower of deleted ones.
+        Concurrent callers wait for the refresh already running instead of starting another.
+        """
+        requested = time.monotonic()
+        shared = None
+        with self._lock:
+            if self._refreshed is not None and self._refreshed >= requested and not self._stale:
+                return {"added": [], "removed": []}
+            # Cleared up front so writes landing during the listing mark it stale again
+            self._stale = False
+            if self._refreshed is None and self._cursor is None:
+                self._adopt_shared() or self._adopt_snapshot()
+            try:
+                changes, cursor = list_folder_changes(self.path, self.recursive, self._cursor)
+            except DropboxCursorReset:
+                log(f"🔄 Listing cursor for {self.path} expired, relisting", level="warning")
+                self._cursor = None
+                try:
+                    changes, cursor = list_folder_changes(self.path, self.recursive)
+                except Exception:
+                    self._stale = True
+                    raise
+            except Exception:
+                self._stale = True
+                raise
+
+            first_listing = self._refreshed is None
+            if self._cursor is None:
+                # Full listing: anything we held that is not in it was removed
+                previous = self._entries
+                listing = self._new_listing()
+                delta = self._apply(changes, listing=listing)
+                self._swap(listing)
+                delta["added"] = [entry for entry in delta["added"]
+                                  if previous.get(entry["path_lower"], {}).get("rev") != entry.get("rev")]
+                created = {entry["path_lower"] for entry in delta["added"] if entry["path_lower"] not in previous}
+                removed = {key: entry for key, entry in previous.items() if key not in self._entries}
+                delta["removed"] = list(removed)
+                self._shared_base = None
+            else:
+                # Entries this process already applied after writing them (see note_written) are not changes
+                changes = [entry for entry in changes if entry[".tag"] != "file" or
+                           self._entries.get(entry["path_lower"], {}).get("rev") != entry.get("rev")]
+                created = {entry["path_lower"] for entry in changes
+                           if entry[".tag"] == "file" and entry.get("path_lower") not in self._entries}
+                removed = {}
+                delta = self._apply(changes, removed)
+                if shared_cache.shared:
+                    self._shared_changes.extend(changes)
+
+            self._cursor = cursor
+            self._refreshed = time.monotonic()
+            self._record([] if first_listing else self._change_records(delta, created, removed), cursor)
+            shared = self._share()
+        if shared:
+            self._publish(*shared)
+        return delta
+
+    @property
+    def _shared_key(self) -> str:
+        return f"catalog:{self.path.lower()}:{int(self.recursive)}"
+
+    def _adopt_shared(self) -> bool:
+        """
+        Starts from the listing another worker published, if any. Caller holds the lock.
+        """
+        if not shared_cache.shared:
+            return False
+        published = shared_cache.get(self._shared_key)
+        if not published:
+            return False
+        self._restore(published["entries"], published["cursor"])
+        self._shared_base = published["cursor"]
+        changes = shared_cache.get(self._shared_key + ":changes")
+        if changes and changes["base"] == published["cursor"]:
+            self._apply(changes["changes"])
+            self._shared_changes = changes["changes"]
+            self._shared_count = len(self._shared_changes)
+            self._cursor = changes["cursor"]
+        return True
+
+    def _adopt_snapshot(self) -> bool:
+        """
+        Starts from the listing saved in the warm-start snapshot, if any. Caller holds the lock.
+        """
+        saved = _saved()
+        for catalog in saved.state["catalogs"] if saved else []:
+            if catalog["path"].lower() == self.path.lower() and catalog["recursive"] == self.recursive:
+                self._restore(catalog["entries"], catalog["cursor"])
+                log(f"♻️ Resuming {self.path} from the snapshot ({len(self._entries)} entries)")
+                return True
+        return False
+
+    def _restore(self, entries: list, cursor: str):
+        """
+        Replaces the listing with a saved one and the cursor it is current to, and rebuilds the
+        folder statistics, including tags of notes whose front matter is indexed. Caller holds the lock.
+        """
+        _saved()
+        listing = self._new_listing()
+        self._apply(entries, listing=listing)
+        for key, entry in listing[0].items():
+            indexed = frontmatter_index.get(key)
+            if indexed and indexed[0] == entry.get("rev"):
+                listing[2].set_tags(key, indexed[0], indexed[1])
+        self._swap(listing)
+        self._cursor = cursor
+
+    def _new_listing(self) -> tuple:
+        """
+        Empty (entries, names, stats) to build a complete listing in, away from readers.
+        """
+        return {}, {}, FolderStats(self.path)
+
+    def _swap(self, listing: tuple):
+        """
+        Replaces the live listing with a complete one. entries() and find() read without the lock,
+        each from a single dict, so they see either the old listing or the new one, never a partial one.
+        Caller holds the lock.
+        """
+        self._entries, self._names, self.stats = listing
+
+    def _share(self):
+        """
+        Picks what to share with other workers after a refresh, as arguments for _publish: the whole
+        listing after a full listing or once CATALOG_SHARED_CHANGES changes have piled up on the shared
+        one, otherwise the changes since the shared listing and the cursor they bring it to; None if
+        nothing is new. Only takes references, so the lock is not held while they are encoded.
+        Caller holds the lock.
+        """
+        if not shared_cache.shared:
+            return None
+        if self._shared_base is None or len(self._shared_changes) > CATALOG_SHARED_CHANGES:
+            self._shared_base = self._cursor
+            self._shared_changes = []
+            self._shared_count = 0
+            return self._cursor, self._cursor, list(self._entries.values()), None
+        if len(self._shared_changes) == self._shared_count:
+            return None
+        self._shared_count = len(self._shared_changes)
+        return self._shared_base, self._cursor, None, list(self._shared_changes)
+
+    def _publish(self, base: str, cursor: str, entries: list = None, changes: list = None):
+        """
+        Writes what _share picked to the shared cache, without the lock. A listing larger than
+        CACHE_MAX_ITEM_BYTES is skipped; workers then start from an older one or list the folder.
+        """
+        if entries is not None:
+            if not shared_cache.set(self._shared_key, {"cursor": cursor,
+                                                       "entries": [entry.to_dict() for entry in entries]},
+                                    CATALOG_SHARED_TTL):
+                log(f"⚠️ Listing of {self.path} ({len(entries)} entries) not shared: larger than "
+                    f"CACHE_MAX_ITEM_BYTES or the cache failed", level="warning")
+            return
+        shared_cache.set(self._shared_key + ":changes", {"base": base, "cursor": cursor, "changes": changes},
+                         CATALOG_SHARED_TTL)
+
+    def _apply(self, changes, removed_entries=None, listing=None) -> dict:
+        """
+        Applies list_folder entries to `listing` (entries, names, stats), by default the live one.
+        """
+        entries, names, stats = listing or (self._entries, self._names, self.stats)
+        added, removed = [], []
+        for entry in changes:
+            key = entry.get("path_lower") or f"{self.path}/{entry['name']}".lower()
+            if entry[".tag"] == "deleted":
+                # A deleted folder takes everything below it along; only folders need the scan
+                existing_entry = entries.get(key)
+                if existing_entry is None:
+                    continue
+                doomed = [key]
+                if existing_entry[".tag"] == "folder":
+                    doomed += [k for k in entries if k.startswith(key + "/")]
+                for existing in doomed:
+                    if removed_entries is not None:
+                        removed_entries[existing] = entries[existing]
+                    del entries[existing]
+                    self._unname(existing, names)
+                    stats.remove(existing)
+                    removed.append(existing)
+                continue
+            entry = CatalogEntry(entry, self.path)
+            entries[key] = entry
+            stats.add(entry)
+            if entry[".tag"] == "file":
+                names.setdefault(key.rsplit("/", 1)[-1], {})[key] = entry
+                added.append(entry)
+            else:
+                self._unname(key, names)
+        return {"added": added, "removed": removed}
+
+    @staticmethod
+    def _unname(key: str, names: dict):
+        name = key.rsplit("/", 1)[-1]
+        keys = names.get(name)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del names[name]
+
+    def note_written(self, entry: dict):
+        """
+        Applies a file this process just uploaded, from the upload's own metadata, so listings
+        and folder statistics reflect it without waiting for the next listing.
+        """
+        with self._lock:
+            key = entry["path_lower"]
+            if self._refreshed is None or self._entries.get(key, {}).get("rev") == entry.get("rev"):
+                return
+            created = set() if key in self._entries else {key}
+            delta = self._apply([entry])
+            if shared_cache.shared:
+                self._shared_changes.append(entry)
+            self._record(self._change_records(delta, created, {}))
+
+    def folder_stats(self, max_age: float = CATALOG_MAX_AGE) -> list:
+        """
+        Per-folder aggregates (see FolderStats), refreshing first like entries() if the catalog is
+        older than `max_age` seconds or has been marked stale; after the first listing that is a
+        single list_folder/continue call.
+        """
+        self.refresh_if_stale(max_age)
+        return self.stats.snapshot()
+
+    @staticmethod
+    def _change_records(delta: dict, created: set, removed: dict) -> list:
+        records = [("added" if entry["path_lower"] in created else "modified", entry) for entry in delta["added"]]
+        return records + [("deleted", entry) for entry in removed.values() if entry[".tag"] == "file"]
+
+    def _record(self, records: list, cursor: str = None):
+        """
+        Appends file changes to the change log; with `cursor`, the listing those changes bring
+        the catalog up to. Wakes everyone waiting for changes.
+        """
+        if not records and cursor is None:
+            return
+        with self._changed:
+            for change, entry in records:
+                self.version += 1
+                self._changes.append((self.version, change, entry))
+            if cursor is not None:
+                self._cursor_versions[cursor] = self.version
+                self._cursor_versions.move_to_end(cursor)
+                while len(self._cursor_versions) > CHANGE_LOG_SIZE:
+                    self._cursor_versions.popitem(last=False)
+                self.covered, self.feed_cursor = self.version, cursor
+            self._changed.notify_all()
+
+    def changes_after(self, cursor: str):
+        """
+        Returns (records, feed_cursor): the changes recorded after listing cursor `cursor` was
+        current, as [(version, change, entry), ...], and the cursor that takes a client past them.
+        records is None if this process never held `cursor` or the log no longer reaches back that far.
+        """
+        with self._changed:
+            version = self._cursor_versions.get(cursor)
+            if version is None or (self._changes and version < self._changes[0][0] - 1):
+                return None, self.feed_cursor
+            return [record for record in self._changes if version < record[0] <= self.covered], self.feed_cursor
+
+    def wait_for_change(self, cursor: str, timeout: float) -> bool:
+        """
+        Blocks until a listing brings changes after `cursor` (default: the latest cursor), or
+        `timeout` seconds pass, whichever is first; the wait also ends with the request deadline.
+        Returns True if there are changes to read.
+
+        All waiters share one upstream list_folder/longpoll, started on demand and stopped
+        once nobody has waited for CATALOG_WATCH_IDLE seconds. Refreshes from any other
+        source (webhooks, the scheduler) wake waiters as well.
+        """
+        with self._changed:
+            version = self._cursor_versions.get(cursor, self.covered)
+            self._waiters += 1
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name=f"longpoll {self.path}", daemon=True)
+                self._watcher.start()
+            try:
+                return self._changed.wait_for(lambda: self.covered > version, bounded(timeout))
+            finally:
+                self._waiters -= 1
+                self._last_waiter = time.monotonic()
+
+    def _watch(self):
+        while True:
+            with self._changed:
+                if not self._waiters and time.monotonic() - self._last_waiter > WATCH_IDLE:
+                    self._watcher = None
+                    return
+            try:
+                if self._cursor is None or self._stale:
+                    with priority(BACKGROUND):
+                        invalidate(self.refresh())
+                changes, backoff = longpoll_folder(self._cursor, LONGPOLL_TIMEOUT)
+                if changes:
+                    self.mark_stale()
+                if backoff:
+                    time.sleep(backoff)
+            except DropboxCursorReset:
+                # refresh() relists when the cursor has expired
+                self.mark_stale()
+            except Exception as e:
+                log(f"❌ Longpoll on {self.path} failed: {str(e)}", level="error")
+                time.sleep(LONGPOLL_ERROR_DELAY)
+
+    def refresh_if_stale(self, max_age: float = CATALOG_MAX_AGE):
+        """
+        Refreshes the catalog if it is older than `max_age` seconds or has been marked stale.
+        """
+        if self._stale or self._refreshed is None or time.monotonic() - self._refreshed > max_age:
+            self.refresh()
+
+    def entries(self, max_age: float = CATALOG_MAX_AGE) -> list:
+        """
+        Returns every entry, refreshing first if the catalog is older than `max_age` seconds
+        or has been marked stale.
+        """
+        self.refresh_if_stale(max_age)
+        return list(self._entries.values())
+
+    def find(self, name: str, max_age: float = None):
+        """
+        Returns the file entry named `name` (case-insensitive), or None; a name used in several
+        folders gives one of them. Without `max_age` the cached listing is used as it is;
+        with it, the catalog is refreshed first if it is older than that (see refresh_if_stale).
+        """
+        if max_age is not None:
+            self.refresh_if_stale(max_age)
+        return next(iter(tuple(self._names.get(name.lower(), {}).values())), None)
+
+    def mark_stale(self):
+        """
+        Forces the next read to pick up recent changes, e.g. after this app wrote to the folder.
+        """
+        self._stale = True
+
+    def snapshot(self) -> dict:
+        return {
+            "path": self.path,
+            "entries": len(self._entries),
+            "age_seconds": None if self._refreshed is None else round(time.monotonic() - self._refreshed, 1),
+        }
+
+
+class ContentCache:
+    """
+    LRU cache of note bodies keyed by Dropbox path and rev, bounded by total size.
+    A lookup with a different rev is a miss, so a body is only as fresh as the rev it is
+    looked up with: single-note reads take it from a listing at most NOTE_MAX_AGE seconds old.
+
+    A local miss is looked up in the warm-start snapshot, then in the shared cache backend
+    (where bodies are also stored, keyed by rev as well), before the note is downloaded.
+    """
+
+    def __init__(self, max_bytes: int = CONTENT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "snapshot_hits": 0, "shared_hits": 0, "misses": 0}
+
+    def get(self, path: str, rev: str):
+        with self._lock:
+            item = self._items.get(path.lower())
+            if item is not None and item[0] == rev:
+                self._items.move_to_end(path.lower())
+                self.stats["hits"] += 1
+                return item[1]
+        saved = _saved()
+        content = saved.body(path.lower(), rev) if saved and rev else None
+        if content is not None:
+            self.stats["snapshot_hits"] += 1
+            self._store(path, rev, content)
+            return content
+        content = shared_cache.get(f"note:{path.lower()}:{rev}") if shared_cache.shared and rev else None
+        if content is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["shared_hits"] += 1
+        self._store(path, rev, content)
+        return content
+
+    def has(self, path: str, rev: str) -> bool:
+        with self._lock:
+            item = self._items.get(path.lower())
+            return item is not None and item[0] == rev
+
+    def put(self, path: str, rev: str, content: str):
+        if not rev:
+            return
+        self._store(path, rev, content)
+        if shared_cache.shared:
+            shared_cache.set(f"note:{path.lower()}:{rev}", content, CONTENT_CACHE_TTL)
+
+    def _store(self, path: str, rev: str, content: str):
+        size = len(content)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(path.lower(), None)
+            if old:
+                self._size -= len(old[1])
+            self._items[path.lower()] = (rev, content)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def discard(self, path: str):
+        with self._lock:
+            old = self._items.pop(path.lower(), None)
+            if old:
+                self._size -= len(old[1])
+
+    def hottest(self, max_bytes: int) -> list:
+        """
+        The most recently used bodies that fit in `max_bytes`: [(path_lower, rev, content), ...].
+        """
+        with self._lock:
+            items, total = [], 0
+            for key, (rev, content) in reversed(self._items.items()):
+                if total + len(content) > max_bytes:
+                    break
+                items.append((key, rev, content))
+                total += len(content)
+            return items
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._items), "bytes": self._size}
+
+
+content_cache = ContentCache()
+
+# Parsed YAML front matter per note: path_lower -> (rev, dict)
+frontmatter_index = LRUDict(INDEX_MAX_NOTES)
+
+# Files each indexed note links to: path_lower -> (rev, frozenset of referenced paths and names)
+link_index = LRUDict(INDEX_MAX_NOTES)
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def catalog_for(path: str, recursive: bool = False) -> FolderCatalog:
+    """
+    Returns the shared catalog for a folder, creating it on first use.
+    """
+    key = (path.lower(), recursive)
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = FolderCatalog(path, recursive)
+        return _catalogs[key]
+
+
+def _covering(path: str) -> list:
+    """
+    The catalogs whose listing includes `path`.
+    """
+    path = path.lower()
+    with _catalogs_lock:
+        catalogs = list(_catalogs.values())
+    return [catalog for catalog in catalogs
+            if path.startswith(catalog.path.lower() + "/") and
+            (catalog.recursive or "/" not in path[len(catalog.path) + 1:])]
+
+
+def mark_stale(path: str):
+    """
+    Marks every catalog covering `path` as stale after the app wrote to it.
+    """
+    for catalog in _covering(path):
+        catalog.mark_stale()
+    content_cache.discard(path.lower())
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def _saved():
+    """
+    The warm-start snapshot saved by an earlier run, opened on first use; None if there is none.
+    Opening it loads the saved front matter index. Listings are taken from it as catalogs are
+    first used, and note bodies stay in the memory-mapped file until they are read.
+    """
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = False
+                if SNAPSHOT_PATH and os.path.exists(SNAPSHOT_PATH):
+                    try:
+                        saved = Snapshot(SNAPSHOT_PATH)
+                        for key, (rev, frontmatter) in saved.state["frontmatter"].items():
+                            frontmatter_index.setdefault(key, (rev, frontmatter))
+                        _snapshot = saved
+                        log(f"♻️ Opened cache snapshot from {saved.state['saved_at']}: "
+                            f"{len(saved.state['catalogs'])} listings, {len(saved.state['frontmatter'])} front matter, "
+                            f"{len(saved)} notes")
+                    except Exception as e:
+                        log(f"⚠️ Ignoring unreadable cache snapshot {SNAPSHOT_PATH}: {str(e)}", level="warning")
+    return _snapshot or None
+
+
+def close_snapshot():
+    """
+    Closes the snapshot opened by _saved(), if any; the next use opens the file again.
+    """
+    global _snapshot
+    with _snapshot_lock:
+        saved, _snapshot = _snapshot, None
+    if saved:
+        saved.close()
+
+
+def save_snapshot() -> dict:
+    """
+    Saves the listed catalogs with their cursors, the front matter index and the most recently
+    used note bodies to CACHE_SNAPSHOT_PATH, for the next start to resume from. Listings this
+    process never loaded are carried over from the previous snapshot. Folder statistics are
+    rebuilt from the listings on load rather than saved.
+    """
+    if not SNAPSHOT_PATH:
+        return {"saved": False}
+    previous = _saved()
+    with _catalogs_lock:
+        catalogs = [c for c in _catalogs.values() if c._refreshed is not None]
+    if not catalogs:
+        # Nothing listed in this process: keep the snapshot that is there
+        return {"saved": False}
+
+    saved_catalogs = []
+    for catalog in catalogs:
+        with catalog._lock:
+            saved_catalogs.append({"path": catalog.path, "recursive": catalog.recursive,
+                                   "cursor": catalog._cursor,
+                                   "entries": [entry.to_dict() for entry in catalog._entries.values()]})
+    listed = {(c["path"].lower(), c["recursive"]) for c in saved_catalogs}
+    for catalog in previous.state["catalogs"] if previous else []:
+        if (catalog["path"].lower(), catalog["recursive"]) not in listed:
+            saved_catalogs.append(catalog)
+
+    frontmatter = {key: list(value) for key, value in frontmatter_index.items()}
+    bodies = content_cache.hottest(SNAPSHOT_CONTENT_MAX_BYTES)
+    size = write_snapshot(SNAPSHOT_PATH, {"saved_at": datetime.now(timezone.utc).isoformat(),
+                                          "catalogs": saved_catalogs, "frontmatter": frontmatter}, bodies)
+    # The old file is gone now; unmap it, and open the new one when it is next needed
+    close_snapshot()
+    log(f"💾 Saved cache snapshot: {len(saved_catalogs)} listings, {len(frontmatter)} front matter, "
+        f"{len(bodies)} notes ({size} bytes)")
+    return {"saved": True, "listings": len(saved_catalogs), "frontmatter": len(frontmatter),
+            "notes": len(bodies), "bytes": size}
+
+
+def read_note(entry: dict) -> str:
+    """
+    Returns a note's content for a catalog entry, from the content cache when its rev matches.
+    """
+    path, rev = entry["path_display"], entry.get("rev")
+    content = content_cache.get(path, rev)
+    if content is None:
+        content, downloaded = download_file_with_rev(path, rev)
+        # Cached under the rev actually downloaded, in case the note changed since it was listed
+        content_cache.put(path, downloaded, content)
+        if downloaded == rev:
+            _index_frontmatter(entry, content)
+    return content
+
+
+def _index_frontmatter(entry: dict, content: str) -> dict:
+    try:
+        frontmatter = parse_yaml_from_markdown(content) or {}
+    except Exception as e:
+        log(f"⚠️ Unparseable front matter in {entry['path_display']}: {str(e)}", level="warning")
+        frontmatter = {}
+    frontmatter_index[entry["path_lower"]] = (entry.get("rev"), frontmatter)
+    for catalog in _covering(entry["path_lower"]):
+        catalog.stats.set_tags(entry["path_lower"], entry.get("rev"), frontmatter)
+    return frontmatter
+
+
+def _note_uploaded(metadata: dict, body: bytes):
+    """
+    Upload listener: indexes the new note's front matter from the uploaded bytes and applies
+    the file to the catalogs covering it.
+    """
+    if metadata["name"].endswith(".md"):
+        _index_frontmatter(metadata, body.decode("utf-8", errors="replace"))
+    for catalog in _covering(metadata["path_lower"]):
+        catalog.note_written(metadata)
+
+
+on_upload(_note_uploaded)
+
+
+def _frontmatter_complete(data: bytes) -> bool:
+    """
+    Whether `data` (the start of a note) holds its whole front matter block, or shows it has none.
+    """
+    if len(data) >= 3 and not data.startswith(b"---"):
+        return True
+    return b"\n---" in data[3:]
+
+
+def _read_head(path: str) -> str:
+    """
+    Reads the start of a note with Range requests, up to the end of its front matter.
+    """
+    data, want = b"", FRONTMATTER_CHUNK_BYTES
+    while True:
+        response = open_download_stream(path, f"bytes={len(data)}-{want - 1}")
+        try:
+            if response.status_code == 416:
+                # The previous range ended exactly at the end of the file
+                break
+            chunk = response.content
+        finally:
+            response.close()
+        if response.status_code == 200:
+            # Range not honoured: this is the whole file
+            return chunk.decode("utf-8", errors="replace")
+        data += chunk
+        if _frontmatter_complete(data) or len(data) < want or want >= FRONTMATTER_MAX_BYTES:
+            break
+        want = min(want * 2, FRONTMATTER_MAX_BYTES)
+    # A multi-byte character cut at the end of the range is dropped
+    return data.decode("utf-8", errors="ignore")
+
+
+def read_frontmatter(entry: dict) -> dict:
+    """
+    Returns a note's parsed front matter for a catalog or listing entry, cached by rev.
+    Uses the cached body when there is one; otherwise only the first few KB are downloaded.
+    """
+    _saved()
+    cached = frontmatter_index.get(entry["path_lower"])
+    if cached and cached[0] == entry.get("rev"):
+        return cached[1]
+    content = content_cache.get(entry["path_display"], entry.get("rev"))
+    if content is None:
+        content = _read_head(entry["path_display"])
+    return _index_frontmatter(entry, content)
+
+
+def load_frontmatter(entries: list) -> dict:
+    """
+    Reads the front matter of many notes, at most FRONTMATTER_CONCURRENCY at a time.
+    Returns {path_lower: dict, or None if the note could not be read}.
+    Raises DropboxUnavailable or DeadlineExceeded if Dropbox is down or the request runs out of time.
+    """
+    _saved()
+    results, pending = {}, []
+    for entry in entries:
+        cached = frontmatter_index.get(entry["path_lower"])
+        if cached and cached[0] == entry.get("rev"):
+            results[entry["path_lower"]] = cached[1]
+        else:
+            pending.append(entry)
+    if not pending:
+        return results
+
+    for entry, frontmatter in zip(pending, fan_out(read_frontmatter, pending, limit=FRONTMATTER_CONCURRENCY,
+                                                   return_exceptions=True)):
+        if isinstance(frontmatter, Exception):
+            log(f"⚠️ Could not read front matter of {entry['path_display']}: {str(frontmatter)}", level="warning")
+            frontmatter = None
+        results[entry["path_lower"]] = frontmatter
+    return results
+
+
+def index_links(entries: list) -> int:
+    """
+    Indexes the files linked from the notes in `entries` whose current rev is not indexed yet,
+    reading them through the content cache. Returns the number of notes read.
+    Raises DropboxUnavailable or DeadlineExceeded if Dropbox is down or the request runs out of time.
+    """
+    pending = [e for e in entries if e[".tag"] == "file" and e["name"].endswith(".md") and
+               link_index.get(e["path_lower"], (None,))[0] != e.get("rev")]
+    for entry, content in zip(pending, fan_out(read_note, pending)):
+        link_index[entry["path_lower"]] = (entry.get("rev"),
+                                           frozenset(referenced_files(detect_obsidian_links(content))))
+    return len(pending)
+
+
+def linked_files(entries: list) -> dict:
+    """
+    Files each note in `entries` links to, as {path_lower: frozenset of referenced paths and names}.
+    Only notes that are new or changed since they were last indexed are downloaded.
+    """
+    index_links(entries)
+    return {e["path_lower"]: link_index.get(e["path_lower"], (None, frozenset()))[1]
+            for e in entries if e[".tag"] == "file" and e["name"].endswith(".md")}
+
+
+def forget(paths):
+    """
+    Drops cached content, front matter and links for removed notes.
+    """
+    for path in paths:
+        content_cache.discard(path)
+        frontmatter_index.pop(path, None)
+        link_index.pop(path, None)
+
+
+def invalidate(delta: dict):
+    """
+    Drops cached content, front matter and links for the notes a refresh reported as changed or removed.
+    """
+    forget(delta["removed"])
+    for entry in delta["added"]:
+        if not content_cache.has(entry["path_display"], entry.get("rev")):
+            content_cache.discard(entry["path_display"])
+        if frontmatter_index.get(entry["path_lower"], (None,))[0] != entry.get("rev"):
+            frontmatter_index.pop(entry["path_lower"], None)
+        if link_index.get(entry["path_lower"], (None,))[0] != entry.get("rev"):
+            link_index.pop(entry["path_lower"], None)
+
+
+def sync_all() -> dict:
+    """
+    Pulls pending changes into every catalog that has been listed, and invalidates what changed.
+    Returns {folder path: number of changed or removed entries}.
+    """
+    with _catalogs_lock:
+        catalogs = [c for c in _catalogs.values() if c._refreshed is not None]
+    changed = {}
+    for catalog in catalogs:
+        # Stale first, so a refresh that was already running does not stand in for this one
+        catalog.mark_stale()
+        delta = catalog.refresh()
+        invalidate(delta)
+        changed[catalog.path] = len(delta["added"]) + len(delta["removed"])
+    return changed
+
+
+_sync_requested = threading.Event()
+_sync_thread = None
+
+
+def request_sync():
+    """
+    Schedules sync_all() on a background thread and returns immediately.
+    Requests that arrive while a sync is running are folded into one follow-up sync.
+    """
+    global _sync_thread
+    _sync_requested.set()
+    with _catalogs_lock:
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_loop, name="catalog-sync", daemon=True)
+            _sync_thread.start()
+
+
+def _sync_loop():
+    while True:
+        _sync_requested.wait()
+        _sync_requested.clear()
+        try:
+            with priority(BACKGROUND):
+                changed = sync_all()
+            log(f"🔔 Synced catalogs after change notification: {changed}")
+        except Exception as e:
+            log(f"❌ Catalog sync failed: {str(e)}", level="error")
+
+
+def _recent_notes(entries: list) -> list:
+    notes = [e for e in entries if e[".tag"] == "file" and e["name"].endswith(".md")]
+    notes.sort(key=lambda e: e.get("server_modified") or e.get("client_modified") or "", reverse=True)
+    return notes
+
+
+def prefetch_frontmatter(entries: list, limit: int) -> int:
+    """
+    Indexes front matter for up to `limit` notes (newest first) whose current rev is not indexed yet.
+    Returns the number of notes read.
+    """
+    pending = [e for e in _recent_notes(entries)
+               if frontmatter_index.get(e["path_lower"], (None,))[0] != e.get("rev")]
+    with priority(BULK):
+        load_frontmatter(pending[:limit])
+    return min(len(pending), limit)
+
+
+def warm_recent(entries: list, count: int) -> int:
+    """
+    Loads the `count` most recently modified notes into the content cache.
+    Returns the number of notes that had to be downloaded.
+    """
+    missing = [entry for entry in _recent_notes(entries)[:count]
+               if not content_cache.has(entry["path_display"], entry.get("rev"))]
+    with priority(BULK):
+        fan_out(read_note, missing)
+    return len(missing)
+
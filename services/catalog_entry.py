@@ -0,0 +1,132 @@
+import sys
+import time
+import calendar
+
+# Dropbox's timestamp format ("2025-07-03T10:15:00Z")
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def pack_timestamp(value):
+    """
+    A Dropbox timestamp as epoch seconds. Anything not in Dropbox's format is kept as given.
+    """
+    if isinstance(value, str) and len(value) == 20 and value[4] == "-" and value[10] == "T" and value[19] == "Z":
+        try:
+            return calendar.timegm((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                    int(value[11:13]), int(value[14:16]), int(value[17:19])))
+        except ValueError:
+            pass
+    return value
+
+
+def unpack_timestamp(value):
+    if isinstance(value, int):
+        return time.strftime(TIMESTAMP_FORMAT, time.gmtime(value))
+    return value
+
+
+# Dropbox metadata fields a catalog entry keeps, and the attribute each one is read from
+FIELDS = {
+    ".tag": "tag",
+    "id": "id",
+    "name": "name",
+    "path_lower": "path_lower",
+    "path_display": "path_display",
+    "rev": "rev",
+    "size": "size",
+    "server_modified": "server_modified",
+    "client_modified": "client_modified",
+    "content_hash": "content_hash",
+}
+
+
+class CatalogEntry:
+    """
+    One file or folder of a FolderCatalog, stored compactly.
+
+    A list_folder entry is a dict of a dozen separate strings. Here the path is split into the
+    catalog root and the folder below it, both interned so every entry in a folder shares them,
+    plus the name. path_lower is derived from path_display unless Dropbox's differs. Timestamps
+    are epoch seconds and content_hash is 32 raw bytes. Fields the app never reads
+    (sharing_info, is_downloadable, ...) are dropped.
+
+    Entries read like the dicts they replace (entry["path_display"], entry.get("rev")), so
+    callers need not care which one they hold. to_dict() gives the Dropbox form back.
+    """
+
+    __slots__ = ("is_file", "root", "folder", "name", "id", "rev", "size", "_path_lower", "_server_modified",
+                 "_client_modified", "_content_hash")
+
+    def __init__(self, entry: dict, root: str):
+        display = entry.get("path_display") or entry.get("path_lower") or ""
+        if display.lower().startswith(root.lower() + "/"):
+            prefix, relative = display[:len(root)], display[len(root):]
+        else:
+            prefix, relative = "", display
+        self.is_file = entry[".tag"] == "file"
+        self.root = sys.intern(prefix)
+        self.folder = sys.intern(relative.rsplit("/", 1)[0])
+        self.name = entry["name"]
+        self.id = entry.get("id")
+        self.rev = entry.get("rev")
+        self.size = entry.get("size")
+        path_lower = entry.get("path_lower")
+        self._path_lower = None if path_lower == display.lower() else path_lower
+        self._server_modified = pack_timestamp(entry.get("server_modified"))
+        self._client_modified = pack_timestamp(entry.get("client_modified"))
+        content_hash = entry.get("content_hash")
+        try:
+            self._content_hash = bytes.fromhex(content_hash) if content_hash else None
+        except ValueError:
+            self._content_hash = content_hash
+
+    @property
+    def tag(self) -> str:
+        return "file" if self.is_file else "folder"
+
+    @property
+    def path_display(self) -> str:
+        return f"{self.root}{self.folder}/{self.name}"
+
+    @property
+    def path_lower(self) -> str:
+        return self._path_lower or self.path_display.lower()
+
+    @property
+    def server_modified(self):
+        return unpack_timestamp(self._server_modified)
+
+    @property
+    def client_modified(self):
+        return unpack_timestamp(self._client_modified)
+
+    @property
+    def modified_at(self):
+        """
+        client_modified as epoch seconds, for comparisons that do not need the string.
+        """
+        return self._client_modified
+
+    @property
+    def content_hash(self):
+        return self._content_hash.hex() if isinstance(self._content_hash, bytes) else self._content_hash
+
+    def get(self, key: str, default=None):
+        attribute = FIELDS.get(key)
+        value = getattr(self, attribute) if attribute else None
+        return default if value is None else value
+
+    def __getitem__(self, key: str):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def to_dict(self) -> dict:
+        return {key: value for key in FIELDS if (value := self.get(key)) is not None}
+
+    def __repr__(self):
+        return f"CatalogEntry({self.to_dict()!r})"
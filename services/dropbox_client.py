@@ -1,21 +1,129 @@
+import io
 import os
+import time
 import requests
 import json
 from dotenv import load_dotenv
 from utils.dropbox_utils import get_access_token
+from services.dropbox_http import (
+    DROPBOX_API_BASE, DROPBOX_CONTENT_BASE, DROPBOX_NOTIFY_BASE, coalesce, dropbox_flights, dropbox_post, http_session
+)
+from utils.content_hash import content_hash
+from utils.deadline_utils import CONNECT_TIMEOUT, bounded, check_deadline
+from utils.lru import LRUDict
 
 load_dotenv()
 
-DROPBOX_API_UPLOAD = "https://content.dropboxapi.com/2/files/upload"
-DROPBOX_API_LIST_FOLDER = "https://api.dropboxapi.com/2/files/list_folder"
-DROPBOX_API_GET_FILE = "https://content.dropboxapi.com/2/files/download"
-DROPBOX_API_SAVE_FILE = "https://api.dropboxapi.com/2/files/save_url"
+DROPBOX_API_UPLOAD = f"{DROPBOX_CONTENT_BASE}/2/files/upload"
+DROPBOX_API_LIST_FOLDER = f"{DROPBOX_API_BASE}/2/files/list_folder"
+DROPBOX_API_LIST_FOLDER_CONTINUE = f"{DROPBOX_API_BASE}/2/files/list_folder/continue"
+DROPBOX_API_GET_FILE = f"{DROPBOX_CONTENT_BASE}/2/files/download"
+DROPBOX_API_GET_METADATA = f"{DROPBOX_API_BASE}/2/files/get_metadata"
+DROPBOX_API_LONGPOLL = f"{DROPBOX_NOTIFY_BASE}/2/files/list_folder/longpoll"
+DROPBOX_API_MOVE_BATCH = f"{DROPBOX_API_BASE}/2/files/move_batch_v2"
+DROPBOX_API_MOVE_BATCH_CHECK = f"{DROPBOX_API_BASE}/2/files/move_batch/check_v2"
+DROPBOX_API_DELETE_BATCH = f"{DROPBOX_API_BASE}/2/files/delete_batch"
+DROPBOX_API_DELETE_BATCH_CHECK = f"{DROPBOX_API_BASE}/2/files/delete_batch/check"
+
+# Polling of asynchronous batch jobs: first delay, cap, and overall wait when no request deadline applies
+BATCH_POLL_DELAY = float(os.getenv("DROPBOX_BATCH_POLL_DELAY", "0.5"))
+BATCH_POLL_MAX_DELAY = float(os.getenv("DROPBOX_BATCH_POLL_MAX_DELAY", "5"))
+BATCH_WAIT = float(os.getenv("DROPBOX_BATCH_WAIT", "60"))
+DROPBOX_API_SAVE_FILE = f"{DROPBOX_API_BASE}/2/files/save_url"
 
 BASE_DROPBOX_PATH = "/Apps/SaveNotesGPT"
 INBOX_PATH = f"{BASE_DROPBOX_PATH}/Inbox"
 NOTES_KB_PATH = f"{BASE_DROPBOX_PATH}/NotesKB"
 MOCK_MODE = os.getenv("MOCK_MODE") == "1"
 
+# Paths whose last seen content_hash is remembered; the least recently used beyond this are forgotten,
+# which only costs skipping the "already uploaded" check for them
+KNOWN_HASHES_MAX = int(os.getenv("DROPBOX_KNOWN_HASHES_MAX", "50000"))
+
+# Last content_hash seen for each path (from listings, metadata lookups, uploads and copies)
+_known_hashes = LRUDict(KNOWN_HASHES_MAX)
+
+# Called as listener(metadata, body) after every successful upload; see on_upload()
+_upload_listeners = []
+
+
+def on_upload(listener):
+    """
+    Registers `listener(metadata, body)` to be called with the Dropbox file metadata and the
+    uploaded bytes after every successful upload, so caches can be updated without a listing.
+    """
+    _upload_listeners.append(listener)
+
+
+def remember_metadata(entries):
+    """
+    Records the content_hash of file metadata entries; deleted entries are forgotten.
+    """
+    for entry in entries:
+        key = entry.get("path_lower")
+        if not key:
+            continue
+        if entry.get(".tag", "file") == "file" and entry.get("content_hash"):
+            _known_hashes[key] = entry["content_hash"]
+        else:
+            _known_hashes.pop(key, None)
+
+
+def _forget_reads(*paths):
+    """
+    Keeps later reads of paths this process just wrote from joining a download or metadata
+    lookup that started before the write and may return the old content.
+    """
+    written = {path.lower() for path in paths}
+    dropbox_flights.forget(lambda key: key[0] in ("download", "get_metadata") and key[1] in written)
+
+
+def remote_matches(path: str, expected_hash: str) -> bool:
+    """
+    Whether Dropbox already holds exactly the bytes with `expected_hash` at `path`.
+
+    Only paths whose last known hash matches are checked, so files we have no record of,
+    or know to differ, cost nothing. A cached match is confirmed with a get_metadata call
+    (read-only and cheap) because the file may have changed since it was recorded.
+    """
+    if not expected_hash or _known_hashes.get(path.lower()) != expected_hash:
+        return False
+    current = get_metadata(path)
+    return bool(current) and current.get("content_hash") == expected_hash
+
+
+def _upload(path: str, body: bytes, arg: dict) -> bool:
+    """
+    Uploads `body` to `path` with mode=overwrite, unless Dropbox already holds identical bytes.
+    The local content_hash is sent along, so Dropbox rejects a body corrupted in transit.
+    """
+    digest = content_hash(body)
+    if remote_matches(path, digest):
+        print(f"⏭️ Unchanged, upload skipped: {path}")
+        return True
+
+    headers = {
+        "Authorization": f"Bearer {get_access_token()}",
+        "Content-Type": "application/octet-stream",
+        "Dropbox-API-Arg": json.dumps({**arg, "path": path, "mode": "overwrite", "content_hash": digest})
+    }
+
+    # mode=overwrite with the same bytes is safe to repeat
+    response = dropbox_post(DROPBOX_API_UPLOAD, idempotent=True, headers=headers, data=body)
+    if response.status_code == 200:
+        metadata = {".tag": "file", **response.json()}
+        _forget_reads(path)
+        remember_metadata([metadata])
+        print(f"✅ Uploaded to {path}")
+        for listener in _upload_listeners:
+            try:
+                listener(metadata, body)
+            except Exception as e:
+                print(f"⚠️ Upload listener failed for {path}: {str(e)}")
+        return True
+    print(f"❌ Upload failed: {response.text}")
+    return False
+
 
 
 def upload_note_to_dropbox(title, date, content):
@@ -27,30 +135,11 @@ def upload_note_to_dropbox(title, date, content):
         print(f"📥 [MOCK] Uploading {title} for {date} — Skipped.")
         return True
 
-    access_token = get_access_token()
     filename = f"{date}_{title.replace(' ', '_')}.md"
     subfolder = date[:7]
     dropbox_path = f"{NOTES_KB_PATH}/{subfolder}/{filename}"
 
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/octet-stream",
-        "Dropbox-API-Arg": json.dumps({
-            "path": dropbox_path,
-            "mode": "overwrite",
-            "mute": False,
-            "strict_conflict": False
-        })
-    }
-
-    response = requests.post(DROPBOX_API_UPLOAD, headers=headers, data=content.encode('utf-8'))
-
-    if response.status_code == 200:
-        print(f"✅ Uploaded note to Dropbox at {dropbox_path}")
-        return True
-    else:
-        print("❌ Dropbox upload failed:", response.text)
-        return False
+    return _upload(dropbox_path, content.encode('utf-8'), {"mute": False, "strict_conflict": False})
 
 
 def upload_structured_note(path: str, content: str) -> bool:
@@ -62,27 +151,7 @@ def upload_structured_note(path: str, content: str) -> bool:
         print(f"📥 [MOCK] Structured upload to {path} — Skipped.")
         return True
 
-    access_token = get_access_token()
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/octet-stream",
-        "Dropbox-API-Arg": json.dumps({
-            "path": path,
-            "mode": "overwrite",
-            "autorename": False,
-            "mute": False
-        })
-    }
-
-    response = requests.post(DROPBOX_API_UPLOAD, headers=headers, data=content.encode("utf-8"))
-
-    if response.status_code == 200:
-        print(f"✅ Structured note uploaded to {path}")
-        return True
-    else:
-        print(f"❌ Upload failed: {response.text}")
-        return False
+    return _upload(path, content.encode("utf-8"), {"autorename": False, "mute": False})
 
 
 def download_note_from_dropbox(filename: str, folder: str = "Inbox") -> str:
@@ -94,22 +163,147 @@ def download_note_from_dropbox(filename: str, folder: str = "Inbox") -> str:
     if MOCK_MODE:
         return f"# 📝 Mocked note: {filename}\n\nThis is mock content for testing."
 
-    access_token = get_access_token()
     path = f"{INBOX_PATH}/{filename}" if folder == "Inbox" else f"{NOTES_KB_PATH}/{folder}/{filename}"
+    return download_file_from_dropbox(path)
+
+
+def download_file_from_dropbox(path: str) -> str:
+    """
+    Downloads a file from Dropbox by its full path.
+    Returns the content as a string; raises DropboxFileNotFound if the path does not exist
+    and Exception on other failures.
+    """
+    return download_file_with_rev(path)[0]
+
+
+def download_file_with_rev(path: str, rev: str = None):
+    """
+    Downloads a file and returns (content, rev of the content returned), which can differ from
+    `rev` if the file changed since the caller saw it. Concurrent downloads of the same path
+    share one request only if they expect the same rev.
+    """
+    if MOCK_MODE:
+        name = path.rsplit("/", 1)[-1]
+        return f"---\ntitle: Mocked note {name}\ntags: [mock]\n---\n\n# 📝 Mocked note: {name}\n", rev
+
+    def download():
+        access_token = get_access_token()
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Dropbox-API-Arg": json.dumps({"path": path}),
+        }
 
+        response = dropbox_post(DROPBOX_API_GET_FILE, idempotent=True, headers=headers)
+
+        if response.status_code == 409 and "not_found" in response.text:
+            raise DropboxFileNotFound(path)
+        if response.status_code != 200:
+            raise Exception(f"Failed to download file: {response.text}")
+
+        result = json.loads(response.headers.get("Dropbox-API-Result") or "{}")
+        return response.text, result.get("rev", rev)
+
+    return coalesce(("download", path.lower(), rev), download)
+
+
+def get_metadata(path: str):
+    """
+    Returns the Dropbox metadata entry for a path, or None if it does not exist.
+    Concurrent lookups of the same path share one request.
+    """
+    if MOCK_MODE:
+        return {".tag": "file", "name": path.rsplit("/", 1)[-1], "path_display": path,
+                "path_lower": path.lower(), "rev": "mock-rev", "size": 128}
+
+    def lookup():
+        access_token = get_access_token()
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+        response = dropbox_post(DROPBOX_API_GET_METADATA, idempotent=True, headers=headers, json={"path": path})
+
+        if response.status_code == 409 and "not_found" in response.text:
+            _known_hashes.pop(path.lower(), None)
+            return None
+        if response.status_code != 200:
+            raise Exception(f"Dropbox get_metadata failed: {response.text}")
+        metadata = response.json()
+        remember_metadata([metadata])
+        return metadata
+
+    return coalesce(("get_metadata", path.lower()), lookup)
+
+
+
+class DropboxFileNotFound(Exception):
+    """
+    Raised when Dropbox reports that the requested path does not exist.
+    """
+
+
+def open_download_stream(path: str, byte_range: str = None):
+    """
+    Starts a streaming download of a Dropbox file without reading its body.
+    Optionally forwards an HTTP Range header (e.g. "bytes=0-4095"), in which case
+    Dropbox answers 206 with a Content-Range header.
+    The caller is responsible for consuming and closing the returned response.
+    Raises DropboxFileNotFound for missing paths and Exception for other failures.
+    """
+    if MOCK_MODE:
+        return _mock_response(download_file_from_dropbox(path).encode("utf-8"), path, byte_range)
+
+    access_token = get_access_token()
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Dropbox-API-Arg": json.dumps({"path": path}),
+        # Keep the body byte-identical to the file so Content-Length/Range stay valid
+        "Accept-Encoding": "identity",
     }
+    if byte_range:
+        headers["Range"] = byte_range
 
-    response = requests.post(DROPBOX_API_GET_FILE, headers=headers)
+    response = dropbox_post(DROPBOX_API_GET_FILE, idempotent=True, headers=headers, stream=True)
 
-    if response.status_code != 200:
-        raise Exception(f"Failed to download file: {response.text}")
+    if response.status_code in (200, 206, 416):
+        return response
 
-    return response.text
+    error = response.text
+    response.close()
+    if response.status_code == 409 and "not_found" in error:
+        raise DropboxFileNotFound(path)
+    raise Exception(f"Failed to download file: {error}")
 
 
+def _mock_response(body: bytes, path: str, byte_range: str = None) -> requests.Response:
+    """
+    Builds an in-memory requests.Response shaped like a Dropbox download, for MOCK_MODE.
+    Supports single "bytes=start-end" ranges.
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "application/octet-stream"
+    response.headers["Dropbox-API-Result"] = json.dumps({
+        "name": path.rsplit("/", 1)[-1],
+        "path_display": path,
+        "rev": "mock-rev",
+        "size": len(body)
+    })
+
+    if byte_range and byte_range.startswith("bytes="):
+        start, _, end = byte_range[len("bytes="):].partition("-")
+        if start:
+            start, end = int(start), min(int(end) if end else len(body) - 1, len(body) - 1)
+        else:
+            start, end = max(len(body) - int(end), 0), len(body) - 1
+        response.status_code = 206
+        response.headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+        body = body[start:end + 1]
+
+    response.raw = io.BytesIO(body)
+    response.headers["Content-Length"] = str(len(body))
+    return response
+
 
 def get_file_from_dropbox(filename, folder):
     """
@@ -124,7 +318,7 @@ def get_file_from_dropbox(filename, folder):
         "Dropbox-API-Arg": json.dumps({"path": path})
     }
 
-    response = requests.post(DROPBOX_API_GET_FILE, headers=headers)
+    response = dropbox_post(DROPBOX_API_GET_FILE, idempotent=True, headers=headers)
 
     if response.status_code == 200:
         return response.text
@@ -145,20 +339,202 @@ def list_folder(path):
             {"name": "2025-07-02_meeting.md", ".tag": "file"},
         ]
 
+    return list(iter_folder_entries(path, recursive=False))
+
 
+def iter_folder_entries(path, recursive=False):
+    """
+    Yields metadata entries under the specified Dropbox path, one page at a time.
+    Follows list_folder/continue cursors so only the current page is held in memory.
+    Identical concurrent page requests (same path, or same cursor) share one call.
+    Raises Exception if any API call fails.
+    """
+    if MOCK_MODE:
+        folder = path if path.rsplit("/", 1)[-1][:4].isdigit() else f"{path}/2025-07"
+        for name, modified in (("2025-07-01_test.md", "2025-07-01T09:00:00Z"),
+                               ("2025-07-02_meeting.md", "2025-07-02T10:30:00Z")):
+            yield {
+                ".tag": "file",
+                "name": name,
+                "path_lower": f"{folder}/{name}".lower(),
+                "path_display": f"{folder}/{name}",
+                "client_modified": modified,
+                "server_modified": modified,
+                "rev": "mock-rev",
+                "size": 128,
+            }
+        return
+
+    page = coalesce(
+        ("list_folder", path.lower(), recursive),
+        lambda: _fetch_list_page(DROPBOX_API_LIST_FOLDER, {"path": path, "recursive": recursive})
+    )
+    while True:
+        yield from page.get("entries", [])
+
+        if not page.get("has_more"):
+            return
+        cursor = page["cursor"]
+        page = coalesce(
+            ("list_folder/continue", cursor),
+            lambda: _fetch_list_page(DROPBOX_API_LIST_FOLDER_CONTINUE, {"cursor": cursor})
+        )
+
+
+def list_folder_changes(path, recursive=False, cursor=None):
+    """
+    Returns (entries, cursor) for a folder.
+    Without a cursor this is the full listing; with one, only what changed since it was issued,
+    including {".tag": "deleted"} entries for removed paths.
+    Raises DropboxCursorReset if Dropbox no longer accepts the cursor.
+    """
+    if MOCK_MODE:
+        if cursor:
+            return [], cursor
+        return list(iter_folder_entries(path, recursive)), "mock-cursor"
+
+    if cursor:
+        page = _fetch_list_page(DROPBOX_API_LIST_FOLDER_CONTINUE, {"cursor": cursor})
+    else:
+        page = _fetch_list_page(DROPBOX_API_LIST_FOLDER, {"path": path, "recursive": recursive})
+
+    entries = list(page.get("entries", []))
+    while page.get("has_more"):
+        page = _fetch_list_page(DROPBOX_API_LIST_FOLDER_CONTINUE, {"cursor": page["cursor"]})
+        entries.extend(page.get("entries", []))
+    return entries, page["cursor"]
+
+
+def longpoll_folder(cursor: str, timeout: int = 60):
+    """
+    Waits up to `timeout` seconds (30-480) for changes after a list_folder cursor.
+    Returns (changes, backoff): whether anything changed, and the seconds Dropbox asks us
+    to wait before polling again (or None).
+
+    This call is unauthenticated and mostly idle, so it bypasses the Dropbox gate rather
+    than holding a concurrency slot for minutes.
+    """
+    if MOCK_MODE:
+        time.sleep(timeout)
+        return False, None
+
+    # Dropbox adds up to 90 seconds of random jitter to the requested timeout
+    response = http_session.post(DROPBOX_API_LONGPOLL, json={"cursor": cursor, "timeout": timeout},
+                                 timeout=(CONNECT_TIMEOUT, timeout + 120))
+    if response.status_code == 409 and "reset" in response.text:
+        raise DropboxCursorReset(response.text)
+    if response.status_code != 200:
+        raise Exception(f"Dropbox longpoll failed: {response.text}")
+    result = response.json()
+    return result.get("changes", False), result.get("backoff")
+
+
+def move_batch(moves):
+    """
+    Moves files with a single move_batch_v2 call, waiting for the batch job to finish.
+    `moves` is a list of (from_path, to_path); a target that already exists gets a numbered
+    name instead of failing the move. Returns one result per move, in order:
+    {"from_path", "to_path", "success": bool, "error": str | None}.
+    """
+    if not moves:
+        return []
+    if MOCK_MODE:
+        return [{"from_path": src, "to_path": dst, "success": True, "error": None} for src, dst in moves]
+
+    body = {"entries": [{"from_path": src, "to_path": dst} for src, dst in moves], "autorename": True}
+    entries = _run_batch(DROPBOX_API_MOVE_BATCH, DROPBOX_API_MOVE_BATCH_CHECK, body)
+    results = []
+    for (src, dst), entry in zip(moves, entries):
+        ok = entry.get(".tag") == "success"
+        if ok:
+            _forget_reads(src, entry.get("success", {}).get("path_display", dst))
+            remember_metadata([{".tag": "deleted", "path_lower": src.lower()}, entry.get("success", {})])
+        results.append({"from_path": src, "to_path": entry.get("success", {}).get("path_display", dst),
+                        "success": ok, "error": None if ok else json.dumps(entry.get("failure", entry))})
+    return results
+
+
+def delete_batch(paths):
+    """
+    Deletes files with a single delete_batch call, waiting for the batch job to finish.
+    Returns one {"path", "success", "error"} result per path, in order.
+    """
+    if not paths:
+        return []
+    if MOCK_MODE:
+        return [{"path": path, "success": True, "error": None} for path in paths]
+
+    entries = _run_batch(DROPBOX_API_DELETE_BATCH, DROPBOX_API_DELETE_BATCH_CHECK,
+                         {"entries": [{"path": path} for path in paths]})
+    results = []
+    for path, entry in zip(paths, entries):
+        ok = entry.get(".tag") == "success"
+        if ok:
+            _forget_reads(path)
+            remember_metadata([{".tag": "deleted", "path_lower": path.lower()}])
+        results.append({"path": path, "success": ok,
+                        "error": None if ok else json.dumps(entry.get("failure", entry))})
+    return results
+
+
+def _run_batch(url, check_url, body):
+    """
+    Starts a Dropbox batch job and polls its check endpoint until it completes.
+    Returns the per-entry results. Polling backs off exponentially and stops at the
+    request deadline (or BATCH_WAIT seconds outside a request).
+    """
+    headers = {"Authorization": f"Bearer {get_access_token()}", "Content-Type": "application/json"}
+
+    # Repeating a batch after an unseen success would fail on the moved sources, so only rate limits are retried
+    response = dropbox_post(url, idempotent=False, headers=headers, json=body)
+    if response.status_code != 200:
+        raise Exception(f"Dropbox batch failed: {response.text}")
+    result = response.json()
+
+    job_id = result.get("async_job_id")
+    delay = BATCH_POLL_DELAY
+    give_up = time.monotonic() + bounded(BATCH_WAIT)
+    while result.get(".tag") in ("async_job_id", "in_progress"):
+        if time.monotonic() + delay > give_up:
+            check_deadline()
+            raise Exception(f"Dropbox batch job {job_id} still running after {BATCH_WAIT}s")
+        time.sleep(delay)
+        delay = min(delay * 2, BATCH_POLL_MAX_DELAY)
+        response = dropbox_post(check_url, idempotent=True, headers=headers, json={"async_job_id": job_id})
+        if response.status_code != 200:
+            raise Exception(f"Dropbox batch check failed: {response.text}")
+        result = response.json()
+
+    if result.get(".tag") != "complete":
+        raise Exception(f"Dropbox batch job failed: {json.dumps(result)}")
+    return result.get("entries", [])
+
+
+class DropboxCursorReset(Exception):
+    """
+    Raised when a list_folder cursor has expired (or is not a valid cursor at all) and the
+    folder must be listed again.
+    """
+
+
+def _fetch_list_page(url, data):
+    """
+    Fetches a single list_folder (or list_folder/continue) result page.
+    """
     access_token = get_access_token()
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
-    data = {
-        "path": path,
-        "recursive": False
-    }
 
-    response = requests.post(DROPBOX_API_LIST_FOLDER, headers=headers, json=data)
-
-    if response.status_code == 200:
-        return response.json().get("entries", [])
-    else:
+    response = dropbox_post(url, idempotent=True, headers=headers, json=data)
+    if response.status_code == 409 and "reset" in response.text:
+        raise DropboxCursorReset(response.text)
+    if response.status_code == 400 and "cursor" in data:
+        # Dropbox answers 400 to a cursor it cannot parse
+        raise DropboxCursorReset(response.text)
+    if response.status_code != 200:
         raise Exception(f"Dropbox list_folder failed: {response.text}")
+    page = response.json()
+    remember_metadata(page.get("entries", []))
+    return page
@@ -0,0 +1,98 @@
+import os
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from services.dropbox_gate import DropboxUnavailable, INTERACTIVE, current_priority
+from utils.deadline_utils import DeadlineExceeded
+
+# Threads shared by every fan-out in the process, and how many of them a single call may use
+DROPBOX_IO_WORKERS = int(os.getenv("DROPBOX_IO_WORKERS", "16"))
+DROPBOX_FANOUT = int(os.getenv("DROPBOX_FANOUT", "8"))
+
+# Threads a single background or bulk fan-out may use, so requests still find free ones
+DROPBOX_BACKGROUND_FANOUT = int(os.getenv("DROPBOX_BACKGROUND_FANOUT", "4"))
+
+# Errors that end a fan-out at once: Dropbox is down, or the request is out of time
+FATAL_ERRORS = (DropboxUnavailable, DeadlineExceeded)
+
+_THREAD_PREFIX = "dropbox-io"
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DROPBOX_IO_WORKERS, thread_name_prefix=_THREAD_PREFIX)
+        return _executor
+
+
+def _in_pool() -> bool:
+    return threading.current_thread().name.startswith(_THREAD_PREFIX)
+
+
+def submit(fn, *args):
+    """
+    Runs `fn(*args)` on the shared Dropbox I/O pool and returns its Future.
+    The call runs in a copy of the caller's context, so it sees the request deadline and
+    keeps the caller's Dropbox priority class.
+    """
+    return _pool().submit(contextvars.copy_context().run, fn, *args)
+
+
+def fan_out(fn, items, limit: int = None, return_exceptions: bool = False) -> list:
+    """
+    Calls `fn(item)` for every item on the shared pool, with at most `limit` calls
+    (default DROPBOX_FANOUT) in flight for this fan-out, and returns the results in item order.
+    Background and bulk fan-outs use at most DROPBOX_BACKGROUND_FANOUT threads.
+
+    DropboxUnavailable and DeadlineExceeded cancel the calls not started yet and are raised.
+    Other exceptions do the same unless `return_exceptions` is set, in which case the exception
+    is returned in place of that item's result.
+
+    Called from a pool thread, the items run inline one after another, so nested fan-outs
+    cannot starve the pool.
+    """
+    items = list(items)
+    if _in_pool() or len(items) <= 1:
+        results = []
+        for item in items:
+            try:
+                results.append(fn(item))
+            except FATAL_ERRORS:
+                raise
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    limit = limit or DROPBOX_FANOUT
+    if current_priority() != INTERACTIVE:
+        limit = min(limit, DROPBOX_BACKGROUND_FANOUT)
+    limit = max(1, min(limit, len(items)))
+    results = [None] * len(items)
+    running = {}
+    next_index = 0
+    try:
+        while next_index < len(items) or running:
+            while next_index < len(items) and len(running) < limit:
+                running[submit(fn, items[next_index])] = next_index
+                next_index += 1
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                try:
+                    results[index] = future.result()
+                except FATAL_ERRORS:
+                    raise
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results[index] = e
+    finally:
+        # On the first fatal error: drop whatever has not started; running calls finish on their own
+        for future in running:
+            future.cancel()
+    return results
@@ -0,0 +1,337 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+CONCURRENCY_INITIAL = int(os.getenv("DROPBOX_CONCURRENCY_INITIAL", "8"))
+CONCURRENCY_MIN = int(os.getenv("DROPBOX_CONCURRENCY_MIN", "1"))
+CONCURRENCY_MAX = int(os.getenv("DROPBOX_CONCURRENCY_MAX", "32"))
+LATENCY_TARGET = float(os.getenv("DROPBOX_LATENCY_TARGET", "2.0"))
+BREAKER_THRESHOLD = int(os.getenv("DROPBOX_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.getenv("DROPBOX_BREAKER_RESET", "30"))
+
+# Outcomes reported for each Dropbox call. ABORTED is a call the caller's own deadline cut short,
+# which says nothing about Dropbox's health: it neither trips the breaker nor moves the limit
+OK, RATE_LIMITED, FAILURE, ABORTED = "ok", "rate_limited", "failure", "aborted"
+
+# Priority classes of Dropbox calls: API requests, upkeep (scans, async jobs, webhook syncs) and
+# bulk work (exports, front matter indexing, cache warming)
+INTERACTIVE, BACKGROUND, BULK = "interactive", "background", "bulk"
+PRIORITIES = (INTERACTIVE, BACKGROUND, BULK)
+
+# Share of waiting slots each class gets while they compete, and the part of the concurrency
+# limit only interactive calls may use
+PRIORITY_WEIGHTS = {
+    INTERACTIVE: float(os.getenv("DROPBOX_WEIGHT_INTERACTIVE", "8")),
+    BACKGROUND: float(os.getenv("DROPBOX_WEIGHT_BACKGROUND", "3")),
+    BULK: float(os.getenv("DROPBOX_WEIGHT_BULK", "1")),
+}
+INTERACTIVE_RESERVE = float(os.getenv("DROPBOX_INTERACTIVE_RESERVE", "0.25"))
+
+_priority = contextvars.ContextVar("dropbox_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(name: str):
+    """
+    Runs the block's Dropbox calls in priority class `name`. Calls default to INTERACTIVE;
+    the class follows work handed to the shared executor, as the request deadline does.
+    """
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def iter_with_priority(name: str, iterable):
+    """
+    Yields from `iterable`, running each step in priority class `name`. For generators whose
+    Dropbox calls happen while a streamed response is being sent.
+    """
+    iterator = iter(iterable)
+    try:
+        while True:
+            with priority(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            with priority(name):
+                close()
+
+
+class DropboxUnavailable(Exception):
+    """
+    Raised instead of calling Dropbox when it is known to be unhealthy or saturated.
+    `retry_after` is the number of seconds clients should wait before retrying.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, int(round(retry_after)))
+
+
+class _Waiter:
+    __slots__ = ("priority", "start", "finish", "enqueued")
+
+    def __init__(self, priority, start, finish):
+        self.priority = priority
+        self.start = start
+        self.finish = finish
+        self.enqueued = time.monotonic()
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted with AIMD: every call that completes under the latency
+    target grows the limit by 1/limit (about +1 per full window), a rate limit halves it,
+    and a slow call shrinks it by 10%. Decreases happen at most once per target interval
+    so a burst of simultaneous 429s counts as one congestion signal.
+
+    Waiting calls are admitted by weighted fair queuing across the priority classes: each
+    waiter gets a virtual finish time 1/weight after its class's previous one, and the
+    smallest finish time goes next. INTERACTIVE_RESERVE of the limit is held back for
+    interactive calls, so background and bulk work never fill every slot.
+    """
+
+    def __init__(self, initial=CONCURRENCY_INITIAL, minimum=CONCURRENCY_MIN, maximum=CONCURRENCY_MAX,
+                 latency_target=LATENCY_TARGET):
+        self._cond = threading.Condition()
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self.waiting = 0
+        self.avg_latency = 0.0
+        self._last_decrease = 0.0
+        self._waiters = []
+        self._virtual_time = 0.0
+        self._last_finish = {name: 0.0 for name in PRIORITIES}
+        self.classes = {name: {"in_flight": 0, "waiting": 0, "admitted": 0, "avg_wait": 0.0} for name in PRIORITIES}
+
+    def _has_room(self, priority) -> bool:
+        limit = int(self.limit)
+        if priority == INTERACTIVE:
+            return self.in_flight < limit
+        # Never reserve the last slot away from everyone else
+        return self.in_flight < limit - min(int(limit * INTERACTIVE_RESERVE), limit - 1)
+
+    def _next(self):
+        """
+        The waiter that goes next: the smallest virtual finish time among classes with room.
+        """
+        eligible = [w for w in self._waiters if self._has_room(w.priority)]
+        return min(eligible, key=lambda w: w.finish) if eligible else None
+
+    def acquire(self, timeout, priority=INTERACTIVE) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            stats = self.classes[priority]
+            if not self._waiters and self._has_room(priority):
+                self._admit(priority, 0.0)
+                return True
+
+            start = max(self._virtual_time, self._last_finish[priority])
+            waiter = _Waiter(priority, start, start + 1 / PRIORITY_WEIGHTS[priority])
+            self._last_finish[priority] = waiter.finish
+            self._waiters.append(waiter)
+            self.waiting += 1
+            stats["waiting"] += 1
+            try:
+                while self._next() is not waiter:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self._virtual_time = max(self._virtual_time, waiter.start)
+                self._admit(priority, time.monotonic() - waiter.enqueued)
+                return True
+            finally:
+                self._waiters.remove(waiter)
+                self.waiting -= 1
+                stats["waiting"] -= 1
+                # Whoever is next now (there may be room left, or this waiter gave up) re-checks
+                self._cond.notify_all()
+
+    def _admit(self, priority, waited):
+        stats = self.classes[priority]
+        self.in_flight += 1
+        stats["in_flight"] += 1
+        stats["admitted"] += 1
+        stats["avg_wait"] = waited if stats["admitted"] == 1 else 0.9 * stats["avg_wait"] + 0.1 * waited
+
+    def release(self, latency, outcome, priority=INTERACTIVE):
+        with self._cond:
+            self.in_flight -= 1
+            self.classes[priority]["in_flight"] -= 1
+            self.avg_latency = latency if not self.avg_latency else 0.8 * self.avg_latency + 0.2 * latency
+
+            now = time.monotonic()
+            can_decrease = now - self._last_decrease >= self.latency_target
+            if outcome == RATE_LIMITED and can_decrease:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+            elif outcome == OK and latency > self.latency_target and can_decrease:
+                self.limit = max(self.minimum, self.limit * 0.9)
+                self._last_decrease = now
+            elif outcome == OK and latency <= self.latency_target:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Opens after BREAKER_THRESHOLD consecutive failed or rate-limited calls and rejects
+    calls until the reset timeout (or Dropbox's Retry-After, if longer) has passed.
+    Then a single probe call is let through (half-open): success closes the circuit,
+    failure opens it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self._lock = threading.Lock()
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            if self.state == "open" and now >= self.open_until:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise DropboxUnavailable("Dropbox is unavailable (circuit open)", max(self.open_until - now, 1))
+
+    def release_probe(self):
+        """
+        Gives back the half-open probe slot when the admitted call never ran.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, outcome, retry_after=None):
+        with self._lock:
+            self._probe_in_flight = False
+            if outcome == ABORTED:
+                # A half-open circuit lets the next call probe instead
+                return
+            if outcome == OK:
+                self.state = "closed"
+                self.consecutive_failures = 0
+                return
+
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.open_until = time.monotonic() + max(self.reset_timeout, retry_after or 0)
+
+
+class DropboxGate:
+    """
+    Process-wide admission point for Dropbox calls: circuit breaker first,
+    then the adaptive concurrency limit. Keeps counters for metrics.
+    """
+
+    def __init__(self):
+        self.limiter = AdaptiveLimiter()
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "ok": 0, "rate_limited": 0, "failures": 0, "aborted": 0, "rejected": 0}
+
+    @contextmanager
+    def admit(self, timeout):
+        """
+        Holds a concurrency slot for one Dropbox call, queued by the caller's priority class
+        (see priority()). The body sets `call.outcome` (and optionally `call.retry_after`);
+        an exception counts as a failure unless the body marked the call ABORTED.
+        Raises DropboxUnavailable if the circuit is open or no slot frees up in time.
+        """
+        call_priority = current_priority()
+        try:
+            self.breaker.before_call()
+            if not self.limiter.acquire(max(timeout, 0), call_priority):
+                self.breaker.release_probe()
+                raise DropboxUnavailable("Dropbox concurrency limit saturated", self.limiter.avg_latency or 1)
+        except DropboxUnavailable:
+            self._count("rejected")
+            raise
+
+        call = _Call()
+        started = time.monotonic()
+        try:
+            yield call
+        finally:
+            self.limiter.release(time.monotonic() - started, call.outcome, call_priority)
+            self.breaker.record(call.outcome, call.retry_after)
+            self._count("calls")
+            self._count({OK: "ok", RATE_LIMITED: "rate_limited", ABORTED: "aborted"}.get(call.outcome, "failures"))
+
+    def ensure_available(self):
+        """
+        Fails fast while the circuit is open, without using up the half-open probe.
+        Used by streaming routes, which cannot change their status once the body has started.
+        """
+        retry_in = self.breaker.open_until - time.monotonic()
+        if self.breaker.state == "open" and retry_in > 0:
+            self._count("rejected")
+            raise DropboxUnavailable("Dropbox is unavailable (circuit open)", retry_in)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Current limiter, breaker and counter state, for /api/metrics and the dashboard.
+        """
+        retry_in = max(self.breaker.open_until - time.monotonic(), 0) if self.breaker.state == "open" else 0
+        with self._lock:
+            counters = dict(self.counters)
+        with self.limiter._cond:
+            classes = {name: {"in_flight": stats["in_flight"], "waiting": stats["waiting"],
+                              "admitted": stats["admitted"], "avg_wait_seconds": round(stats["avg_wait"], 3)}
+                       for name, stats in self.limiter.classes.items()}
+        return {
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "waiting": self.limiter.waiting,
+            "avg_latency_seconds": round(self.limiter.avg_latency, 3),
+            "circuit_state": self.breaker.state,
+            "circuit_retry_in_seconds": round(retry_in, 1),
+            "circuit_times_opened": self.breaker.times_opened,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "priorities": classes,
+            **counters,
+        }
+
+
+class _Call:
+    __slots__ = ("outcome", "retry_after")
+
+    def __init__(self):
+        self.outcome = FAILURE
+        self.retry_after = None
+
+
+dropbox_gate = DropboxGate()
@@ -0,0 +1,224 @@
+import os
+import time
+import random
+import requests
+from requests.adapters import HTTPAdapter
+from email.utils import parsedate_to_datetime
+from services.dropbox_gate import (OK, RATE_LIMITED, FAILURE, ABORTED, DropboxUnavailable, current_priority,
+                                   dropbox_gate)
+from services.shared_cache import ACCESS_TOKEN_KEY, local_cache
+from utils.deadline_utils import (CONNECT_TIMEOUT, READ_TIMEOUT, DeadlineExceeded, bounded, call_timeout,
+                                  check_deadline)
+from utils.logging_utils import log
+from utils.singleflight import SingleFlight
+
+# Base URLs can be pointed at a local stand-in (see scripts/mock_dropbox_server.py)
+DROPBOX_API_BASE = os.getenv("DROPBOX_API_BASE", "https://api.dropboxapi.com")
+DROPBOX_CONTENT_BASE = os.getenv("DROPBOX_CONTENT_BASE", "https://content.dropboxapi.com")
+DROPBOX_NOTIFY_BASE = os.getenv("DROPBOX_NOTIFY_BASE", "https://notify.dropboxapi.com")
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("DROPBOX_RETRY_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.getenv("DROPBOX_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("DROPBOX_RETRY_MAX_DELAY", "20"))
+RETRY_DEADLINE = float(os.getenv("DROPBOX_RETRY_DEADLINE", "45"))
+
+# Keep-alive connections kept open per Dropbox host. Calls beyond this still go out on a fresh
+# connection, which is closed afterwards instead of being returned to the pool.
+POOL_SIZE = int(os.getenv("DROPBOX_POOL_SIZE", "64"))
+
+
+def _make_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# One connection pool for every Dropbox call in the process, so calls reuse warm TLS connections
+# instead of paying a TCP and TLS handshake each time
+http_session = _make_session()
+
+# Identical concurrent reads share one Dropbox call (see utils/singleflight.py)
+dropbox_flights = SingleFlight()
+COALESCE_WAIT = float(os.getenv("DROPBOX_COALESCE_WAIT", str(RETRY_DEADLINE + 15)))
+
+# Failures caused by the leading caller's own time budget, which followers with time left retry
+LEADER_ERRORS = (DeadlineExceeded, requests.Timeout)
+
+# Error summaries meaning "Dropbox refused before doing any work" — always safe to repeat
+RATE_LIMIT_ERRORS = ("too_many_requests", "too_many_write_operations")
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+
+
+def parse_retry_after(response):
+    """
+    Returns the server-requested wait in seconds, from the Retry-After header
+    (delta-seconds or HTTP date) or the `retry_after` field of a rate-limit error body.
+    Returns None when the response carries no hint.
+    """
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(float(header), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(header).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    error = _error_body(response).get("error")
+    if isinstance(error, dict) and "retry_after" in error:
+        return float(error["retry_after"])
+    return None
+
+
+def error_summary(response) -> str:
+    """
+    Returns Dropbox's `error_summary` (e.g. "too_many_write_operations/..") or "".
+    """
+    return _error_body(response).get("error_summary", "") or ""
+
+
+def _error_body(response) -> dict:
+    if response.status_code < 400:
+        return {}
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Full-jitter exponential backoff: uniform in [0, min(max, base * 2^(attempt-1))].
+    """
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+
+def retry_delay(response, attempt: int, idempotent: bool):
+    """
+    Decides whether a Dropbox response should be retried.
+    Returns the number of seconds to wait, or None if the response is final.
+    """
+    status = response.status_code
+    summary = error_summary(response) if status in (409, 429, 503) else ""
+    retry_after = parse_retry_after(response) if status in (429, 503) else None
+
+    rate_limited = (
+        status == 429
+        or (status == 503 and retry_after is not None)
+        or any(summary.startswith(e) or f"/{e}" in summary for e in RATE_LIMIT_ERRORS)
+    )
+    if rate_limited:
+        # Honour the server's hint, spreading concurrent waiters a little
+        if retry_after is not None:
+            return retry_after + random.uniform(0, RETRY_BASE_DELAY)
+        return backoff_delay(attempt)
+
+    if status in TRANSIENT_STATUSES and idempotent:
+        return backoff_delay(attempt)
+
+    return None
+
+
+def classify(response):
+    """
+    Maps a response to a gate outcome: (OK | RATE_LIMITED | FAILURE, retry_after).
+    Client errors other than rate limits mean Dropbox itself is healthy.
+    """
+    write_limited = response.status_code == 409 and "too_many_write_operations" in error_summary(response)
+    if response.status_code == 429 or write_limited:
+        return RATE_LIMITED, parse_retry_after(response)
+    if response.status_code >= 500:
+        return FAILURE, parse_retry_after(response)
+    return OK, None
+
+
+def cut_short(timeout, error: requests.Timeout) -> bool:
+    """
+    Whether a timed-out call had less than the full per-call timeout because the request's
+    deadline was close, so the timeout says more about the caller's budget than about Dropbox.
+    """
+    connect, read = timeout
+    if isinstance(error, requests.ConnectTimeout):
+        return connect < CONNECT_TIMEOUT
+    return read < READ_TIMEOUT
+
+
+def coalesce(key, fn):
+    """
+    Runs `fn` through dropbox_flights so identical concurrent calls share one request.
+    Only calls in the same priority class share one, so an interactive call never waits
+    behind a bulk request queued in the gate. Followers wait no longer than the current
+    request's remaining budget, and retry rather than fail when the leader ran out of its
+    own (LEADER_ERRORS).
+    """
+    try:
+        return dropbox_flights.do((current_priority(), key), fn, timeout=bounded(COALESCE_WAIT),
+                                  retry_on=LEADER_ERRORS)
+    except TimeoutError:
+        check_deadline()
+        raise
+
+
+def dropbox_post(url: str, *, idempotent: bool, deadline: float = None, **kwargs):
+    """
+    POSTs to a Dropbox endpoint through the process-wide gate, retrying transient failures
+    with jittered exponential backoff.
+
+    Rate limits (429, 503 with Retry-After, too_many_write_operations) are always retried,
+    since Dropbox rejected the call before acting on it. 5xx responses and connection errors
+    are retried only for idempotent calls (reads, `overwrite` uploads), as the first attempt
+    may already have taken effect. Retries stop once the next wait would pass `deadline`
+    seconds from the first attempt, or the current request's deadline.
+
+    Every attempt gets connect/read timeouts sized to the remaining request budget
+    (see utils/deadline_utils.py); DeadlineExceeded is raised once that budget is gone.
+    A timeout under such a shortened budget is reported to the gate as ABORTED, so requests
+    running out of their own time cannot open the circuit for everyone else.
+
+    Returns the final response, which may still be an error; raises the last connection
+    error if no response was ever received.
+    """
+    give_up_at = time.monotonic() + bounded(RETRY_DEADLINE if deadline is None else deadline)
+    operation = url.split("/", 3)[-1]
+    attempt = 0
+
+    while True:
+        attempt += 1
+        timeout = call_timeout()
+        try:
+            # Waits for a concurrency slot; raises DropboxUnavailable when the circuit is open
+            with dropbox_gate.admit(timeout=give_up_at - time.monotonic()) as call:
+                try:
+                    response = http_session.post(url, timeout=timeout, **kwargs)
+                except requests.Timeout as e:
+                    if cut_short(timeout, e):
+                        call.outcome = ABORTED
+                    raise
+                call.outcome, call.retry_after = classify(response)
+        except DropboxUnavailable:
+            check_deadline()
+            raise
+        except (requests.ConnectionError, requests.Timeout) as e:
+            check_deadline()
+            if not idempotent or attempt >= RETRY_MAX_ATTEMPTS:
+                raise
+            delay, outcome = backoff_delay(attempt), type(e).__name__
+            if time.monotonic() + delay > give_up_at:
+                raise
+        else:
+            if response.status_code == 401:
+                # Expired or revoked token: the next call fetches a new one
+                local_cache.delete(ACCESS_TOKEN_KEY)
+            delay = retry_delay(response, attempt, idempotent)
+            if delay is None or attempt >= RETRY_MAX_ATTEMPTS or time.monotonic() + delay > give_up_at:
+                return response
+            outcome = error_summary(response) or str(response.status_code)
+            response.close()
+
+        log(f"🔁 Dropbox {operation} failed ({outcome}), retry {attempt}/{RETRY_MAX_ATTEMPTS - 1} "
+            f"in {delay:.2f}s", level="warning")
+        time.sleep(delay)
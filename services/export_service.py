@@ -0,0 +1,185 @@
+import os
+import gzip
+import json
+import tarfile
+import time
+import zipfile
+from collections import deque
+from datetime import datetime
+from services.dropbox_client import iter_folder_entries, open_download_stream
+from services.dropbox_executor import submit
+from services.dropbox_gate import BULK, iter_with_priority
+from utils.logging_utils import log
+
+EXPORT_FORMATS = ("zip", "tar.gz")
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "4"))
+CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkSink:
+    """
+    Write-only file object that buffers archive output until the generator drains it.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _archive_name(entry, root_path):
+    """
+    Returns the entry path relative to the exported root (e.g. "2025-07/note.md").
+    """
+    return entry["path_display"][len(root_path):].strip("/")
+
+
+def _modified_timestamp(entry):
+    modified = entry.get("client_modified") or entry.get("server_modified")
+    if not modified:
+        return time.time()
+    return datetime.strptime(modified, "%Y-%m-%dT%H:%M:%SZ").timestamp()
+
+
+def _downloaded_size(response, entry):
+    """
+    Exact byte size of a download, from Dropbox's result header or the listing entry.
+    """
+    result = response.headers.get("Dropbox-API-Result")
+    if result:
+        return json.loads(result)["size"]
+    return entry.get("size", 0)
+
+
+def _iter_downloads(entries, concurrency):
+    """
+    Yields (entry, response_or_exception) in listing order while keeping at most
+    `concurrency` downloads open. A new download is only started once the caller
+    has moved past an earlier one, so a slow client throttles Dropbox reads too.
+    """
+    window = deque()
+    try:
+        for entry in entries:
+            window.append((entry, submit(open_download_stream, entry["path_display"])))
+            if len(window) >= concurrency:
+                yield _resolve(*window.popleft())
+        while window:
+            yield _resolve(*window.popleft())
+    finally:
+        # Client went away or an error occurred: close anything still open
+        for _, future in window:
+            future.cancel()
+            future.add_done_callback(_close_download)
+
+
+def _close_download(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _resolve(entry, future):
+    try:
+        return entry, future.result()
+    except Exception as e:
+        return entry, e
+
+
+def _write_zip(sink, downloads, failures):
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, entry, response in downloads:
+            info = zipfile.ZipInfo(name, time.localtime(_modified_timestamp(entry))[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.file_size = _downloaded_size(response, entry)
+            with archive.open(info, mode="w") as member:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    member.write(chunk)
+                    yield sink.drain()
+
+        if failures:
+            archive.writestr("_export_errors.txt", "\n".join(failures) + "\n")
+    yield sink.drain()
+
+
+def _write_tar_gz(sink, downloads, failures):
+    with gzip.GzipFile(fileobj=sink, mode="wb") as archive:
+        for name, entry, response in downloads:
+            info = tarfile.TarInfo(name)
+            info.size = _downloaded_size(response, entry)
+            info.mtime = int(_modified_timestamp(entry))
+            archive.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+
+            written = 0
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                chunk = chunk[:info.size - written]
+                archive.write(chunk)
+                written += len(chunk)
+                yield sink.drain()
+
+            if written < info.size:
+                # Keep the archive structurally valid even if Dropbox sent a short body
+                failures.append(f"{name}: truncated ({written}/{info.size} bytes)")
+                archive.write(b"\0" * (info.size - written))
+            archive.write(b"\0" * (-info.size % tarfile.BLOCKSIZE))
+
+        if failures:
+            report = ("\n".join(failures) + "\n").encode("utf-8")
+            info = tarfile.TarInfo("_export_errors.txt")
+            info.size = len(report)
+            info.mtime = int(time.time())
+            archive.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+            archive.write(report + b"\0" * (-len(report) % tarfile.BLOCKSIZE))
+
+        # End-of-archive marker: two zero blocks
+        archive.write(b"\0" * tarfile.BLOCKSIZE * 2)
+    yield sink.drain()
+
+
+def stream_folder_archive(root_path: str, archive_format: str = "zip", concurrency: int = EXPORT_CONCURRENCY):
+    """
+    Generates a zip or tar.gz archive of every file under a Dropbox folder, chunk by chunk.
+
+    The folder listing, downloads and compression are interleaved: bytes are yielded as soon
+    as the first file arrives, at most `concurrency` downloads are open at once, and each
+    body is copied in CHUNK_SIZE pieces, so memory stays bounded regardless of folder size.
+    Files that fail to download are skipped and listed in `_export_errors.txt`.
+    Its Dropbox calls run as bulk work, behind interactive requests.
+    """
+    if archive_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {archive_format}")
+
+    failures = []
+    exported = {"files": 0}
+
+    def downloads():
+        files = (e for e in iter_folder_entries(root_path, recursive=True) if e[".tag"] == "file")
+        for entry, response in _iter_downloads(files, concurrency):
+            name = _archive_name(entry, root_path)
+            if isinstance(response, Exception):
+                log(f"⚠️ Export skipped {name}: {str(response)}", level="warning")
+                failures.append(f"{name}: {str(response)}")
+                continue
+            try:
+                yield name, entry, response
+                exported["files"] += 1
+            finally:
+                response.close()
+
+    sink = _ChunkSink()
+    writer = _write_zip if archive_format == "zip" else _write_tar_gz
+    for chunk in iter_with_priority(BULK, writer(sink, downloads(), failures)):
+        if chunk:
+            yield chunk
+
+    log(f"📦 Exported {exported['files']} files from {root_path} as {archive_format} "
+        f"({len(failures)} failed)")
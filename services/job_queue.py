@@ -0,0 +1,269 @@
+import os
+import json
+import uuid
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from services.dropbox_gate import BACKGROUND, priority
+from utils.logging_utils import log
+
+DATA_DIR = "data"
+JOBS_DB = os.path.join(DATA_DIR, "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+
+TERMINAL_STATUSES = ("succeeded", "partial", "failed")
+
+
+class QueueFull(Exception):
+    """
+    Raised when too many jobs are already waiting.
+    """
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _owner_alive(owner: str) -> bool:
+    """
+    Whether the worker process that claimed a job (recorded as "host:pid") still exists.
+    Jobs owned by other hosts are assumed alive.
+    """
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return bool(owner)
+    try:
+        os.kill(int(pid), 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+class JobQueue:
+    """
+    Persistent background job queue backed by a local SQLite file.
+
+    Jobs are rows in `jobs`; any worker process may submit them, and a bounded pool of
+    threads per process claims queued rows with an atomic UPDATE, so a job runs once even
+    with several gunicorn workers. Jobs left "running" by a process that died are re-queued
+    on the next start. Handlers report progress, which is stored with the job and can be
+    polled or streamed.
+    """
+
+    def __init__(self, path=JOBS_DB, workers=JOB_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers = {}
+        self._wakeup = threading.Condition()
+        self._slots = threading.Semaphore(workers)
+        self._pool = None
+        self._stopping = threading.Event()
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread (and process: connections do not survive fork), reused across calls;
+        # `with` blocks around it still roll back a transaction that fails
+        connection = getattr(self._local, "db", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            self._local.db, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT,
+                    owner TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def register(self, kind: str, handler):
+        """
+        Registers handler(payload, progress) for a job kind. The handler returns a
+        JSON-serializable result dict; a "status" of "partial" in it marks the job partial.
+        """
+        self._handlers[kind] = handler
+
+    def start(self):
+        """
+        Creates the database, re-queues jobs orphaned by dead processes and starts the dispatcher.
+        """
+        if self._pool:
+            return
+        self._init_db()
+        with self._connect() as db:
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=JOB_RETENTION_DAYS)).isoformat()
+            db.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'partial', 'failed') AND updated_at < ?",
+                       (cutoff,))
+            for row in db.execute("SELECT id, owner FROM jobs WHERE status = 'running'").fetchall():
+                if not _owner_alive(row["owner"]):
+                    db.execute("UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ? WHERE id = ?",
+                               (_now(), row["id"]))
+                    log(f"♻️ Re-queued interrupted job {row['id']}", level="warning")
+
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True).start()
+
+    def submit(self, kind: str, payload: dict) -> str:
+        """
+        Persists a new queued job and wakes the dispatcher. Returns the job id.
+        Raises QueueFull when JOB_QUEUE_LIMIT jobs are already queued.
+        """
+        job_id = uuid.uuid4().hex
+        now = _now()
+        with self._connect() as db:
+            # Count and insert in one write transaction, so concurrent submits cannot all pass the limit
+            db.execute("BEGIN IMMEDIATE")
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= JOB_QUEUE_LIMIT:
+                raise QueueFull(f"{queued} jobs already queued")
+            db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now)
+            )
+            db.execute("COMMIT")
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str):
+        """
+        Returns the job as a dict, or None if unknown.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "progress": json.loads(row["progress"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def wait_for_update(self, timeout: float):
+        """
+        Blocks until a job changes in this process or `timeout` passes.
+        Changes made by other processes are picked up by the caller re-reading the row.
+        """
+        with self._wakeup:
+            self._wakeup.wait(timeout)
+
+    def stop(self, wait: bool = True, timeout: float = None) -> bool:
+        """
+        Stops claiming new jobs; with `wait`, gives running jobs up to `timeout` seconds
+        (no limit if None) to finish. Returns True if no job is left running.
+        Jobs still running when the process exits are re-queued by the next start().
+        """
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if not self._pool:
+            return True
+        self._pool.shutdown(wait=False)
+        if not wait:
+            return False
+
+        # Every running job holds a slot; once all slots are ours, nothing is running
+        give_up = None if timeout is None else time.monotonic() + timeout
+        for _ in range(self.workers):
+            left = None if give_up is None else max(give_up - time.monotonic(), 0)
+            if not self._slots.acquire(timeout=left):
+                log("⚠️ Job queue stopped with jobs still running; they will be re-queued", level="warning")
+                return False
+        return True
+
+    def _claim_next(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1, updated_at = ? "
+                    "WHERE id = ?",
+                    (self.owner, _now(), row["id"])
+                )
+            db.execute("COMMIT")
+        return row
+
+    def _dispatch(self):
+        while not self._stopping.is_set():
+            self._slots.acquire()
+            try:
+                row = self._claim_next()
+            except sqlite3.Error as e:
+                log(f"❌ Job queue error: {str(e)}", level="error")
+                row = None
+            if row is None:
+                self._slots.release()
+                with self._wakeup:
+                    self._wakeup.wait(JOB_POLL_SECONDS)
+                continue
+            try:
+                self._pool.submit(self._run, row)
+            except RuntimeError:
+                # Pool shut down while draining; leave the job for the next start
+                self._finish(row["id"], status="queued", owner=None)
+                self._slots.release()
+
+    def _run(self, row):
+        job_id = row["id"]
+        try:
+            handler = self._handlers[row["kind"]]
+            progress = json.loads(row["progress"])
+
+            def report(**fields):
+                progress.update(fields)
+                self._finish(job_id, progress=json.dumps(progress))
+
+            with priority(BACKGROUND):
+                result = handler(json.loads(row["payload"]), report)
+            status = "partial" if result.get("status") == "partial" else "succeeded"
+            self._finish(job_id, status=status, result=json.dumps(result, default=str))
+            log(f"✅ Job {job_id} ({row['kind']}) {status}")
+        except Exception as e:
+            self._finish(job_id, status="failed", error=str(e))
+            log(f"❌ Job {job_id} ({row['kind']}) failed: {str(e)}", level="error")
+        finally:
+            self._slots.release()
+
+    def _finish(self, job_id, **fields):
+        fields["updated_at"] = _now()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from utils.logging_utils import log
+
+DATA_DIR = "data"
+LEDGER_DB = os.path.join(DATA_DIR, "ledger.db")
+
+
+def request_key(metadata: dict, copy_linked_files: bool) -> str:
+    """
+    Fingerprint of a processing request, so the same note processed with different
+    metadata is not mistaken for a repeat.
+    """
+    payload = json.dumps({"metadata": metadata, "copy_linked_files": copy_linked_files}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ProcessingLedger:
+    """
+    Persistent record of processed Inbox notes, keyed by Inbox path and Dropbox rev.
+
+    Each row maps a processed source revision to the KB note it produced, the source's
+    content_hash, the request fingerprint and the response that was returned, so a repeat
+    of the same request can be answered without touching Dropbox again.
+
+    The latest processed rev of every Inbox path is also held in memory for O(1) lookups
+    while filtering listings. Writes from other processes are noticed through SQLite's
+    data_version and trigger a reload.
+    """
+
+    def __init__(self, path=LEDGER_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+        self._data_version = None
+        self._latest = {}
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS processed (
+                    inbox_path TEXT NOT NULL,
+                    rev TEXT NOT NULL,
+                    content_hash TEXT,
+                    request_key TEXT NOT NULL,
+                    kb_path TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    outcome TEXT NOT NULL,
+                    processed_at TEXT NOT NULL,
+                    PRIMARY KEY (inbox_path, rev)
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS processed_hash ON processed (inbox_path, content_hash)")
+        return self._db
+
+    def _sync(self):
+        """
+        Reloads the in-memory index if the database changed since it was built. Caller holds the lock.
+        """
+        db = self._connect()
+        version = db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._latest = {
+            row["inbox_path"]: row["rev"]
+            for row in db.execute("SELECT inbox_path, rev FROM processed ORDER BY processed_at")
+        }
+        self._data_version = version
+
+    def lookup(self, inbox_path: str, rev: str, content_hash: str, key: str):
+        """
+        Returns the recorded outcome of an identical earlier request, or None.
+        A match is the same path and rev, or the same path and content_hash (identical bytes
+        uploaded again under a new rev), processed with the same request fingerprint.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT outcome FROM processed WHERE inbox_path = ? AND request_key = ? "
+                "AND (rev = ? OR (content_hash IS NOT NULL AND content_hash = ?)) "
+                "ORDER BY processed_at DESC LIMIT 1",
+                (inbox_path.lower(), key, rev, content_hash)
+            ).fetchone()
+        return json.loads(row["outcome"]) if row else None
+
+    def lookup_released(self, inbox_path: str, key: str):
+        """
+        Returns the recorded outcome of an identical earlier request that archived or deleted
+        the note, so a repeat after the note left the Inbox is answered instead of failing.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT outcome FROM processed WHERE inbox_path = ? AND request_key = ? "
+                "ORDER BY processed_at DESC LIMIT 1",
+                (inbox_path.lower(), key)
+            ).fetchone()
+        outcome = json.loads(row["outcome"]) if row else None
+        if outcome and (outcome["result"].get("inbox_action") or {}).get("status") == "done":
+            return outcome
+        return None
+
+    def record(self, inbox_path: str, rev: str, content_hash: str, key: str, kb_path: str, metadata: dict,
+               outcome: dict):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO processed "
+                "(inbox_path, rev, content_hash, request_key, kb_path, metadata, outcome, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (inbox_path.lower(), rev, content_hash, key, kb_path, json.dumps(metadata, default=str),
+                 json.dumps(outcome, default=str), datetime.now(timezone.utc).isoformat())
+            )
+            self._latest[inbox_path.lower()] = rev
+        log(f"🧾 Recorded {inbox_path}@{rev} → {kb_path}")
+
+    def is_processed(self, path_lower: str, rev: str) -> bool:
+        """
+        Whether this exact revision of an Inbox note has been processed. O(1) after the first call.
+        """
+        return self._latest.get(path_lower) == rev
+
+    def refresh(self):
+        """
+        Picks up rows written by other processes. Call once per listing, before is_processed().
+        """
+        with self._lock:
+            self._sync()
+
+
+ledger = ProcessingLedger()
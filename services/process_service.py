@@ -1,6 +1,12 @@
+import os
 from datetime import datetime
 from services import dropbox_client
-from utils.dropbox_utils import generate_yaml_front_matter, sanitize_filename
+from services.catalog import catalog_for, linked_files, mark_stale
+from services.dropbox_gate import DropboxUnavailable
+from services.ledger import ledger, request_key
+from utils.config_utils import DEFAULT_CONFIG, load_config
+from utils.deadline_utils import DeadlineExceeded
+from utils.dropbox_utils import ARCHIVE_FOLDER, generate_yaml_front_matter, sanitize_filename, process_note_with_links
 from utils.logging_utils import log
 
 
@@ -52,3 +58,227 @@ def archive_note_with_yaml(original_md: str, filename: str, yaml_override: dict
         "dropbox_path": new_path,
         "upload": upload_result
     }
+
+
+def _shared_attachments(inbox_path: str, attachments: list) -> set:
+    """
+    Relative paths of `attachments` that another Inbox note also links to.
+    Links come from the link index the Inbox scan keeps up to date, so only notes that are new or
+    changed since the last scan are downloaded.
+    """
+    if not attachments:
+        return set()
+    others = [entry for entry in catalog_for(dropbox_client.INBOX_PATH).entries()
+              if entry["path_lower"] != inbox_path.lower()]
+    shared = set()
+    for references in linked_files(others).values():
+        for attachment in attachments:
+            relative = attachment["filename"]
+            if relative in references or os.path.basename(relative) in references:
+                shared.add(relative)
+    return shared
+
+
+def release_inbox_note(filename: str, copied_files: list, mode: str, subfolder: str) -> dict:
+    """
+    Takes a processed note out of the Inbox, together with the attachments only it links to,
+    so the Inbox listing and attachment lookups stay small.
+
+    With mode "archive" the files are moved to Inbox/_processed/{YYYY-MM}/ in one move_batch_v2
+    call, keeping their relative paths; with "delete" they are removed in one delete_batch call.
+    Attachments another Inbox note still links to are left in place.
+
+    Returns:
+        dict: {"mode", "status": "done" | "failed", "note": archive path or None,
+               "attachments": [...], "kept_attachments": [...], "error": str | None}
+    """
+    inbox_path = f"{dropbox_client.INBOX_PATH}/{filename}"
+    archive_folder = f"{dropbox_client.INBOX_PATH}/{ARCHIVE_FOLDER}/{subfolder}"
+    action = {"mode": mode, "status": "failed", "note": None, "attachments": [], "kept_attachments": [],
+              "error": None}
+    try:
+        shared = _shared_attachments(inbox_path, copied_files)
+        owned = [f for f in copied_files if f["filename"] not in shared]
+        action["kept_attachments"] = sorted(shared)
+
+        if mode == "archive":
+            moves = [(inbox_path, f"{archive_folder}/{filename}")] + \
+                    [(f["source"], f"{archive_folder}/{f['filename']}") for f in owned]
+            results = dropbox_client.move_batch(moves)
+            paths = [r["from_path"] for r in results]
+        else:
+            results = dropbox_client.delete_batch([inbox_path] + [f["source"] for f in owned])
+            paths = [r["path"] for r in results]
+        for path in paths:
+            mark_stale(path)
+
+        note, attachments = results[0], results[1:]
+        action["attachments"] = [f["filename"] for f, r in zip(owned, attachments) if r["success"]]
+        if note["success"]:
+            action["status"] = "done"
+            action["note"] = note.get("to_path")
+        failures = [r["error"] for r in results if not r["success"]]
+        action["error"] = "; ".join(failures) or None
+    except (DropboxUnavailable, DeadlineExceeded):
+        # Deciding which attachments to keep was cut short: answered with 503/504, and a repeat
+        # of the request finishes the release from the ledger
+        raise
+    except Exception as e:
+        # The note is already in the KB; it simply stays in the Inbox
+        action["error"] = str(e)
+
+    if action["status"] == "done":
+        log(f"🗄️ {'Archived' if mode == 'archive' else 'Deleted'} {filename} and "
+            f"{len(action['attachments'])} attachments from the Inbox")
+    else:
+        log(f"⚠️ Could not {mode} {filename}: {action['error']}", level="warning")
+    return action
+
+
+def process_inbox_note(filename: str, metadata: dict, copy_linked_files: bool = True, progress=None,
+                       inbox_mode: str = None) -> dict:
+    """
+    Processes a raw Inbox note into the Knowledge Base: downloads it, copies its linked files,
+    prepends YAML front matter and uploads it to NotesKB/{YYYY-MM}/.
+
+    Parameters:
+        filename (str): Inbox filename (e.g., 2025-07-03_meeting-ideas.md)
+        metadata (dict): Validated metadata; must contain "title" and "date" (YYYY-MM-DD)
+        copy_linked_files (bool): Whether to copy linked files from Inbox to KB
+        progress (callable): Optional progress(**fields) callback, called as each stage completes
+        inbox_mode (str): "keep", "archive" or "delete" the note once processed (see release_inbox_note);
+            defaults to the admin config's inbox_mode
+
+    Returns:
+        dict: {"status": "success" | "partial", "result": {...}, "metadata_applied": {...}, "deduplicated": bool}
+
+    Raises:
+        DropboxFileNotFound: if the note does not exist in the Inbox
+
+    A repeat of a request that already succeeded for the same revision (or identical content)
+    of the note is answered from the processing ledger without downloading or uploading anything,
+    also after the note was archived or deleted from the Inbox.
+    """
+    report = progress or (lambda **fields: None)
+    mode = inbox_mode or load_config().get("inbox_mode", DEFAULT_CONFIG["inbox_mode"])
+
+    # Same note revision, same request: answer from the ledger
+    inbox_path = f"{dropbox_client.INBOX_PATH}/{filename}"
+    key = request_key(metadata, copy_linked_files)
+    source = dropbox_client.get_metadata(inbox_path)
+    if source is None:
+        previous = ledger.lookup_released(inbox_path, key)
+        if not previous:
+            raise dropbox_client.DropboxFileNotFound(filename)
+        log(f"🧾 {filename} already processed and released → {previous['result']['kb_path']}")
+        report(stage="uploaded", deduplicated=True)
+        return {**previous, "deduplicated": True}
+    subfolder = datetime.strptime(metadata["date"], "%Y-%m-%d").strftime("%Y-%m")
+    previous = ledger.lookup(inbox_path, source.get("rev"), source.get("content_hash"), key)
+    if previous:
+        log(f"🧾 {filename}@{source.get('rev')} already processed → {previous['result']['kb_path']}")
+        # The note is still here: finish a release that was skipped or failed last time
+        if mode != "keep":
+            previous["result"]["inbox_action"] = release_inbox_note(
+                filename, previous["result"]["copied_files"], mode, subfolder)
+            ledger.record(inbox_path, source.get("rev"), source.get("content_hash"), key,
+                          previous["result"]["kb_path"], metadata, previous)
+        report(stage="uploaded", deduplicated=True)
+        return {**previous, "deduplicated": True}
+    requested_metadata = dict(metadata)
+
+    # Load original note content
+    report(stage="downloading")
+    original_content, served_rev = dropbox_client.download_file_with_rev(inbox_path, source.get("rev"))
+    if not original_content:
+        raise dropbox_client.DropboxFileNotFound(filename)
+    if served_rev != source.get("rev"):
+        # Edited since the lookup: the ledger records the revision processed, whose hash is not known
+        log(f"🔄 {filename} changed to {served_rev} after it was looked up", level="warning")
+        source = {"rev": served_rev, "content_hash": None}
+    report(stage="copying", downloaded=True)
+
+    # Set default metadata values
+    metadata.setdefault("author", "user")
+    metadata.setdefault("source", "inbox")
+    metadata.setdefault("type", "note")
+    metadata.setdefault("status", "processed")
+    metadata.setdefault("language", "en")
+    metadata.setdefault("uid", f"{sanitize_filename(metadata['title'])}-{metadata['date']}")
+
+    # Compute target paths
+    new_filename = f"{metadata['date']}_{sanitize_filename(metadata['title'])}.md"
+    kb_folder_path = f"/Apps/SaveNotesGPT/NotesKB/{subfolder}"
+    kb_file_path = f"{kb_folder_path}/{new_filename}"
+
+    # Process note with link handling (preserves folder structure)
+    processing_result = process_note_with_links(
+        content=original_content,
+        metadata=metadata,
+        kb_folder_path=kb_folder_path,
+        copy_links=copy_linked_files,
+        on_copy=lambda copied, total: report(attachments_copied=copied, attachments_total=total)
+    )
+
+    # Extract results
+    processed_content = processing_result["processed_content"]  # Unchanged content
+    detected_links = processing_result["detected_links"]
+    copy_result = processing_result["copy_result"]
+    final_metadata = processing_result["metadata"]
+
+    # Generate final structured content with YAML frontmatter
+    yaml_block = generate_yaml_front_matter(final_metadata)
+    structured_content = f"{yaml_block}\n\n{processed_content.strip()}"
+
+    # Upload processed note to Knowledge Base
+    report(stage="uploading")
+    upload_success = dropbox_client.upload_structured_note(kb_file_path, structured_content)
+    mark_stale(kb_file_path)
+    report(stage="uploaded", uploaded=upload_success)
+
+    # Calculate totals
+    total_links_detected = sum(len(links) for links in detected_links.values())
+
+    # Log comprehensive result
+    if copy_result["total_copied"] > 0:
+        log(f"📦 Processed note with links: {filename} → {kb_file_path} "
+            f"(detected {total_links_detected}, copied {copy_result['total_copied']} files)")
+    else:
+        log(f"📦 Processed note: {filename} → {kb_file_path} "
+            f"(detected {total_links_detected} links, none copied)")
+
+    # Attachment copies cut short by the request deadline make this a partial result
+    skipped_files = copy_result.get("skipped_files", [])
+    if skipped_files:
+        log(f"⏱️ Deadline reached while processing {filename}: {len(skipped_files)} linked files not copied",
+            level="warning")
+
+    outcome = {
+        "status": "partial" if skipped_files else "success",
+        "result": {
+            "source_note": filename,
+            "kb_path": kb_file_path,
+            "linked_files_detected": total_links_detected,
+            "linked_files_copied": copy_result["total_copied"],
+            "upload_success": upload_success,
+            "copied_files": copy_result["copied_files"],
+            "failed_files": copy_result["failed_files"],
+            "skipped_files": skipped_files,
+            "inbox_action": {"mode": "keep"}
+        },
+        "metadata_applied": final_metadata
+    }
+
+    # Only complete runs are replayed; partial or failed uploads are redone next time
+    if outcome["status"] == "success" and upload_success:
+        ledger.record(inbox_path, source.get("rev"), source.get("content_hash"), key, kb_file_path,
+                      requested_metadata, outcome)
+
+        # Recorded first, so a crash here leaves a note that is known to be processed
+        if mode != "keep":
+            report(stage="releasing")
+            outcome["result"]["inbox_action"] = release_inbox_note(filename, copy_result["copied_files"], mode,
+                                                                   subfolder)
+            ledger.record(inbox_path, source.get("rev"), source.get("content_hash"), key, kb_file_path,
+                          requested_metadata, outcome)
+    return {**outcome, "deduplicated": False}
@@ -0,0 +1,191 @@
+import os
+import time
+import fcntl
+import random
+import threading
+from datetime import datetime, timezone
+from services.catalog import catalog_for, index_links, invalidate, prefetch_frontmatter, save_snapshot, warm_recent
+from services.dropbox_gate import BACKGROUND, BULK, priority
+from utils.config_utils import (
+    BASE_DIR, DEFAULT_CONFIG, ensure_data_dir, load_config, update_config, update_scheduler_status
+)
+from utils.logging_utils import log
+
+SCHEDULER_LOCK = os.path.join(BASE_DIR, "scheduler.lock")
+
+# How often a worker that is not running the scheduler checks whether it should take over
+LEADER_RETRY_SECONDS = 60
+
+
+def _setting(name: str):
+    return load_config().get(name, DEFAULT_CONFIG[name])
+
+
+class Scheduler:
+    """
+    Runs periodic maintenance tasks in a background thread.
+
+    Only one process per host runs them: the scheduler takes a non-blocking exclusive lock
+    on data/scheduler.lock and keeps it for the life of the process, while the other gunicorn
+    workers stay idle and retry in case the holder dies. Intervals and jitter are read from
+    the admin config before every run, so changes apply without a restart. The outcome and
+    timing of each run are written to data/scheduler_status.json for the admin dashboard.
+    """
+
+    def __init__(self, lock_path: str = SCHEDULER_LOCK):
+        self.lock_path = lock_path
+        self._tasks = {}
+        self._next_run = {}
+        self._due_now = set()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock_file = None
+        self._thread = None
+
+    def add(self, name: str, fn, interval_setting: str):
+        """
+        Registers `fn()` to run every `interval_setting` seconds (a key of the admin config).
+        `fn` may return a dict of details to record with the run.
+        """
+        self._tasks[name] = (fn, interval_setting)
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops scheduling runs and releases the lock so another worker can take over.
+        A run in progress is not interrupted.
+        """
+        self._stopping.set()
+        self._wake.set()
+        if self._lock_file:
+            lock_file, self._lock_file = self._lock_file, None
+            lock_file.close()
+
+    def trigger(self, name: str) -> bool:
+        """
+        Runs a task as soon as possible. In the scheduler process this wakes the background
+        thread and returns True; elsewhere the task runs in the calling thread and returns False.
+        """
+        if self.is_leader:
+            self._due_now.add(name)
+            self._wake.set()
+            return True
+        self._run(name)
+        return False
+
+    def _acquire_leadership(self) -> bool:
+        ensure_data_dir()
+        lock_file = open(self.lock_path, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    def _schedule(self, name: str, first: bool = False):
+        jitter = max(float(_setting("scheduler_jitter")), 0)
+        if first:
+            # Spread the first runs so a restart does not fire every task at once
+            delay = random.uniform(0, jitter)
+        else:
+            delay = max(float(_setting(self._tasks[name][1])) + random.uniform(-jitter, jitter), 1)
+        self._next_run[name] = time.monotonic() + delay
+        return delay
+
+    def _loop(self):
+        while not self._acquire_leadership():
+            if self._stopping.wait(LEADER_RETRY_SECONDS):
+                return
+        log(f"⏰ Scheduler running in process {os.getpid()}")
+
+        for name in self._tasks:
+            self._schedule(name, first=True)
+
+        while not self._stopping.is_set():
+            # Cleared before looking at what is due, so a trigger() arriving during the scan or a run
+            # leaves the event set and the next wait returns at once
+            self._wake.clear()
+            now = time.monotonic()
+            for name in list(self._tasks):
+                if self._stopping.is_set():
+                    break
+                if name in self._due_now or self._next_run[name] <= now:
+                    self._due_now.discard(name)
+                    self._run(name)
+                    self._schedule(name)
+            self._wake.wait(max(min(self._next_run.values()) - time.monotonic(), 0))
+
+    def _run(self, name: str):
+        fn = self._tasks[name][0]
+        started_at = datetime.now(timezone.utc).isoformat()
+        started = time.monotonic()
+        record = {"last_started": started_at}
+        try:
+            with priority(BACKGROUND):
+                record["details"] = fn() or {}
+            record["status"] = "ok"
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+            log(f"❌ Scheduled task {name} failed: {str(e)}", level="error")
+        record["duration_seconds"] = round(time.monotonic() - started, 3)
+
+        update_scheduler_status(name, record)
+        return record
+
+
+def scan_inbox() -> dict:
+    """
+    Refreshes the Inbox catalog and indexes front matter and links of new notes.
+    """
+    catalog = catalog_for(load_config().get("inbox_path"))
+    delta = catalog.refresh()
+    invalidate(delta)
+    entries = catalog.entries()
+    frontmatter_read = prefetch_frontmatter(entries, int(_setting("frontmatter_prefetch_limit")))
+    with priority(BULK):
+        links_read = index_links(entries)
+
+    update_config({"last_scan": datetime.now(timezone.utc).isoformat()})
+
+    notes = sum(1 for e in entries if e[".tag"] == "file" and e["name"].endswith(".md"))
+    log(f"📥 Inbox scan: {notes} notes ({len(delta['added'])} new or changed, {len(delta['removed'])} removed)")
+    return {"notes": notes, "changed": len(delta["added"]), "removed": len(delta["removed"]),
+            "frontmatter_read": frontmatter_read, "links_read": links_read}
+
+
+def refresh_kb() -> dict:
+    """
+    Refreshes the Knowledge Base catalog, indexes front matter of new notes and
+    warms the content cache with the most recently modified ones.
+    """
+    catalog = catalog_for(load_config().get("kb_path"), recursive=True)
+    delta = catalog.refresh()
+    invalidate(delta)
+    entries = catalog.entries()
+    frontmatter_read = prefetch_frontmatter(entries, int(_setting("frontmatter_prefetch_limit")))
+    warmed = warm_recent(entries, int(_setting("cache_warm_count")))
+
+    log(f"📚 KB refresh: {len(entries)} entries ({len(delta['added'])} new or changed, "
+        f"{len(delta['removed'])} removed, {warmed} cached)")
+    return {"entries": len(entries), "changed": len(delta["added"]), "removed": len(delta["removed"]),
+            "frontmatter_read": frontmatter_read, "warmed": warmed}
+
+
+scheduler = Scheduler()
+scheduler.add("inbox_scan", scan_inbox, "scan_interval")
+scheduler.add("kb_refresh", refresh_kb, "kb_refresh_interval")
+scheduler.add("cache_snapshot", save_snapshot, "snapshot_interval")
@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from utils.logging_utils import log
+
+# Where shared entries live: "memory" (this process only), "sqlite" (every worker on the host)
+# or "redis" (every worker on every instance)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join("data", "cache.db"))
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+
+# Size limits: total for the memory and sqlite backends (Redis is bounded by its maxmemory),
+# and per entry for all of them; larger values are not cached
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_MAX_ITEM_BYTES = int(os.getenv("CACHE_MAX_ITEM_BYTES", str(4 * 1024 * 1024)))
+
+# Seconds a Redis call may take before the cache is skipped for that call
+CACHE_TIMEOUT = float(os.getenv("CACHE_TIMEOUT", "0.5"))
+
+# Namespace for keys, so several deployments can share one Redis
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "save-note:")
+
+# Key of the Dropbox access token in local_cache
+ACCESS_TOKEN_KEY = "dropbox:access_token"
+
+# Seconds between repeated warnings while the backend keeps failing
+ERROR_LOG_INTERVAL = 60
+
+
+class CacheBackend:
+    """
+    Key/value cache with per-entry TTLs. Values are anything JSON can encode.
+
+    Backend failures never reach callers: a failed get is a miss and a failed set is dropped,
+    so a Redis outage costs Dropbox calls, not requests.
+    """
+
+    name = "memory"
+    # Whether other worker processes see the entries
+    shared = False
+
+    def __init__(self):
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._last_error_log = 0
+
+    def get(self, key: str):
+        raw = None
+        try:
+            raw = self._get(CACHE_PREFIX + key)
+            if raw is None:
+                self._count("misses")
+                return None
+            value = json.loads(zlib.decompress(raw))
+        except Exception as e:
+            self._failed("get", e)
+            if raw is not None:
+                # Undecodable (truncated, or written by another version): drop it so the next get is a plain miss
+                self.delete(key)
+            return None
+        self._count("hits")
+        return value
+
+    def set(self, key: str, value, ttl: float = None) -> bool:
+        """
+        Stores `value`; returns False if it was too large to cache or the backend failed.
+        """
+        raw = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 1)
+        if len(raw) > CACHE_MAX_ITEM_BYTES:
+            return False
+        try:
+            self._set(CACHE_PREFIX + key, raw, ttl)
+            self._count("sets")
+        except Exception as e:
+            self._failed("set", e)
+            return False
+        return True
+
+    def delete(self, key: str):
+        try:
+            self._delete(CACHE_PREFIX + key)
+        except Exception as e:
+            self._failed("delete", e)
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def _failed(self, operation: str, error: Exception):
+        now = time.monotonic()
+        with self._stats_lock:
+            self.stats["errors"] += 1
+            if now - self._last_error_log <= ERROR_LOG_INTERVAL:
+                return
+            self._last_error_log = now
+        log(f"⚠️ Cache {operation} on {self.name} failed: {str(error)}", level="warning")
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            return {"backend": self.name, **self.stats}
+
+
+class MemoryCache(CacheBackend):
+    """
+    LRU cache in this process, bounded by the total size of the encoded values.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[1] is not None and item[1] < time.monotonic():
+                self._pop(key)
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def _set(self, key: str, raw: bytes, ttl: float):
+        with self._lock:
+            self._pop(key)
+            self._items[key] = (raw, None if ttl is None else time.monotonic() + ttl)
+            self._size += len(raw)
+            while self._size > self.max_bytes:
+                self._pop(next(iter(self._items)))
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key: str):
+        item = self._items.pop(key, None)
+        if item:
+            self._size -= len(item[0])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**super().snapshot(), "entries": len(self._items), "bytes": self._size}
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache in a SQLite file shared by the worker processes of one host.
+    When the total size passes max_bytes, the least recently used entries are evicted.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    # Reads refresh an entry's last-used time at most this often, to keep reads from writing
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread (and process: connections do not survive fork); SQLite serialises the writers
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL,
+                    used REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (used)")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _get(self, key: str):
+        db = self._connect()
+        row = db.execute("SELECT value, expires, used FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, used = row
+        now = time.time()
+        if expires is not None and expires < now:
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        if now - used > self.TOUCH_INTERVAL:
+            db.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+        return value
+
+    def _set(self, key: str, raw: bytes, ttl: float):
+        db = self._connect()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("INSERT OR REPLACE INTO cache (key, value, size, expires, used) VALUES (?, ?, ?, ?, ?)",
+                       (key, raw, len(raw), None if ttl is None else now + ttl, now))
+            db.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?", (now,))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                # Oldest first, until the rest fits
+                evict, freed = [], 0
+                for old_key, size in db.execute("SELECT key, size FROM cache ORDER BY used"):
+                    if total - freed <= self.max_bytes:
+                        break
+                    evict.append((old_key,))
+                    freed += size
+                db.executemany("DELETE FROM cache WHERE key = ?", evict)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _delete(self, key: str):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def snapshot(self) -> dict:
+        try:
+            entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        except Exception:
+            entries, size = None, None
+        return {**super().snapshot(), "entries": entries, "bytes": size}
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache in Redis (or anything speaking its protocol), shared by every worker and instance.
+    Needs the `redis` package; TTLs are handed to Redis, size is bounded by its maxmemory policy.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str = CACHE_URL):
+        super().__init__()
+        import redis
+        self.url = url
+        self._client = redis.Redis.from_url(url, socket_timeout=CACHE_TIMEOUT, socket_connect_timeout=CACHE_TIMEOUT)
+
+    def _get(self, key: str):
+        return self._client.get(key)
+
+    def _set(self, key: str, raw: bytes, ttl: float):
+        self._client.set(key, raw, px=None if ttl is None else max(int(ttl * 1000), 1))
+
+    def _delete(self, key: str):
+        self._client.delete(key)
+
+
+def make_cache(backend: str = CACHE_BACKEND) -> CacheBackend:
+    if backend == "redis":
+        try:
+            return RedisCache()
+        except ImportError:
+            log("⚠️ CACHE_BACKEND=redis needs the redis package (pip install redis==5.0.8), using memory",
+                level="warning")
+            return MemoryCache()
+    if backend == "sqlite":
+        return SQLiteCache()
+    if backend != "memory":
+        log(f"⚠️ Unknown CACHE_BACKEND {backend!r}, using memory", level="warning")
+    return MemoryCache()
+
+
+# The cache for Dropbox listings and note bodies (see CACHE_BACKEND)
+shared_cache = make_cache()
+
+# Secrets such as the Dropbox access token stay in this process, never in a shared backend
+local_cache = MemoryCache(max_bytes=64 * 1024)
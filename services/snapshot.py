@@ -0,0 +1,118 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import tempfile
+from datetime import date, datetime
+
+# File layout: magic, length of the header, zlib-compressed JSON header, then the cached note
+# bodies back to back. The header indexes each body by (path_lower, rev, offset, length), so
+# bodies are read from the memory-mapped file only when they are asked for.
+MAGIC = b"SNCSNAP1"
+_HEADER = struct.Struct(">8sI")
+
+
+def _encode(value):
+    # YAML front matter holds dates; tagged so they come back as dates rather than strings
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    return str(value)
+
+
+def _decode(obj: dict):
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return datetime.fromisoformat(obj["$datetime"])
+        if "$date" in obj:
+            return date.fromisoformat(obj["$date"])
+    return obj
+
+
+def write_snapshot(path: str, state: dict, bodies: list):
+    """
+    Writes `state` (JSON-encodable, dates allowed) and `bodies` [(path_lower, rev, text), ...]
+    to `path`, replacing any previous snapshot atomically. Returns the file size.
+    """
+    index, blobs, offset = [], [], 0
+    for key, rev, text in bodies:
+        data = text.encode("utf-8")
+        index.append([key, rev, offset, len(data)])
+        blobs.append(data)
+        offset += len(data)
+    header = zlib.compress(json.dumps({**state, "content": index}, default=_encode,
+                                      separators=(",", ":")).encode("utf-8"), 6)
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            for data in blobs:
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return _HEADER.size + len(header) + offset
+
+
+class Snapshot:
+    """
+    A snapshot file opened for reading. `state` is the decoded header; note bodies stay in the
+    memory-mapped file until body() asks for one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, header_length = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a cache snapshot")
+            header_end = _HEADER.size + header_length
+            self.state = json.loads(zlib.decompress(self._map[_HEADER.size:header_end]), object_hook=_decode)
+            self._bodies = {key: (rev, header_end + offset, length)
+                            for key, rev, offset, length in self.state.pop("content")}
+        except BaseException:
+            self._map.close()
+            raise
+
+    def body(self, key: str, rev: str):
+        """
+        The saved body of `key` if it was saved at `rev`, else None (also once closed).
+        """
+        item = self._bodies.get(key)
+        if item is None or item[0] != rev:
+            return None
+        _, start, length = item
+        try:
+            return self._map[start:start + length].decode("utf-8")
+        except ValueError:
+            # Closed by another thread meanwhile
+            return None
+
+    def close(self):
+        """
+        Unmaps the file, which also releases its descriptor (and its disk space once it was replaced).
+        """
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._bodies)
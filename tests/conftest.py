@@ -0,0 +1,87 @@
+"""
+Shared fixtures. The Dropbox stand-in (scripts/mock_dropbox_server.py) runs in this process,
+and the environment is pointed at it before any app module is imported, since they read
+their settings at import time.
+"""
+import os
+import threading
+import importlib.util
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script(name: str):
+    """
+    Imports scripts/<name>.py, which is not a package.
+    """
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, "scripts", f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+mock_dropbox = load_script("mock_dropbox_server")
+
+_store = mock_dropbox.Store()
+_faults = mock_dropbox.Faults(0, 0)
+_server = ThreadingHTTPServer(("127.0.0.1", 0), mock_dropbox.make_handler(_store, _faults, 2, 0.0))
+threading.Thread(target=_server.serve_forever, name="dropbox-standin", daemon=True).start()
+STANDIN_URL = f"http://127.0.0.1:{_server.server_port}"
+
+os.environ.update({
+    "GPT_TOKEN": "sk-GPT-TEST",
+    "ADMIN_USERNAME": "admin",
+    "ADMIN_PASSWORD": "test",
+    "FLASK_SECRET_KEY": "test",
+    "DROPBOX_APP_KEY": "standin",
+    "DROPBOX_APP_SECRET": "standin",
+    "DROPBOX_REFRESH_TOKEN": "standin",
+    "DROPBOX_API_BASE": STANDIN_URL,
+    "DROPBOX_CONTENT_BASE": STANDIN_URL,
+    "DROPBOX_NOTIFY_BASE": STANDIN_URL,
+    "DROPBOX_RETRY_BASE_DELAY": "0.01",
+    "SCHEDULER_ENABLED": "0",
+})
+os.environ.pop("MOCK_MODE", None)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def scratch_dir(tmp_path_factory):
+    """
+    Runs the tests in a scratch directory, so the data/ files the app writes stay out of the repo.
+    """
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("workdir"))
+    yield
+    # Write queued state (the dashboard log) here, not from atexit after the cwd is back in the repo
+    from utils.state_store import flush_all
+    flush_all()
+    os.chdir(previous)
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    """
+    The Dropbox stand-in with its seed files and no faults, plus a fresh gate so failures
+    from earlier tests cannot leave the circuit open.
+    """
+    from services import dropbox_http
+    from services.dropbox_gate import DropboxGate
+    _store.__init__()
+    _faults.__init__(0, 0)
+    monkeypatch.setattr(dropbox_http, "dropbox_gate", DropboxGate())
+    return SimpleNamespace(url=STANDIN_URL, store=_store, faults=_faults)
+
+
+@pytest.fixture
+def client(standin, monkeypatch):
+    """
+    A Flask test client on the app, with no catalogs listed yet.
+    """
+    from app import app
+    from services import catalog
+    monkeypatch.setattr(catalog, "_catalogs", {})
+    return app.test_client()
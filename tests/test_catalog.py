@@ -0,0 +1,149 @@
+import pytest
+from services import catalog, shared_cache as shared_cache_module
+from services.catalog import FolderCatalog
+from services.shared_cache import MemoryCache
+
+INBOX = "/Apps/SaveNotesGPT/Inbox"
+NOTE = "2025-07-03_test-note.md"
+
+
+def test_readers_see_the_whole_listing_while_a_relist_is_applied(standin, monkeypatch):
+    inbox = FolderCatalog(INBOX)
+    inbox.refresh()
+    before = {entry["path_lower"] for entry in inbox.entries()}
+    seen = []
+    apply = FolderCatalog._apply
+
+    def apply_and_look(self, changes, removed_entries=None, listing=None):
+        delta = apply(self, changes, removed_entries, listing)
+        # What a request thread reading without the lock sees halfway through the refresh
+        seen.append(({entry["path_lower"] for entry in self._entries.values()}, self.find(NOTE)))
+        return delta
+
+    monkeypatch.setattr(FolderCatalog, "_apply", apply_and_look)
+    inbox._cursor = None
+    inbox.mark_stale()
+    inbox.refresh()
+
+    assert seen and all(paths == before and found is not None for paths, found in seen)
+    assert {entry["path_lower"] for entry in inbox.entries()} == before
+    assert inbox.find(NOTE)["name"] == NOTE
+
+
+def test_find_follows_renames_and_deletes(standin):
+    inbox = FolderCatalog(INBOX)
+    inbox.refresh()
+    standin.store.move(f"{INBOX}/{NOTE}", f"{INBOX}/renamed.md")
+    inbox.mark_stale()
+    inbox.refresh()
+    assert inbox.find(NOTE) is None
+    assert inbox.find("RENAMED.md")["path_display"] == f"{INBOX}/renamed.md"
+
+
+def test_folder_stats_pick_up_changes_made_elsewhere_once_stale(standin):
+    kb = FolderCatalog("/Apps/SaveNotesGPT/NotesKB", recursive=True)
+    assert {stats["name"] for stats in kb.folder_stats()} == {"2025-07"}
+    standin.store.put("/Apps/SaveNotesGPT/NotesKB/2025-08/2025-08-01_elsewhere.md", b"# Written elsewhere\n")
+    assert {stats["name"] for stats in kb.folder_stats()} == {"2025-07"}
+    assert {stats["name"] for stats in kb.folder_stats(max_age=0)} == {"2025-07", "2025-08"}
+
+
+def test_deleting_a_folder_takes_its_contents_and_deleting_a_file_only_the_file(standin):
+    kb = FolderCatalog("/Apps/SaveNotesGPT/NotesKB", recursive=True)
+    kb.refresh()
+    standin.store.put("/Apps/SaveNotesGPT/NotesKB/2025-07/2025-07-02_second.md", b"# Second\n")
+    kb.mark_stale()
+    kb.refresh()
+
+    delta = kb._apply([{".tag": "deleted", "name": "2025-07-02_second.md",
+                        "path_lower": "/apps/savenotesgpt/noteskb/2025-07/2025-07-02_second.md"}])
+    assert delta["removed"] == ["/apps/savenotesgpt/noteskb/2025-07/2025-07-02_second.md"]
+    assert kb.find("2025-07-01_existing-note.md") is not None
+
+    delta = kb._apply([{".tag": "deleted", "name": "2025-07", "path_lower": "/apps/savenotesgpt/noteskb/2025-07"}])
+    assert "/apps/savenotesgpt/noteskb/2025-07/2025-07-01_existing-note.md" in delta["removed"]
+    assert kb.find("2025-07-01_existing-note.md") is None
+    assert kb.stats.snapshot() == []
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    """
+    A cache backend the catalogs treat as shared between workers.
+    """
+    cache = MemoryCache()
+    cache.shared = True
+    monkeypatch.setattr(catalog, "shared_cache", cache)
+    return cache
+
+
+def test_later_changes_are_shared_without_the_listing(standin, shared):
+    first = FolderCatalog(INBOX)
+    first.refresh()
+    listing = shared.get(first._shared_key)
+    standin.store.put(f"{INBOX}/added-elsewhere.md", b"# Added\n")
+    first.mark_stale()
+    first.refresh()
+
+    assert shared.get(first._shared_key) == listing
+    changes = shared.get(first._shared_key + ":changes")
+    assert changes["base"] == listing["cursor"] and changes["cursor"] == first._cursor
+    assert [change["name"] for change in changes["changes"]] == ["added-elsewhere.md"]
+
+    second = FolderCatalog(INBOX)
+    second.refresh()
+    assert second._cursor == first._cursor and second.find("added-elsewhere.md") is not None
+    assert {entry["path_lower"] for entry in second.entries()} == {entry["path_lower"] for entry in first.entries()}
+
+
+def test_a_listing_too_large_to_share_is_skipped(standin, shared, monkeypatch):
+    monkeypatch.setattr(shared_cache_module, "CACHE_MAX_ITEM_BYTES", 10)
+    inbox = FolderCatalog(INBOX)
+    inbox.refresh()
+    assert shared.get(inbox._shared_key) is None
+    assert inbox.find(NOTE) is not None
+
+
+@pytest.fixture
+def ranges(monkeypatch):
+    """
+    Small read-ahead chunks, and the Range headers _read_head sends.
+    """
+    monkeypatch.setattr(catalog, "FRONTMATTER_CHUNK_BYTES", 16)
+    monkeypatch.setattr(catalog, "FRONTMATTER_MAX_BYTES", 256)
+    sent = []
+    open_download_stream = catalog.open_download_stream
+
+    def recorded(path, byte_range=None):
+        sent.append(byte_range)
+        return open_download_stream(path, byte_range)
+
+    monkeypatch.setattr(catalog, "open_download_stream", recorded)
+    return sent
+
+
+def test_front_matter_is_read_with_doubling_ranges(standin, ranges):
+    frontmatter = "---\ntitle: A note with a longer front matter block\ntags: [a, b]\n---\n"
+    standin.store.put(f"{INBOX}/long.md", (frontmatter + "body " * 200).encode("utf-8"))
+    head = catalog._read_head(f"{INBOX}/long.md")
+    assert ranges == ["bytes=0-15", "bytes=16-31", "bytes=32-63", "bytes=64-127"]
+    assert head.startswith(frontmatter) and len(head) == 128
+
+
+def test_front_matter_reads_stop_at_the_cap_or_without_front_matter(standin, ranges):
+    standin.store.put(f"{INBOX}/endless.md", b"---\n" + b"tag: x\n" * 100)
+    assert len(catalog._read_head(f"{INBOX}/endless.md")) == 256
+    assert ranges[-1] == "bytes=128-255"
+
+    ranges.clear()
+    standin.store.put(f"{INBOX}/plain.md", b"# Plain\n" + b"text " * 100)
+    assert catalog._read_head(f"{INBOX}/plain.md") == "# Plain\ntext tex"
+    assert ranges == ["bytes=0-15"]
+
+
+def test_a_server_ignoring_ranges_gives_the_whole_note(standin, ranges, monkeypatch):
+    open_download_stream = catalog.open_download_stream
+    monkeypatch.setattr(catalog, "open_download_stream", lambda path, byte_range=None: open_download_stream(path))
+    body = "---\ntitle: Whole\n---\n" + "body " * 50
+    standin.store.put(f"{INBOX}/whole.md", body.encode("utf-8"))
+    assert catalog._read_head(f"{INBOX}/whole.md") == body
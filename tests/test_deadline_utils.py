@@ -0,0 +1,63 @@
+import time
+import pytest
+from services import dropbox_executor, process_service
+from services.dropbox_http import dropbox_post
+from utils import deadline_utils
+from utils.deadline_utils import (CONNECT_TIMEOUT, READ_TIMEOUT, DeadlineExceeded, bounded, call_timeout,
+                                  check_deadline, remaining, with_deadline)
+
+AUTH = {"Authorization": "Bearer sk-GPT-TEST"}
+
+
+def test_calls_are_bounded_by_what_is_left_of_the_request():
+    @with_deadline("test", default=1)
+    def handler():
+        connect, read = call_timeout()
+        assert 0.9 < read <= 1 and connect == min(CONNECT_TIMEOUT, read)
+        assert bounded(30) == pytest.approx(read, abs=0.05)
+        return remaining()
+
+    assert 0.9 < handler() <= 1
+    # Outside a request there is no budget, only the default per-call timeouts
+    assert remaining() is None
+    assert call_timeout() == (CONNECT_TIMEOUT, READ_TIMEOUT)
+    assert bounded(30) == 30
+
+
+def test_a_spent_budget_raises_before_calling_out():
+    @with_deadline("test", default=0.05)
+    def handler():
+        time.sleep(0.06)
+        with pytest.raises(DeadlineExceeded):
+            check_deadline()
+        with pytest.raises(DeadlineExceeded):
+            call_timeout()
+        assert bounded(30) == 0
+
+    handler()
+
+
+def test_the_deadline_follows_work_on_the_dropbox_pool():
+    @with_deadline("test", default=1)
+    def handler():
+        return dropbox_executor.fan_out(lambda _: remaining(), range(4))
+
+    assert all(left is not None and 0 < left <= 1 for left in handler())
+
+
+def test_running_out_of_time_answers_504(client, standin, monkeypatch):
+    seen = {}
+
+    def out_of_time(*args, **kwargs):
+        seen["remaining"] = remaining()
+        # The route's budget is gone: the next Dropbox call is not even attempted
+        deadline_utils._deadline.set(time.monotonic())
+        dropbox_post(f"{standin.url}/2/files/get_metadata", idempotent=True, data="{}")
+
+    monkeypatch.setattr(process_service, "process_inbox_note", out_of_time)
+    response = client.patch("/api/inbox/notes/2025-07-03_test-note.md", headers=AUTH, json={
+        "action": "process", "metadata": {"title": "Test note", "date": "2025-07-03"}})
+    assert response.status_code == 504
+    assert response.get_json() == {"status": "error", "message": "Request deadline exceeded"}
+    assert 0 < seen["remaining"] <= 40
+    assert not standin.faults.seen
@@ -0,0 +1,43 @@
+from services import dropbox_client
+from services.dropbox_client import get_metadata, upload_structured_note
+from utils.content_hash import content_hash
+
+KB_NOTE = "/Apps/SaveNotesGPT/NotesKB/2025-07/2025-07-01_existing-note.md"
+
+
+def uploads(standin) -> int:
+    return sum(count for (endpoint, _), count in standin.faults.seen.items() if endpoint == "/2/files/upload")
+
+
+def test_local_hashes_match_the_ones_dropbox_lists(standin):
+    body = standin.store.get(KB_NOTE)["_data"]
+    assert content_hash(body) == get_metadata(KB_NOTE)["content_hash"]
+    # Past one 4 MB block, where the hash of hashes differs from a plain SHA-256
+    assert content_hash(b"x" * (5 * 1024 * 1024)) == standin.store.put("/big.bin", b"x" * (5 * 1024 * 1024))["content_hash"]
+
+
+def test_identical_content_is_not_uploaded_again(standin):
+    content = standin.store.get(KB_NOTE)["_data"].decode("utf-8")
+    rev = get_metadata(KB_NOTE)["rev"]
+    assert upload_structured_note(KB_NOTE, content)
+    assert uploads(standin) == 0
+    assert standin.store.get(KB_NOTE)["rev"] == rev
+
+
+def test_changed_content_is_uploaded(standin):
+    rev = get_metadata(KB_NOTE)["rev"]
+    assert upload_structured_note(KB_NOTE, "---\ntitle: Existing note\n---\n\nRewritten.\n")
+    assert uploads(standin) == 1
+    assert standin.store.get(KB_NOTE)["rev"] != rev
+    assert standin.store.get(KB_NOTE)["_data"].endswith(b"Rewritten.\n")
+
+
+def test_a_stale_known_hash_is_checked_before_skipping(standin):
+    content = standin.store.get(KB_NOTE)["_data"].decode("utf-8")
+    get_metadata(KB_NOTE)
+    # Edited elsewhere since this process last saw it
+    standin.store.put(KB_NOTE, b"# Edited elsewhere\n")
+    assert dropbox_client._known_hashes.get(KB_NOTE.lower()) == content_hash(content.encode("utf-8"))
+    assert upload_structured_note(KB_NOTE, content)
+    assert uploads(standin) == 1
+    assert standin.store.get(KB_NOTE)["_data"].decode("utf-8") == content
@@ -0,0 +1,103 @@
+import time
+import threading
+import pytest
+from services.dropbox_gate import (ABORTED, BACKGROUND, BULK, FAILURE, INTERACTIVE, OK, RATE_LIMITED, AdaptiveLimiter,
+                                   CircuitBreaker, DropboxGate, DropboxUnavailable, priority)
+
+
+def wait_for(condition, timeout=5):
+    give_up_at = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < give_up_at
+        time.sleep(0.005)
+
+
+def test_waiting_classes_are_admitted_by_weighted_fair_queuing():
+    limiter = AdaptiveLimiter(initial=1, maximum=1)
+    assert limiter.acquire(0, INTERACTIVE)
+    order = []
+
+    def call(name):
+        assert limiter.acquire(5, name)
+        order.append(name)
+        limiter.release(0.01, ABORTED, name)
+
+    threads = []
+    for name in (BULK, BULK, BACKGROUND, INTERACTIVE, INTERACTIVE):
+        threads.append(threading.Thread(target=call, args=(name,)))
+        threads[-1].start()
+        wait_for(lambda: limiter.waiting == len(threads))
+    limiter.release(0.01, ABORTED, INTERACTIVE)
+    for thread in threads:
+        thread.join()
+    assert order == [INTERACTIVE, INTERACTIVE, BACKGROUND, BULK, BULK]
+
+
+def test_part_of_the_limit_is_held_back_for_interactive_calls():
+    limiter = AdaptiveLimiter(initial=4, maximum=4)
+    assert all(limiter.acquire(0, BULK) for _ in range(3))
+    assert not limiter.acquire(0, BACKGROUND)
+    assert limiter.acquire(0, INTERACTIVE)
+    assert not limiter.acquire(0, INTERACTIVE)
+
+
+def test_rate_limits_halve_the_limit_once_per_interval_and_successes_grow_it():
+    limiter = AdaptiveLimiter(initial=8, latency_target=2.0)
+    for outcome in (RATE_LIMITED, RATE_LIMITED):
+        assert limiter.acquire(0)
+        limiter.release(0.1, outcome)
+    assert limiter.limit == 4
+
+    assert limiter.acquire(0)
+    limiter.release(0.1, OK)
+    assert limiter.limit == 4.25
+
+    limiter._last_decrease = 0
+    assert limiter.acquire(0)
+    limiter.release(3.0, OK)
+    assert limiter.limit == pytest.approx(4.25 * 0.9)
+
+    assert limiter.acquire(0)
+    limiter.release(0.1, ABORTED)
+    assert limiter.limit == pytest.approx(4.25 * 0.9)
+
+
+def test_breaker_opens_probes_once_half_open_and_closes_on_success():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.05)
+    breaker.record(FAILURE)
+    breaker.record(ABORTED)
+    assert breaker.state == "closed"
+    breaker.record(FAILURE)
+    assert breaker.state == "open"
+    with pytest.raises(DropboxUnavailable):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(DropboxUnavailable):
+        breaker.before_call()
+    breaker.record(OK)
+    assert breaker.state == "closed" and breaker.consecutive_failures == 0
+    breaker.before_call()
+
+
+def test_a_failed_probe_opens_the_breaker_again():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.05)
+    breaker.record(RATE_LIMITED)
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record(FAILURE)
+    assert breaker.state == "open" and breaker.times_opened == 2
+
+
+def test_calls_that_raise_count_as_failures_and_open_the_gate():
+    gate = DropboxGate()
+    gate.breaker.threshold = 2
+    for _ in range(2):
+        with pytest.raises(ConnectionError), priority(BACKGROUND), gate.admit(1):
+            raise ConnectionError("reset by peer")
+    with pytest.raises(DropboxUnavailable), gate.admit(1):
+        pass
+    assert gate.counters["failures"] == 2 and gate.counters["rejected"] == 1
+    assert gate.limiter.in_flight == 0 and gate.limiter.classes[BACKGROUND]["in_flight"] == 0
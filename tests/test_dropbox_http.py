@@ -0,0 +1,157 @@
+import json
+import time
+import socket
+import threading
+import pytest
+import requests
+from services import dropbox_http
+from services.dropbox_gate import BULK, CONCURRENCY_INITIAL, priority
+from services.dropbox_http import coalesce, dropbox_post
+from utils import deadline_utils
+from utils.deadline_utils import DeadlineExceeded, with_deadline
+
+METADATA = "/2/files/get_metadata"
+UPLOAD = "/2/files/upload"
+NOTE = "/Apps/SaveNotesGPT/Inbox/2025-07-03_test-note.md"
+BODY = json.dumps({"path": NOTE})
+
+
+def get_metadata(standin, idempotent=True, **kwargs):
+    return dropbox_post(f"{standin.url}{METADATA}", idempotent=idempotent, data=BODY,
+                        headers={"Content-Type": "application/json"}, **kwargs)
+
+
+def attempts(standin, endpoint=METADATA, arg=BODY):
+    return standin.faults.seen.get((endpoint, arg), 0)
+
+
+def test_429_is_retried_after_retry_after(standin):
+    standin.faults.fail_first, standin.faults.retry_after = 1, 1
+    started = time.monotonic()
+    response = get_metadata(standin)
+    assert response.status_code == 200
+    assert response.json()["path_lower"] == NOTE.lower()
+    assert attempts(standin) == 2
+    assert time.monotonic() - started >= 1
+
+
+def test_503_is_retried_for_idempotent_calls(standin):
+    # The stand-in answers 429 then 503; skip straight to the 503
+    standin.faults.fail_first = 2
+    standin.faults.seen[(METADATA, BODY)] = 1
+    response = get_metadata(standin)
+    assert response.status_code == 200
+    assert attempts(standin) == 3
+
+
+def test_503_is_final_for_non_idempotent_calls(standin):
+    standin.faults.fail_first = 2
+    standin.faults.seen[(METADATA, BODY)] = 1
+    response = get_metadata(standin, idempotent=False)
+    assert response.status_code == 503
+    assert attempts(standin) == 2
+
+
+def test_too_many_write_operations_is_retried_for_writes(standin):
+    standin.faults.fail_first = 2
+    path = "/Apps/SaveNotesGPT/Inbox/written.md"
+    arg = json.dumps({"path": path, "mode": "add"})
+    response = dropbox_post(f"{standin.url}{UPLOAD}", idempotent=False, data=b"# Written\n",
+                            headers={"Dropbox-API-Arg": arg, "Content-Type": "application/octet-stream"})
+    assert response.status_code == 200
+    assert attempts(standin, UPLOAD, arg) == 3
+    assert standin.store.get(path)["_data"] == b"# Written\n"
+
+
+def test_gives_up_after_the_last_attempt(standin, monkeypatch):
+    monkeypatch.setattr(dropbox_http, "RETRY_MAX_ATTEMPTS", 3)
+    standin.faults.fail_first = 100
+    response = get_metadata(standin)
+    assert response.status_code in (429, 503)
+    assert attempts(standin) == 3
+
+
+def test_gives_up_when_the_next_wait_passes_the_deadline(standin):
+    standin.faults.fail_first, standin.faults.retry_after = 1, 5
+    started = time.monotonic()
+    response = get_metadata(standin, deadline=1)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+    assert attempts(standin) == 1
+    assert time.monotonic() - started < 1
+
+
+@pytest.fixture
+def silent_server():
+    """
+    A server that accepts connections and never answers, so every call times out.
+    """
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    accepted = []
+
+    def accept():
+        while True:
+            try:
+                accepted.append(listener.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield f"http://127.0.0.1:{listener.getsockname()[1]}"
+    listener.close()
+    for connection in accepted:
+        connection.close()
+
+
+def test_timeouts_cut_short_by_the_deadline_do_not_trip_the_breaker(standin, silent_server):
+    gate = dropbox_http.dropbox_gate
+
+    @with_deadline("test", default=0.2)
+    def short_request():
+        return dropbox_post(f"{silent_server}{METADATA}", idempotent=False, data=BODY)
+
+    for _ in range(gate.breaker.threshold + 2):
+        with pytest.raises((requests.Timeout, DeadlineExceeded)):
+            short_request()
+    snapshot = gate.snapshot()
+    assert snapshot["aborted"] == gate.breaker.threshold + 2
+    assert snapshot["failures"] == 0
+    assert snapshot["circuit_state"] == "closed"
+    assert snapshot["concurrency_limit"] == CONCURRENCY_INITIAL
+
+
+def test_full_length_timeouts_count_as_failures(standin, silent_server, monkeypatch):
+    monkeypatch.setattr(deadline_utils, "READ_TIMEOUT", 0.2)
+    monkeypatch.setattr(dropbox_http, "READ_TIMEOUT", 0.2)
+    with pytest.raises(requests.Timeout):
+        dropbox_post(f"{silent_server}{METADATA}", idempotent=False, data=BODY)
+    snapshot = dropbox_http.dropbox_gate.snapshot()
+    assert snapshot["failures"] == 1 and snapshot["aborted"] == 0
+    assert snapshot["consecutive_failures"] == 1
+
+
+def test_interactive_calls_do_not_join_a_bulk_call():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_bulk_read():
+        calls.append(BULK)
+        started.set()
+        release.wait(5)
+        return "bulk"
+
+    def bulk():
+        with priority(BULK):
+            coalesce("same-read", slow_bulk_read)
+
+    leader = threading.Thread(target=bulk)
+    leader.start()
+    started.wait(5)
+    try:
+        assert coalesce("same-read", lambda: calls.append("interactive") or "interactive") == "interactive"
+    finally:
+        release.set()
+        leader.join()
+    assert calls == [BULK, "interactive"]
@@ -0,0 +1,155 @@
+import sys
+import json
+import time
+import socket
+import threading
+import subprocess
+import pytest
+from services import job_queue as job_queue_module
+from services.job_queue import JobQueue, QueueFull
+
+AUTH = {"Authorization": "Bearer sk-GPT-TEST"}
+NOTE = "2025-07-03_test-note.md"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(path=str(tmp_path / "jobs.db"), workers=2)
+    queue.register("echo", lambda payload, progress: progress(step="done") or {"echo": payload["text"]})
+    queue.start()
+    yield queue
+    queue.stop(timeout=5)
+
+
+def wait_for(queue, job_id, timeout=5):
+    give_up = time.monotonic() + timeout
+    while time.monotonic() < give_up:
+        job = queue.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        queue.wait_for_update(0.1)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_jobs_run_and_report(queue):
+    job = wait_for(queue, queue.submit("echo", {"text": "hi"}))
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"echo": "hi"}
+    assert job["progress"] == {"step": "done"}
+
+
+def test_each_thread_reuses_one_connection(queue):
+    assert queue._connect() is queue._connect()
+    for _ in range(20):
+        queue.get(queue.submit("echo", {"text": "again"}))
+    assert queue._connect() is queue._connect()
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(queue._connect()))
+    thread.start()
+    thread.join()
+    assert other[0] is not queue._connect()
+
+
+def test_failed_transaction_is_rolled_back(queue):
+    with pytest.raises(RuntimeError):
+        with queue._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM jobs")
+            raise RuntimeError("interrupted")
+    assert not queue._connect().in_transaction
+
+
+def test_concurrent_submits_stay_within_the_queue_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue_module, "JOB_QUEUE_LIMIT", 5)
+    # Not started: every submitted job stays queued
+    idle = JobQueue(path=str(tmp_path / "jobs.db"))
+    idle._init_db()
+    start = threading.Barrier(20)
+    accepted, rejected = [], []
+
+    def submit():
+        start.wait()
+        try:
+            accepted.append(idle.submit("echo", {"text": "race"}))
+        except QueueFull:
+            rejected.append(True)
+
+    threads = [threading.Thread(target=submit) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(accepted) == 5 and len(rejected) == 15
+    assert idle._connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 5
+
+
+def test_running_jobs_of_dead_processes_are_requeued_on_start(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    previous = JobQueue(path=path)
+    previous._init_db()
+    orphaned = previous.submit("echo", {"text": "orphaned"})
+    elsewhere = previous.submit("echo", {"text": "other host"})
+    with previous._connect() as db:
+        db.execute("UPDATE jobs SET status = 'running', owner = ? WHERE id = ?",
+                   (f"{socket.gethostname()}:{dead.pid}", orphaned))
+        db.execute("UPDATE jobs SET status = 'running', owner = 'other-host:1' WHERE id = ?", (elsewhere,))
+
+    queue = JobQueue(path=path)
+    queue.register("echo", lambda payload, progress: {"echo": payload["text"]})
+    queue.start()
+    try:
+        job = wait_for(queue, orphaned)
+        assert job["status"] == "succeeded" and job["attempts"] == 1
+        assert queue.get(elsewhere)["status"] == "running"
+    finally:
+        queue.stop(timeout=5)
+
+
+@pytest.fixture
+def process_queue(tmp_path, monkeypatch):
+    """
+    A started queue behind the async processing and job routes.
+    """
+    from routes import jobs, process
+    queue = JobQueue(path=str(tmp_path / "jobs.db"))
+    queue.register("process_note", process._run_process_job)
+    monkeypatch.setattr(process, "job_queue", queue)
+    monkeypatch.setattr(jobs, "job_queue", queue)
+    queue.start()
+    yield queue
+    queue.stop(timeout=5)
+
+
+def queue_note(client):
+    response = client.patch(f"/api/inbox/notes/{NOTE}?async=1", headers=AUTH, json={
+        "action": "process", "metadata": {"title": "Test note", "date": "2025-07-03"}, "inbox_mode": "keep"})
+    assert response.status_code == 202
+    body = response.get_json()
+    assert response.headers["Location"] == body["status_url"]
+    return body
+
+
+def test_async_processing_answers_202_and_the_job_can_be_polled(client, process_queue):
+    body = queue_note(client)
+    give_up = time.monotonic() + 10
+    while True:
+        job = client.get(body["status_url"], headers=AUTH).get_json()
+        if job["status"] not in ("queued", "running") or time.monotonic() > give_up:
+            break
+        time.sleep(0.05)
+    assert job["status"] == "succeeded"
+    assert job["result"]["result"]["kb_path"] == "/Apps/SaveNotesGPT/NotesKB/2025-07/2025-07-03_test_note.md"
+    assert job["progress"]["stage"] == "uploaded"
+
+
+def test_job_events_stream_until_the_job_finishes(client, process_queue):
+    body = queue_note(client)
+    response = client.get(body["events_url"], headers=AUTH)
+    assert response.mimetype == "text/event-stream"
+    events = [json.loads(line[len("data: "):]) for line in response.get_data(as_text=True).splitlines()
+              if line.startswith("data: ")]
+    assert events and events[-1]["status"] == "succeeded"
+    assert all(event["status"] in ("queued", "running") for event in events[:-1])
@@ -0,0 +1,32 @@
+import threading
+from utils.lru import LRUDict
+
+
+def test_least_recently_used_keys_are_dropped():
+    index = LRUDict(2)
+    index["a"] = 1
+    index["b"] = 2
+    assert index.get("a") == 1
+    index["c"] = 3
+    assert "b" not in index
+    assert index.items() == [("a", 1), ("c", 3)]
+    assert index.setdefault("a", 9) == 1
+    assert index.pop("a") == 1 and index.pop("a") is None
+    assert len(index) == 1
+
+
+def test_concurrent_writers_stay_within_the_bound():
+    index = LRUDict(100)
+
+    def write(prefix):
+        for i in range(2000):
+            index[f"{prefix}{i}"] = i
+            index.get(f"{prefix}{i // 2}")
+
+    threads = [threading.Thread(target=write, args=(name,)) for name in "abcd"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(index) == 100
+    assert len(index.items()) == 100
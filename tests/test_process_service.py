@@ -0,0 +1,28 @@
+from services import dropbox_client, process_service
+from services.ledger import ProcessingLedger
+from services.process_service import process_inbox_note
+
+NOTE = "2025-07-03_test-note.md"
+INBOX_NOTE = f"/Apps/SaveNotesGPT/Inbox/{NOTE}"
+
+
+def test_the_ledger_records_the_revision_that_was_downloaded(standin, monkeypatch, tmp_path):
+    # A ledger of its own, so runs of this note in other tests are not replayed
+    ledger = ProcessingLedger(path=str(tmp_path / "ledger.db"))
+    monkeypatch.setattr(process_service, "ledger", ledger)
+    get_metadata = dropbox_client.get_metadata
+
+    def edited_after_lookup(path):
+        metadata = get_metadata(path)
+        standin.store.put(INBOX_NOTE, b"# Edited\n\nChanged after the lookup.\n")
+        return metadata
+
+    monkeypatch.setattr(dropbox_client, "get_metadata", edited_after_lookup)
+    looked_up = get_metadata(INBOX_NOTE)["rev"]
+    outcome = process_inbox_note(NOTE, {"title": "Test note", "date": "2025-07-03"}, inbox_mode="keep")
+
+    served = standin.store.get(INBOX_NOTE)["rev"]
+    assert outcome["status"] == "success" and served != looked_up
+    ledger.refresh()
+    assert ledger.is_processed(INBOX_NOTE.lower(), served)
+    assert not ledger.is_processed(INBOX_NOTE.lower(), looked_up)
@@ -0,0 +1,85 @@
+import time
+import threading
+import pytest
+from utils.rate_limit import RateLimited, TokenLimiter
+from utils.token_utils import _digest, tokens
+
+AUTH = {"Authorization": "Bearer sk-GPT-TEST"}
+
+
+@pytest.fixture
+def gpt_limiter(monkeypatch):
+    limiter = tokens[_digest("sk-GPT-TEST")]
+    monkeypatch.setattr(limiter, "_in_flight", 0)
+    monkeypatch.setattr(limiter, "_waiting", 0)
+    return limiter
+
+
+def test_a_burst_is_admitted_then_limited_until_the_bucket_refills():
+    limiter = TokenLimiter("test", rate=20, burst=3, concurrency=10, watchers=1)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release()
+    with pytest.raises(RateLimited) as limited:
+        limiter.acquire()
+    # About 1/20 s short, rounded up to whole seconds for Retry-After
+    assert limited.value.retry_after == 1
+    time.sleep(0.06)
+    limiter.acquire()
+    assert limiter.snapshot()["rate_limited"] == 1 and limiter.snapshot()["requests"] == 4
+
+
+def test_requests_over_the_concurrency_cap_are_limited():
+    limiter = TokenLimiter("test", rate=100, burst=100, concurrency=2, watchers=1)
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(RateLimited):
+        limiter.acquire()
+    limiter.release()
+    limiter.acquire()
+    assert limiter.snapshot()["concurrency_limited"] == 1 and limiter.snapshot()["in_flight"] == 2
+
+
+def test_a_token_over_its_rate_gets_429_and_other_tokens_do_not(client, gpt_limiter, monkeypatch):
+    monkeypatch.setattr(gpt_limiter, "_tokens", 0.0)
+    monkeypatch.setattr(gpt_limiter, "_updated", time.monotonic())
+    monkeypatch.setitem(tokens, _digest("sk-OTHER"), TokenLimiter("other", 5, 30, 8, 4))
+
+    response = client.get("/api/inbox/changes", headers=AUTH)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) == response.get_json()["retry_after"] >= 1
+    assert client.get("/api/inbox/changes", headers={"Authorization": "Bearer sk-OTHER"}).status_code == 200
+    assert client.get("/api/inbox/changes", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+
+def test_waiting_requests_leave_the_concurrency_cap_but_are_capped_themselves():
+    limiter = TokenLimiter("test", rate=100, burst=100, concurrency=1, watchers=1)
+    limiter.acquire()
+    limiter.start_waiting()
+    limiter.acquire()
+    with pytest.raises(RateLimited):
+        limiter.start_waiting()
+    assert limiter.snapshot()["watchers_limited"] == 1
+    limiter.release()
+    limiter.stop_waiting()
+    limiter.release()
+    assert limiter.snapshot()["in_flight"] == 0 and limiter.snapshot()["waiting"] == 0
+
+
+def test_a_poll_over_the_watcher_cap_gets_429(client, gpt_limiter, monkeypatch):
+    monkeypatch.setattr(gpt_limiter, "watchers", 1)
+    cursor = client.get("/api/inbox/changes", headers=AUTH).get_json()["cursor"]
+    waiting = threading.Thread(target=client.get, args=(f"/api/inbox/changes?cursor={cursor}&timeout=3",),
+                               kwargs={"headers": AUTH})
+    waiting.start()
+    for _ in range(100):
+        if gpt_limiter.snapshot()["waiting"]:
+            break
+        time.sleep(0.02)
+    assert gpt_limiter.snapshot()["waiting"] == 1
+
+    response = client.get(f"/api/inbox/changes?cursor={cursor}&timeout=3", headers=AUTH)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(TokenLimiter.WATCHER_RETRY_AFTER)
+    waiting.join()
+    assert gpt_limiter.snapshot()["in_flight"] == 0 and gpt_limiter.snapshot()["waiting"] == 0
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import zlib
+import secrets
+import threading
+import subprocess
+import pytest
+from services import shared_cache
+from services.shared_cache import MemoryCache, RedisCache, SQLiteCache
+from conftest import ROOT, load_script
+
+mock_redis = load_script("mock_redis_server")
+
+
+def blob(size: int = 2000) -> str:
+    # Random hex does not compress much, so entry sizes stay predictable
+    return secrets.token_hex(size // 2)
+
+
+def encoded_size(value) -> int:
+    return len(zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 1))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    """
+    Returns a factory for a size-bounded cache of each local backend.
+    """
+    def make(max_bytes=shared_cache.CACHE_MAX_BYTES):
+        if request.param == "memory":
+            return MemoryCache(max_bytes=max_bytes)
+        return SQLiteCache(path=str(tmp_path / "cache.db"), max_bytes=max_bytes)
+    return make
+
+
+@pytest.fixture
+def redis_server():
+    # The redis client is optional (see README)
+    pytest.importorskip("redis")
+    server = mock_redis.Server(("127.0.0.1", 0), mock_redis.Handler)
+    server.store = mock_redis.Store(0)
+    threading.Thread(target=server.serve_forever, name="redis-standin", daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_round_trip(make_cache):
+    cache = make_cache()
+    cache.set("note", {"title": "Hello", "tags": ["a"]})
+    assert cache.get("note") == {"title": "Hello", "tags": ["a"]}
+    cache.delete("note")
+    assert cache.get("note") is None
+    assert cache.snapshot()["hits"] == 1 and cache.snapshot()["misses"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_by_size(make_cache):
+    values = {key: blob() for key in "abc"}
+    limit = encoded_size(values["a"]) + encoded_size(values["b"]) + encoded_size(values["c"]) // 2
+    cache = make_cache(max_bytes=limit)
+    # SQLite records reads at most every TOUCH_INTERVAL seconds; record every one here
+    cache.TOUCH_INTERVAL = 0
+    cache.set("a", values["a"])
+    cache.set("b", values["b"])
+    assert cache.get("a") == values["a"]
+    cache.set("c", values["c"])
+    assert cache.get("b") is None
+    assert cache.get("a") == values["a"] and cache.get("c") == values["c"]
+    assert cache.snapshot()["bytes"] <= limit
+
+
+def test_entries_expire_after_their_ttl(make_cache):
+    cache = make_cache()
+    cache.set("short", "value", ttl=0.05)
+    cache.set("long", "value", ttl=60)
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert cache.get("long") == "value"
+
+
+def test_oversized_entries_are_not_cached(make_cache, monkeypatch):
+    monkeypatch.setattr(shared_cache, "CACHE_MAX_ITEM_BYTES", 500)
+    cache = make_cache()
+    cache.set("big", blob(4000))
+    cache.set("small", "fits")
+    assert cache.get("big") is None
+    assert cache.get("small") == "fits"
+    assert cache.snapshot()["sets"] == 1
+
+
+def test_undecodable_entries_are_dropped(make_cache):
+    cache = make_cache()
+    cache._set(shared_cache.CACHE_PREFIX + "broken", b"not zlib", None)
+    assert cache.get("broken") is None
+    assert cache._get(shared_cache.CACHE_PREFIX + "broken") is None
+    assert cache.snapshot()["errors"] == 1
+
+
+def test_sqlite_entries_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    script = (
+        "import sys; from services.shared_cache import SQLiteCache; "
+        "cache = SQLiteCache(path=sys.argv[1]); "
+        "print(cache.get('from-parent')); cache.set('from-child', {'pid': 'child'})"
+    )
+    SQLiteCache(path=path).set("from-parent", "hello")
+    result = subprocess.run([sys.executable, "-c", script, path], cwd=ROOT, capture_output=True, text=True,
+                            timeout=30, env={**os.environ, "PYTHONPATH": ROOT})
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "hello"
+    assert SQLiteCache(path=path).get("from-child") == {"pid": "child"}
+
+
+def test_redis_round_trip_and_ttl(redis_server):
+    cache = RedisCache(url=f"redis://127.0.0.1:{redis_server.server_address[1]}/0")
+    cache.set("note", {"title": "Hello"})
+    cache.set("short", "value", ttl=0.05)
+    assert cache.get("note") == {"title": "Hello"}
+    time.sleep(0.1)
+    assert cache.get("short") is None
+
+
+def test_redis_outage_degrades_to_misses(redis_server):
+    cache = RedisCache(url=f"redis://127.0.0.1:{redis_server.server_address[1]}/0")
+    cache.set("note", "cached")
+    assert cache.get("note") == "cached"
+
+    redis_server.shutdown()
+    redis_server.server_close()
+    cache._client.connection_pool.disconnect()
+
+    started = time.monotonic()
+    assert cache.get("note") is None
+    cache.set("other", "dropped")
+    cache.delete("note")
+    assert time.monotonic() - started < 5
+    assert cache.snapshot()["errors"] == 3
@@ -0,0 +1,89 @@
+import os
+import pytest
+from services import catalog
+from services.catalog import ContentCache, catalog_for, read_note
+from services.snapshot import Snapshot, write_snapshot
+from utils.lru import LRUDict
+
+INBOX = "/Apps/SaveNotesGPT/Inbox"
+NOTE = "2025-07-03_test-note.md"
+
+
+def mapped(path: str) -> bool:
+    with open("/proc/self/maps") as f:
+        return os.path.realpath(path) in f.read()
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="needs /proc")
+def test_close_unmaps_the_file(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    write_snapshot(path, {"saved_at": "now"}, [("/inbox/a.md", "rev1", "# A")])
+    with Snapshot(path) as saved:
+        assert saved.state == {"saved_at": "now"}
+        assert saved.body("/inbox/a.md", "rev1") == "# A"
+        assert saved.body("/inbox/a.md", "rev2") is None
+        assert mapped(path)
+    assert not mapped(path)
+    assert saved.body("/inbox/a.md", "rev1") is None
+
+
+def test_unreadable_file_is_not_left_mapped(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    path.write_bytes(b"NOTASNAP" + bytes(16))
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
+    if os.path.exists("/proc/self/maps"):
+        assert not mapped(str(path))
+
+
+@pytest.fixture
+def restart(tmp_path, monkeypatch):
+    """
+    Points the catalogs at a snapshot file of their own; calling the result simulates a restart
+    of the process (no catalogs, empty caches, snapshot not opened yet).
+    """
+    monkeypatch.setattr(catalog, "SNAPSHOT_PATH", str(tmp_path / "cache_snapshot.bin"))
+
+    def restart():
+        catalog.close_snapshot()
+        monkeypatch.setattr(catalog, "_catalogs", {})
+        monkeypatch.setattr(catalog, "content_cache", ContentCache())
+        monkeypatch.setattr(catalog, "frontmatter_index", LRUDict(catalog.INDEX_MAX_NOTES))
+
+    restart()
+    yield restart
+    catalog.close_snapshot()
+
+
+def calls(standin, endpoint: str) -> int:
+    return sum(count for (seen, _), count in standin.faults.seen.items() if seen == endpoint)
+
+
+def test_a_restart_resumes_from_the_snapshot(standin, restart):
+    inbox = catalog_for(INBOX)
+    inbox.refresh()
+    body = read_note(inbox.find(NOTE))
+    assert catalog.save_snapshot()["saved"]
+
+    restart()
+    standin.store.put(f"{INBOX}/added-after-the-save.md", b"# Added\n")
+    standin.faults.seen.clear()
+    inbox = catalog_for(INBOX)
+    inbox.refresh()
+
+    # Caught up from the saved cursor, not listed again
+    assert calls(standin, "/2/files/list_folder") == 0
+    assert calls(standin, "/2/files/list_folder/continue") == 1
+    assert inbox.find("added-after-the-save.md") is not None
+    assert read_note(inbox.find(NOTE)) == body
+    assert calls(standin, "/2/files/download") == 0
+
+
+def test_an_unreadable_snapshot_is_ignored(standin, restart):
+    with open(catalog.SNAPSHOT_PATH, "wb") as f:
+        f.write(b"NOTASNAP" + bytes(16))
+    standin.faults.seen.clear()
+    inbox = catalog_for(INBOX)
+    inbox.refresh()
+    assert calls(standin, "/2/files/list_folder") == 1
+    assert inbox.find(NOTE) is not None
@@ -0,0 +1,53 @@
+import os
+import time
+import threading
+from utils.state_store import StateFile, state_file
+
+
+def test_queued_updates_are_visible_before_and_after_the_flush(tmp_path):
+    store = StateFile(str(tmp_path / "log.json"), [])
+    store.update_later(lambda logs: ["a"] + logs)
+    store.update_later(lambda logs: ["b"] + logs)
+    assert store.load() == ["b", "a"]
+    store.flush()
+    assert store.load() == ["b", "a"]
+    assert StateFile(store.path, []).load() == ["b", "a"]
+
+
+def test_load_and_update_later_do_not_wait_for_a_flush(tmp_path):
+    store = StateFile(str(tmp_path / "log.json"), [])
+    store.save(["old"])
+    store.update_later(lambda logs: ["new"] + logs)
+
+    # Another process holds the file lock, so the flush is stuck writing
+    held, release = threading.Event(), threading.Event()
+
+    def hold_file_lock():
+        with StateFile(store.path, [])._locked():
+            held.set()
+            release.wait(5)
+
+    threading.Thread(target=hold_file_lock).start()
+    held.wait(5)
+    flusher = threading.Thread(target=store.flush)
+    flusher.start()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    store.update_later(lambda logs: ["newer"] + logs)
+    assert store.load() == ["newer", "new", "old"]
+    assert time.monotonic() - started < 0.5
+
+    release.set()
+    flusher.join(5)
+    assert store.load() == ["newer", "new", "old"]
+    store.flush()
+    assert StateFile(store.path, []).load() == ["newer", "new", "old"]
+
+
+def test_state_files_are_keyed_by_absolute_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = state_file(os.path.join("data", "state.json"), {})
+    assert store.path == str(tmp_path / "data" / "state.json")
+    monkeypatch.chdir(tmp_path.parent)
+    assert state_file(os.path.join("data", "state.json"), {}) is not store
@@ -0,0 +1,69 @@
+import hmac
+import json
+import time
+import hashlib
+from routes import webhooks
+from services.catalog import catalog_for
+
+INBOX = "/Apps/SaveNotesGPT/Inbox"
+NOTIFICATION = json.dumps({"list_folder": {"accounts": ["dbid:standin"]}, "delta": {"users": [1]}}).encode()
+
+
+def sign(body: bytes, secret: str = "standin") -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def notify(client, body=NOTIFICATION, signature=None):
+    headers = {"Content-Type": "application/json"}
+    if signature is not None:
+        headers["X-Dropbox-Signature"] = signature
+    return client.post("/webhooks/dropbox", data=body, headers=headers)
+
+
+def record_syncs(monkeypatch) -> list:
+    syncs = []
+    monkeypatch.setattr(webhooks, "request_sync", lambda: syncs.append(True))
+    return syncs
+
+
+def test_challenge_is_echoed(client):
+    response = client.get("/webhooks/dropbox?challenge=abc123")
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == "abc123"
+    assert response.mimetype == "text/plain"
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+
+
+def test_missing_challenge_is_rejected(client):
+    assert client.get("/webhooks/dropbox").status_code == 400
+
+
+def test_bad_signature_is_rejected(client, monkeypatch):
+    syncs = record_syncs(monkeypatch)
+    assert notify(client, signature=sign(NOTIFICATION, "other-secret")).status_code == 403
+    assert notify(client).status_code == 403
+    assert syncs == []
+
+
+def test_empty_body_is_rejected(client, monkeypatch):
+    syncs = record_syncs(monkeypatch)
+    assert notify(client, body=b"").status_code == 403
+    assert notify(client, body=b"", signature=sign(NOTIFICATION)).status_code == 403
+    assert syncs == []
+
+
+def test_signed_notification_syncs_the_catalogs(client, standin):
+    inbox = catalog_for(INBOX)
+    inbox.refresh()
+    standin.store.put(f"{INBOX}/from-webhook.md", b"# Added elsewhere\n")
+    assert inbox.find("from-webhook.md") is None
+
+    response = notify(client, signature=sign(NOTIFICATION))
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "accepted"
+
+    # The sync runs on a background thread
+    give_up = time.monotonic() + 5
+    while inbox.find("from-webhook.md") is None and time.monotonic() < give_up:
+        time.sleep(0.05)
+    assert inbox.find("from-webhook.md") is not None
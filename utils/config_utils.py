@@ -1,42 +1,43 @@
 import os
-import json
+from utils.state_store import state_file
 
 BASE_DIR = "data"
 CONFIG_FILE = os.path.join(BASE_DIR, "admin_config.json")
 LOG_FILE = os.path.join(BASE_DIR, "admin_log.json")
 FILES_FILE = os.path.join(BASE_DIR, "last_files.json")
+SCHEDULER_FILE = os.path.join(BASE_DIR, "scheduler_status.json")
+# What happens to an Inbox note once it is processed: left in place, moved to Inbox/_processed/YYYY-MM, or deleted
+INBOX_MODES = ("keep", "archive", "delete")
 DEFAULT_CONFIG = {
     "kb_path": "/Apps/SaveNotesGPT/NotesKB",
     "inbox_path": "/Apps/SaveNotesGPT/Inbox",
-    "last_scan": None
+    "last_scan": None,
+    # Background scheduler (seconds); see services/scheduler.py
+    "scan_interval": 300,
+    "kb_refresh_interval": 900,
+    "scheduler_jitter": 30,
+    "cache_warm_count": 20,
+    "frontmatter_prefetch_limit": 50,
+    # Warm-start snapshot of the caches; see save_snapshot() in services/catalog.py
+    "snapshot_interval": 600,
+    "inbox_mode": "keep"
 }
 
 def ensure_data_dir():
     os.makedirs(BASE_DIR, exist_ok=True)
 
 def load_json(path, fallback):
+    """
+    Reads a state file (see utils/state_store.py), creating it with the fallback if missing.
+    An unreadable file is answered with the fallback but left for the next write to replace.
+    """
     ensure_data_dir()
-    if os.path.exists(path):
-        try:
-            with open(path, "r") as f:
-                content = f.read().strip()
-                if not content:
-                    raise ValueError("Empty file")
-                return json.loads(content)
-        except (json.JSONDecodeError, ValueError) as e:
-            print(f"⚠️ Warning: Failed to load JSON from {path} — {e}. Using fallback.")
-            save_json(path, fallback)
-            return fallback
-    else:
-        # Auto-create the file with the fallback content
-        save_json(path, fallback)
-        return fallback
+    return state_file(path, fallback).load()
 
 
 def save_json(path, data):
     ensure_data_dir()
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
+    state_file(path, data).save(data)
 
 # Shorthands for common ops
 def load_config():
@@ -45,6 +46,19 @@ def load_config():
 def save_config(config):
     save_json(CONFIG_FILE, config)
 
+def update_config(changes: dict, later: bool = False):
+    """
+    Merges `changes` into the stored config without overwriting settings another worker saved meanwhile.
+    With `later`, the write is deferred and coalesced, for bookkeeping done on request paths.
+    """
+    ensure_data_dir()
+    store = state_file(CONFIG_FILE, DEFAULT_CONFIG)
+    change = lambda config: {**config, **changes}
+    if later:
+        store.update_later(change)
+    else:
+        store.update(change)
+
 def load_logs():
     return load_json(LOG_FILE, [])
 
@@ -54,5 +68,20 @@ def save_logs(logs):
 def load_last_files():
     return load_json(FILES_FILE, [])
 
-def save_last_files(files):
-    save_json(FILES_FILE, files)
+def save_last_files(files, later: bool = False):
+    ensure_data_dir()
+    store = state_file(FILES_FILE, [])
+    if later:
+        store.update_later(lambda _: list(files))
+    else:
+        store.save(files)
+
+def load_scheduler_status():
+    return load_json(SCHEDULER_FILE, {})
+
+def save_scheduler_status(status):
+    save_json(SCHEDULER_FILE, status)
+
+def update_scheduler_status(name: str, record: dict):
+    ensure_data_dir()
+    state_file(SCHEDULER_FILE, {}).update(lambda status: {**status, name: record})
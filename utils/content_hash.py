@@ -0,0 +1,46 @@
+import hashlib
+
+# Dropbox hashes content in 4 MiB blocks
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class ContentHasher:
+    """
+    Incremental implementation of Dropbox's content_hash: the SHA-256 of the concatenated
+    SHA-256 digests of every 4 MiB block of the file.
+
+    Data can be fed in chunks of any size. Chunks are sliced through memoryview, so the
+    input is never copied; only the current block's running hash is kept.
+    See https://www.dropbox.com/developers/reference/content-hash
+    """
+
+    def __init__(self):
+        self._overall = hashlib.sha256()
+        self._block = hashlib.sha256()
+        self._block_used = 0
+
+    def update(self, data):
+        view = memoryview(data).cast("B")
+        while len(view):
+            take = min(BLOCK_SIZE - self._block_used, len(view))
+            self._block.update(view[:take])
+            self._block_used += take
+            view = view[take:]
+            if self._block_used == BLOCK_SIZE:
+                self._overall.update(self._block.digest())
+                self._block = hashlib.sha256()
+                self._block_used = 0
+        return self
+
+    def hexdigest(self) -> str:
+        overall = self._overall.copy()
+        if self._block_used:
+            overall.update(self._block.digest())
+        return overall.hexdigest()
+
+
+def content_hash(data) -> str:
+    """
+    Dropbox content_hash of a bytes-like object.
+    """
+    return ContentHasher().update(data).hexdigest()
@@ -0,0 +1,77 @@
+import os
+import time
+import contextvars
+from functools import wraps
+
+# Default budget for a request, overridable per endpoint with DEADLINE_<NAME> (seconds)
+DEFAULT_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "25"))
+
+# Per-call timeouts used when no request deadline is active (background work, streams)
+CONNECT_TIMEOUT = float(os.getenv("DROPBOX_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("DROPBOX_READ_TIMEOUT", "60"))
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when the current request has used up its time budget.
+    """
+
+
+def with_deadline(name: str, default: float = DEFAULT_DEADLINE):
+    """
+    Route decorator that gives the request a time budget, starting at route entry.
+    The budget is read from the DEADLINE_<NAME> environment variable, falling back to `default`.
+    Every outbound call made while handling the request is bounded by what is left of it.
+    """
+    seconds = float(os.getenv(f"DEADLINE_{name.upper()}", default))
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _deadline.set(time.monotonic() + seconds)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _deadline.reset(token)
+        return wrapper
+    return decorator
+
+
+def remaining():
+    """
+    Seconds left in the current request's budget, or None if no deadline is set.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline():
+    """
+    Raises DeadlineExceeded if the current request's budget is used up.
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
+def bounded(seconds: float) -> float:
+    """
+    Caps a wait of `seconds` at the time left in the current request.
+    """
+    left = remaining()
+    return seconds if left is None else max(min(seconds, left), 0)
+
+
+def call_timeout():
+    """
+    (connect, read) timeouts for an outbound HTTP call, sized to the remaining budget.
+    Raises DeadlineExceeded if nothing is left.
+    """
+    left = remaining()
+    if left is None:
+        return CONNECT_TIMEOUT, READ_TIMEOUT
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(CONNECT_TIMEOUT, left), left
@@ -1,14 +1,26 @@
 #utils/dropbox_utils.py
 import os
 import json
-import requests
 from datetime import datetime
 import yaml
 import re
 from urllib.parse import unquote
+from services.dropbox_http import DROPBOX_API_BASE, coalesce, dropbox_post
+from services.dropbox_gate import DropboxUnavailable
+from services.shared_cache import ACCESS_TOKEN_KEY, local_cache
+from utils.deadline_utils import DeadlineExceeded, remaining
 
 MOCK_MODE = os.getenv("MOCK_MODE") == "1"
 
+# Seconds of the request budget kept back for uploading the note after attachment copies
+UPLOAD_RESERVE = float(os.getenv("DEADLINE_UPLOAD_RESERVE", "5"))
+
+# Seconds before its expiry that a cached access token stops being used
+TOKEN_EXPIRY_MARGIN = int(os.getenv("DROPBOX_TOKEN_EXPIRY_MARGIN", "300"))
+
+# Inbox subfolder that processed notes are archived to (Inbox/_processed/YYYY-MM)
+ARCHIVE_FOLDER = "_processed"
+
 def get_access_token():
     if MOCK_MODE:
         return "mock-access-token"
@@ -20,16 +32,30 @@ def get_access_token():
     if not refresh_token or not client_id or not client_secret:
         raise EnvironmentError("Missing Dropbox API credentials in environment.")
 
-    response = requests.post(
-        "https://api.dropboxapi.com/oauth2/token",
-        data={"grant_type": "refresh_token", "refresh_token": refresh_token},
-        auth=(client_id, client_secret),
-    )
+    # Kept in this worker only (never in the shared cache), until shortly before it expires
+    token = local_cache.get(ACCESS_TOKEN_KEY)
+    if token:
+        return token
+
+    def refresh():
+        response = dropbox_post(
+            f"{DROPBOX_API_BASE}/oauth2/token",
+            idempotent=True,
+            data={"grant_type": "refresh_token", "refresh_token": refresh_token},
+            auth=(client_id, client_secret),
+        )
+
+        if response.status_code != 200:
+            raise Exception(f"Failed to refresh access token: {response.text}")
 
-    if response.status_code != 200:
-        raise Exception(f"Failed to refresh access token: {response.text}")
+        token = response.json()
+        ttl = int(token.get("expires_in", 14400)) - TOKEN_EXPIRY_MARGIN
+        if ttl > 0:
+            local_cache.set(ACCESS_TOKEN_KEY, token["access_token"], ttl)
+        return token["access_token"]
 
-    return response.json()["access_token"]
+    # Requests arriving together share one refresh
+    return coalesce(("oauth2/token",), refresh)
 
 def generate_uid(title, date_str):
     """
@@ -128,14 +154,22 @@ def is_local_file_path(path):
         (not path.startswith('http') and not path.startswith('mailto:') and '.' in path)
     )
 
-def copy_dropbox_file(source_path, target_path):
+def copy_dropbox_file(source_path, target_path, content_hash=None):
     """
     Copy a file within Dropbox from source_path to target_path.
+    With the source's content_hash, a target that already holds identical bytes counts as
+    copied and is left untouched.
     Returns True if successful, False otherwise.
     """
     if MOCK_MODE:
         print(f"📎 [MOCK] Copy file: {source_path} → {target_path}")
         return True
+
+    from services.dropbox_client import get_metadata, remember_metadata, remote_matches
+
+    if remote_matches(target_path, content_hash):
+        print(f"⏭️ Unchanged, copy skipped: {target_path}")
+        return True
     
     access_token = get_access_token()
     
@@ -152,22 +186,45 @@ def copy_dropbox_file(source_path, target_path):
         "allow_ownership_transfer": False
     }
     
-    response = requests.post(
-        "https://api.dropboxapi.com/2/files/copy_v2",
+    # A repeated copy after an unseen success would conflict, so only rate limits are retried
+    response = dropbox_post(
+        f"{DROPBOX_API_BASE}/2/files/copy_v2",
+        idempotent=False,
         headers=headers,
         json=data
     )
     
     if response.status_code == 200:
+        remember_metadata([response.json().get("metadata", {})])
         return True
-    else:
-        print(f"❌ Failed to copy file {source_path} → {target_path}: {response.text}")
-        return False
+
+    # The target exists; identical content is as good as a successful copy
+    if content_hash and response.status_code == 409 and "conflict" in response.text:
+        existing = get_metadata(target_path)
+        if existing and existing.get("content_hash") == content_hash:
+            print(f"⏭️ Unchanged, copy skipped: {target_path}")
+            return True
+
+    print(f"❌ Failed to copy file {source_path} → {target_path}: {response.text}")
+    return False
+
+def referenced_files(detected_links):
+    """
+    The file names and relative paths a note links to, as matched by find_linked_files_in_inbox().
+    """
+    references = set(detected_links.get("embedded_files", [])) | set(detected_links.get("wiki_links", []))
+    for link_type in ("markdown_links", "markdown_images"):
+        for link in detected_links.get(link_type, []):
+            path = link["path"] if isinstance(link, dict) else link
+            references.add(path.lstrip('./').lstrip('../'))
+    return references
+
 
 def find_linked_files_in_inbox(detected_links, inbox_path="/Apps/SaveNotesGPT/Inbox"):
     """
     Find which detected links actually exist as files in the Inbox, preserving folder structure.
     Returns a list of files that exist and can be copied with their relative paths.
+    The archive of processed notes (Inbox/_processed) is not searched.
     """
     if MOCK_MODE:
         return [
@@ -178,26 +235,29 @@ def find_linked_files_in_inbox(detected_links, inbox_path="/Apps/SaveNotesGPT/In
     existing_files = []
     
     from services.dropbox_client import list_folder
+    from services.dropbox_executor import fan_out
     
     try:
-        # Get all files in inbox recursively
-        def get_all_files_recursive(path, relative_base=""):
+        # Get all files in inbox recursively, listing the folders of each level in parallel
+        def get_all_files_recursive(path):
             files = []
-            entries = list_folder(path)
-            
-            for item in entries:
-                if item[".tag"] == "file":
-                    relative_path = f"{relative_base}/{item['name']}" if relative_base else item["name"]
-                    files.append({
-                        "name": item["name"],
-                        "full_path": f"{path}/{item['name']}",
-                        "relative_path": relative_path
-                    })
-                elif item[".tag"] == "folder":
-                    # Recursively get files from subfolders
-                    subfolder_path = f"{path}/{item['name']}"
-                    subfolder_relative = f"{relative_base}/{item['name']}" if relative_base else item["name"]
-                    files.extend(get_all_files_recursive(subfolder_path, subfolder_relative))
+            level = [(path, "")]
+            while level:
+                listings = fan_out(lambda folder: list_folder(folder[0]), level)
+                next_level = []
+                for (folder_path, relative_base), entries in zip(level, listings):
+                    for item in entries:
+                        relative_path = f"{relative_base}/{item['name']}" if relative_base else item["name"]
+                        if item[".tag"] == "file":
+                            files.append({
+                                "name": item["name"],
+                                "full_path": f"{folder_path}/{item['name']}",
+                                "relative_path": relative_path,
+                                "content_hash": item.get("content_hash")
+                            })
+                        elif item[".tag"] == "folder" and not (folder_path == path and item["name"] == ARCHIVE_FOLDER):
+                            next_level.append((f"{folder_path}/{item['name']}", relative_path))
+                level = next_level
             
             return files
         
@@ -213,7 +273,8 @@ def find_linked_files_in_inbox(detected_links, inbox_path="/Apps/SaveNotesGPT/In
                             existing_files.append({
                                 "link": link,
                                 "inbox_path": file_info["full_path"],
-                                "relative_path": file_info["relative_path"]
+                                "relative_path": file_info["relative_path"],
+                                "content_hash": file_info["content_hash"]
                             })
                             break
             
@@ -225,7 +286,8 @@ def find_linked_files_in_inbox(detected_links, inbox_path="/Apps/SaveNotesGPT/In
                             existing_files.append({
                                 "link": link,
                                 "inbox_path": file_info["full_path"],
-                                "relative_path": file_info["relative_path"]
+                                "relative_path": file_info["relative_path"],
+                                "content_hash": file_info["content_hash"]
                             })
                             break
             
@@ -243,17 +305,20 @@ def find_linked_files_in_inbox(detected_links, inbox_path="/Apps/SaveNotesGPT/In
                             existing_files.append({
                                 "link": path,
                                 "inbox_path": file_info["full_path"],
-                                "relative_path": file_info["relative_path"]
+                                "relative_path": file_info["relative_path"],
+                                "content_hash": file_info["content_hash"]
                             })
                             break
     
+    except (DropboxUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"❌ Error finding linked files: {str(e)}")
     
     return existing_files
 
 
-def copy_linked_files_to_kb(detected_links, kb_folder_path, inbox_path="/Apps/SaveNotesGPT/Inbox"):
+def copy_linked_files_to_kb(detected_links, kb_folder_path, inbox_path="/Apps/SaveNotesGPT/Inbox", on_copy=None):
     """
     Copy linked files from Inbox to Knowledge Base folder, preserving folder structure.
     
@@ -261,13 +326,18 @@ def copy_linked_files_to_kb(detected_links, kb_folder_path, inbox_path="/Apps/Sa
         detected_links: Dict from detect_obsidian_links()
         kb_folder_path: Target KB path like "/Apps/SaveNotesGPT/NotesKB/2025-07"
         inbox_path: Source inbox path
+        on_copy: Optional callback(done, total) called after each file is attempted
     
+    Copies stop early once less than UPLOAD_RESERVE seconds of the request deadline remain;
+    the files not attempted are reported in "skipped_files".
+
     Returns:
-        dict: {"copied_files": [...], "failed_files": [...], "total_copied": int}
+        dict: {"copied_files": [...], "failed_files": [...], "skipped_files": [...], "total_copied": int}
     """
     result = {
         "copied_files": [],
         "failed_files": [], 
+        "skipped_files": [],
         "total_copied": 0
     }
     
@@ -278,12 +348,22 @@ def copy_linked_files_to_kb(detected_links, kb_folder_path, inbox_path="/Apps/Sa
         return result
     
     # Copy each existing file preserving folder structure
-    for file_info in existing_files:
+    for done, file_info in enumerate(existing_files, start=1):
         source_path = file_info["inbox_path"]
         # Preserve the relative folder structure in the target
         target_path = f"{kb_folder_path}/{file_info['relative_path']}"
+
+        # Keep enough of the request budget to upload the note itself
+        left = remaining()
+        if left is not None and left < UPLOAD_RESERVE:
+            result["skipped_files"].append({
+                "filename": file_info["relative_path"],
+                "source": source_path,
+                "error": "Skipped: request deadline reached"
+            })
+            continue
         
-        if copy_dropbox_file(source_path, target_path):
+        if copy_dropbox_file(source_path, target_path, file_info.get("content_hash")):
             result["copied_files"].append({
                 "filename": file_info["relative_path"],  # Full relative path
                 "source": source_path,
@@ -296,12 +376,15 @@ def copy_linked_files_to_kb(detected_links, kb_folder_path, inbox_path="/Apps/Sa
                 "source": source_path,
                 "error": "Copy operation failed"
             })
+
+        if on_copy:
+            on_copy(result["total_copied"], len(existing_files))
     
     return result
 
 
 
-def process_note_with_links(content, metadata, kb_folder_path, copy_links=True):
+def process_note_with_links(content, metadata, kb_folder_path, copy_links=True, on_copy=None):
     """
     Complete note processing with optional link handling.
     
@@ -310,6 +393,7 @@ def process_note_with_links(content, metadata, kb_folder_path, copy_links=True):
         metadata: Note metadata dict
         kb_folder_path: Target KB folder path
         copy_links: Whether to copy linked files
+        on_copy: Optional progress callback(done, total) for linked file copies
     
     Returns:
         dict: {
@@ -325,11 +409,11 @@ def process_note_with_links(content, metadata, kb_folder_path, copy_links=True):
     
     # Content remains unchanged since we preserve folder structure
     processed_content = content
-    copy_result = {"copied_files": [], "failed_files": [], "total_copied": 0}
+    copy_result = {"copied_files": [], "failed_files": [], "skipped_files": [], "total_copied": 0}
     
     # Copy linked files if requested
     if copy_links and total_links > 0:
-        copy_result = copy_linked_files_to_kb(detected_links, kb_folder_path)
+        copy_result = copy_linked_files_to_kb(detected_links, kb_folder_path, on_copy=on_copy)
     
     # Update metadata with linked files
     if total_links > 0:
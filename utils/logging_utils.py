@@ -1,7 +1,7 @@
 import os
-import json
 import logging
 from datetime import datetime
+from utils.state_store import state_file
 
 # --- Config Flags ---
 IS_RENDER = os.getenv("RENDER", "false").lower() == "true"
@@ -44,25 +44,15 @@ def log(message: str, level: str = "info"):
         logger.info(log_str)
 
     if not IS_RENDER:
-        try:
-            logs = []
-            if os.path.exists(LOG_FILE):
-                with open(LOG_FILE, "r") as f:
-                    logs = json.load(f)
-        except Exception:
-            logs = []
-
-        logs.insert(0, {
+        # Deferred, so logging never waits for the disk; see utils/state_store.py
+        entry = {
             "timestamp": timestamp,
             "level": level.upper(),
             "message": message
-        })
-        logs = logs[:50]
-        with open(LOG_FILE, "w") as f:
-            json.dump(logs, f, indent=2)
+        }
+        state_file(LOG_FILE, []).update_later(lambda logs: ([entry] + logs)[:50])
 
 # --- Helper for storing file history ---
 def update_last_files(files: list[str]):
     if not IS_RENDER:
-        with open(FILES_FILE, "w") as f:
-            json.dump(files, f, indent=2)
+        state_file(FILES_FILE, []).update_later(lambda _: list(files))
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUDict:
+    """
+    A thread-safe mapping that keeps at most `max_entries` keys, dropping the least recently
+    used (read or written) first. Supports the dict methods the indexes use; items() returns
+    a copy, so it can be iterated while other threads write.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._items.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            self._trim()
+
+    def setdefault(self, key, value):
+        with self._lock:
+            if key in self._items:
+                return self._items[key]
+            self._items[key] = value
+            self._trim()
+            return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._items.pop(key, default)
+
+    def items(self) -> list:
+        with self._lock:
+            return list(self._items.items())
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _trim(self):
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
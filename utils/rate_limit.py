@@ -0,0 +1,91 @@
+import math
+import time
+import threading
+
+
+class RateLimited(Exception):
+    """
+    A client went over its request rate or concurrency cap. Answered with 429 + Retry-After.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenLimiter:
+    """
+    Admission control for one API token: a token bucket of `burst` requests refilled at `rate`
+    per second, at most `concurrency` requests in flight, and at most `watchers` requests
+    waiting idle in long-polls. Limits apply per worker process.
+    """
+
+    # Seconds a watcher turned away is told to wait; a waiting poll lasts up to 90s
+    WATCHER_RETRY_AFTER = 5
+
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int, watchers: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.watchers = watchers
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._in_flight = 0
+        self._waiting = 0
+        self.stats = {"requests": 0, "rate_limited": 0, "concurrency_limited": 0, "watchers_limited": 0}
+
+    def acquire(self):
+        """
+        Admits one request or raises RateLimited. Every admitted request must be released.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._in_flight >= self.concurrency:
+                self.stats["concurrency_limited"] += 1
+                raise RateLimited(f"Too many concurrent requests for token '{self.name}' "
+                                  f"(limit {self.concurrency})", 1)
+            if self._tokens < 1:
+                self.stats["rate_limited"] += 1
+                wait = (1 - self._tokens) / self.rate if self.rate > 0 else 60
+                raise RateLimited(f"Rate limit exceeded for token '{self.name}' "
+                                  f"({self.rate:g}/s, burst {self.burst})", wait)
+            self._tokens -= 1
+            self._in_flight += 1
+            self.stats["requests"] += 1
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def start_waiting(self):
+        """
+        Moves an admitted request from in flight to waiting idle, or raises RateLimited if
+        `watchers` requests of this token are already waiting. Each waiting request holds a
+        server thread, so the cap keeps one client's watchers from taking all of them.
+        """
+        with self._lock:
+            if self._waiting >= self.watchers:
+                self.stats["watchers_limited"] += 1
+                raise RateLimited(f"Too many waiting requests for token '{self.name}' "
+                                  f"(limit {self.watchers})", self.WATCHER_RETRY_AFTER)
+            self._waiting += 1
+            self._in_flight -= 1
+
+    def stop_waiting(self):
+        """
+        Takes the request's slot back without checking the cap; it only has to answer now.
+        """
+        with self._lock:
+            self._waiting -= 1
+            self._in_flight += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            tokens = min(self.burst, self._tokens + (time.monotonic() - self._updated) * self.rate)
+            return {**self.stats, "in_flight": self._in_flight, "waiting": self._waiting,
+                    "tokens_available": round(tokens, 1), "rate": self.rate, "burst": self.burst,
+                    "concurrency": self.concurrency, "watchers": self.watchers}
@@ -0,0 +1,95 @@
+import time
+import threading
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+def _fresh(error: BaseException) -> BaseException:
+    """
+    A copy of `error` for one follower: same type, arguments and attributes, but a separate
+    object, so one exception instance is never raised in several threads at once.
+    """
+    clone = type(error).__new__(type(error), *error.args)
+    clone.__dict__.update(getattr(error, "__dict__", {}))
+    return clone
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs the function,
+    and every caller that arrives while it is still running waits for and shares that
+    result — or a copy of its exception. Nothing is cached once the call completes.
+
+    Shared results are handed to several callers and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.stats = {"calls": 0, "shared": 0, "retried": 0}
+
+    def do(self, key, fn, timeout=None, retry_on=()):
+        """
+        Runs `fn()` once per in-flight `key`.
+        Followers wait at most `timeout` seconds in total and then raise TimeoutError;
+        the leader's own call is bounded by whatever timeouts `fn` applies.
+
+        Exceptions in `retry_on` are the leader's own (its deadline ran out): followers do not
+        inherit them but try again, and one of them leads the next call.
+        """
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self.stats["calls"] += 1
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                else:
+                    flight.followers += 1
+                    self.stats["shared"] += 1
+
+            if leader:
+                try:
+                    flight.result = fn()
+                except BaseException as e:
+                    flight.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        if self._flights.get(key) is flight:
+                            del self._flights[key]
+                    flight.done.set()
+                return flight.result
+
+            wait = None if give_up_at is None else max(give_up_at - time.monotonic(), 0)
+            if not flight.done.wait(wait):
+                raise TimeoutError(f"Timed out after {timeout}s waiting for in-flight call {key}")
+            if flight.error is None:
+                return flight.result
+            if not isinstance(flight.error, retry_on):
+                raise _fresh(flight.error) from flight.error
+            with self._lock:
+                self.stats["retried"] += 1
+
+    def forget(self, match):
+        """
+        Stops new callers from joining the in-flight calls whose key satisfies `match(key)`:
+        they start a call of their own. Callers already waiting still share the old result.
+        """
+        with self._lock:
+            for key in [key for key in self._flights if match(key)]:
+                del self._flights[key]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "in_flight": len(self._flights)}
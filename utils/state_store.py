@@ -0,0 +1,250 @@
+import os
+import copy
+import json
+import time
+import fcntl
+import atexit
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Seconds deferred updates (update_later) are held before they are written in one go
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "2"))
+
+
+class StateFile:
+    """
+    A small JSON file shared by every worker process on the host.
+
+    Writes go to a temporary file that is renamed over the original, so readers always see
+    either the old or the new content, never half of it. Read-modify-write cycles hold an
+    exclusive flock on a `.lock` file next to it, so two processes cannot lose each other's updates.
+    Reads are served from memory until the file changes on disk (a stat() per read).
+
+    update_later() queues a change instead of writing it. Queued changes are applied together
+    by a background thread every STATE_FLUSH_INTERVAL seconds, and are already visible to load()
+    in this process, so request paths that only record bookkeeping never wait for the disk.
+    """
+
+    def __init__(self, path: str, fallback):
+        self.path = path
+        self.fallback = fallback
+        # Guards the in-memory state below; never held while writing to disk
+        self._lock = threading.Lock()
+        # One flush at a time, so queued updates reach the file in order
+        self._flush_lock = threading.Lock()
+        self._cached = None
+        self._cached_stat = None
+        self._pending = []
+        # Updates a flush is writing right now; still applied by load() until the write lands
+        self._writing = []
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_file(self):
+        """
+        Parses the file, or returns None if it is missing or cannot be parsed.
+        """
+        try:
+            with open(self.path, "r") as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, ValueError, OSError) as e:
+            # Left untouched: the next valid write replaces it
+            print(f"⚠️ Warning: Failed to load JSON from {self.path} — {e}. Using fallback.")
+            return None
+
+    def _read(self):
+        """
+        Current content on disk, or None if there is no file or it cannot be parsed. Caller holds self._lock.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._cached_stat:
+            self._cached = self._read_file()
+            self._cached_stat = key
+        return self._cached
+
+    def _write_file(self, data):
+        """
+        Atomically replaces the file and returns its new stat key. Caller holds the file lock.
+        """
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _current(self):
+        """
+        A private copy of the content with in-flight and queued updates applied. While a flush
+        is writing, the content from before it is used, so its updates are not applied twice.
+        Caller holds self._lock.
+        """
+        data = self._cached if self._writing else self._read()
+        data = copy.deepcopy(data if data is not None else self.fallback)
+        for change in self._writing + self._pending:
+            data = change(data)
+        return data
+
+    def load(self):
+        """
+        Returns a private copy of the content, with this process's queued updates applied.
+        A missing file is created with the fallback.
+        """
+        with self._lock:
+            if self._writing or os.path.exists(self.path):
+                return self._current()
+        with self._locked():
+            created = None
+            if not os.path.exists(self.path):
+                created = copy.deepcopy(self.fallback)
+                stat_key = self._write_file(created)
+            with self._lock:
+                if created is not None:
+                    self._cached, self._cached_stat = created, stat_key
+                return self._current()
+
+    def save(self, data):
+        """
+        Replaces the whole content now.
+        """
+        data = copy.deepcopy(data)
+        with self._locked():
+            stat_key = self._write_file(data)
+            with self._lock:
+                self._cached, self._cached_stat = data, stat_key
+
+    def update(self, change):
+        """
+        Applies `change(data) -> data` to the latest content on disk and writes the result now,
+        holding the file lock throughout. Returns the new content.
+        """
+        with self._locked():
+            data = self._read_file()
+            data = change(copy.deepcopy(data if data is not None else self.fallback))
+            stat_key = self._write_file(data)
+            with self._lock:
+                self._cached, self._cached_stat = data, stat_key
+            return copy.deepcopy(data)
+
+    def update_later(self, change):
+        """
+        Queues `change(data) -> data` for the next flush and returns at once.
+        """
+        with self._lock:
+            self._pending.append(change)
+        _schedule_flush()
+
+    def flush(self):
+        """
+        Writes queued updates, if any, in one locked read-modify-write. Only handing the queue
+        over takes self._lock, so load() and update_later() never wait for the disk.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                # Remember the content load() serves while the write is in flight
+                self._read()
+                self._writing, self._pending = self._pending, []
+            pending = self._writing
+            try:
+                with self._locked():
+                    data = self._read_file()
+                    data = copy.deepcopy(data if data is not None else self.fallback)
+                    for change in pending:
+                        data = change(data)
+                    stat_key = self._write_file(data)
+                with self._lock:
+                    self._cached, self._cached_stat, self._writing = data, stat_key, []
+            except Exception as e:
+                # Kept for the next flush rather than lost
+                with self._lock:
+                    self._pending, self._writing = pending + self._pending, []
+                print(f"⚠️ Warning: Failed to write {self.path} — {e}")
+
+
+_files = {}
+_files_lock = threading.Lock()
+_flush_event = threading.Event()
+_flusher = None
+
+
+def state_file(path: str, fallback) -> StateFile:
+    """
+    The process-wide StateFile for `path`; the fallback of the first caller wins. Relative paths
+    are resolved when first used, so a later chdir cannot send queued updates to another directory.
+    """
+    path = os.path.abspath(path)
+    with _files_lock:
+        if path not in _files:
+            _files[path] = StateFile(path, fallback)
+        return _files[path]
+
+
+def flush_all():
+    """
+    Writes every queued update now. Called on shutdown.
+    """
+    with _files_lock:
+        files = list(_files.values())
+    for state in files:
+        state.flush()
+
+
+def _flush_loop():
+    while True:
+        _flush_event.wait()
+        _flush_event.clear()
+        time.sleep(STATE_FLUSH_INTERVAL)
+        flush_all()
+
+
+def _schedule_flush():
+    global _flusher
+    with _files_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="state-flush", daemon=True)
+            _flusher.start()
+    _flush_event.set()
+
+
+def _after_fork():
+    # Threads and locks do not survive fork(); the child starts over with nothing queued
+    global _files_lock, _flush_event, _flusher
+    _files_lock = threading.Lock()
+    _flush_event = threading.Event()
+    _flusher = None
+    for state in _files.values():
+        state._lock = threading.Lock()
+        state._flush_lock = threading.Lock()
+        state._pending = []
+        state._writing = []
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(flush_all)
@@ -1,11 +1,90 @@
 import os
-from flask import request, jsonify
+import hashlib
+from contextlib import contextmanager
+from flask import request, jsonify, g, make_response
 from dotenv import load_dotenv
+from utils.rate_limit import RateLimited, TokenLimiter
 
 # Load GPT token from .tokens file
 load_dotenv(dotenv_path=".tokens")
 GPT_AUTH_TOKEN = os.getenv("GPT_TOKEN")  # Just the token string, no "Bearer"
 
+# More named tokens, one per client: "name=token,name=token"
+API_TOKENS = os.getenv("API_TOKENS", "")
+
+# Per-token limits: requests per second, burst size, requests in flight and long-polls waiting.
+# Override them for one token with TOKEN_RATE_<NAME>, TOKEN_BURST_<NAME>, TOKEN_CONCURRENCY_<NAME>
+# and TOKEN_WATCHERS_<NAME>.
+TOKEN_RATE = float(os.getenv("TOKEN_RATE", "5"))
+TOKEN_BURST = int(os.getenv("TOKEN_BURST", "30"))
+TOKEN_CONCURRENCY = int(os.getenv("TOKEN_CONCURRENCY", "8"))
+TOKEN_WATCHERS = int(os.getenv("TOKEN_WATCHERS", "4"))
+
+
+def _digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+def _limit(kind: str, name: str, default):
+    value = os.getenv(f"TOKEN_{kind}_{name.upper().replace('-', '_')}")
+    return type(default)(value) if value else default
+
+
+def _load_tokens() -> dict:
+    """
+    Configured tokens as {sha256 of the token: limiter named after the token},
+    so the secrets themselves are not kept around.
+    """
+    named = [("gpt", GPT_AUTH_TOKEN)] if GPT_AUTH_TOKEN else []
+    for pair in filter(None, (p.strip() for p in API_TOKENS.split(","))):
+        name, _, token = pair.partition("=")
+        if name.strip() and token.strip():
+            named.append((name.strip(), token.strip()))
+    return {
+        _digest(token): TokenLimiter(name, _limit("RATE", name, TOKEN_RATE), _limit("BURST", name, TOKEN_BURST),
+                                     _limit("CONCURRENCY", name, TOKEN_CONCURRENCY),
+                                     _limit("WATCHERS", name, TOKEN_WATCHERS))
+        for name, token in named
+    }
+
+
+tokens = _load_tokens()
+
+
+def token_usage() -> dict:
+    """
+    Per-token usage counters and limits of this worker process, keyed by token name.
+    """
+    return {limiter.name: limiter.snapshot() for limiter in tokens.values()}
+
+
+def _authenticate(token: str):
+    """
+    The limiter of a presented token, or None. Only the token's SHA-256 is looked up, so the
+    time the lookup takes depends on the hash, which a caller cannot steer toward a valid token,
+    not on how many leading characters of a guess were right.
+    """
+    return tokens.get(_digest(token))
+
+
+@contextmanager
+def idle_wait():
+    """
+    Gives the request's concurrency slot back while it waits without doing any work (long-polls),
+    so idle watchers do not count against TOKEN_CONCURRENCY; they count against TOKEN_WATCHERS
+    instead. Raises RateLimited (answered 429) when the token already has that many waiting.
+    """
+    limiter = g.get("token_limiter")
+    if limiter is None:
+        yield
+        return
+    limiter.start_waiting()
+    try:
+        yield
+    finally:
+        limiter.stop_waiting()
+
+
 def require_token(func):
     from functools import wraps
 
@@ -16,8 +95,29 @@ def require_token(func):
             return jsonify({"error": "Missing Bearer token"}), 401
 
         token = auth_header.replace("Bearer ", "").strip()
-        if token != GPT_AUTH_TOKEN:
+        limiter = _authenticate(token)
+        if limiter is None:
             return jsonify({"error": "Invalid token"}), 401
 
-        return func(*args, **kwargs)
+        try:
+            limiter.acquire()
+        except RateLimited as e:
+            response = jsonify({"status": "error", "message": str(e), "retry_after": e.retry_after})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response
+        g.token_name = limiter.name
+        g.token_limiter = limiter
+
+        try:
+            response = make_response(func(*args, **kwargs))
+        except BaseException:
+            limiter.release()
+            raise
+        if response.is_streamed:
+            # Streams (job events, exports) hold their slot until the client is done
+            response.call_on_close(limiter.release)
+        else:
+            limiter.release()
+        return response
     return wrapper